@@ -3,66 +3,60 @@ Script to manually add test attempt records to the database
 This helps sync existing test history from the student app
 """
 
-import psycopg2
-import os
 from datetime import datetime, timedelta
-from dotenv import load_dotenv
+from models.database import execute_query_one, insert_many, close_all_connections, db_workload
 
-load_dotenv()
+INSERT_ATTEMPTS_QUERY = """
+    INSERT INTO user_test_attempts (user_id, test_id, score, total_questions, time_taken, attempt_date)
+    VALUES %s
+    RETURNING attempt_id
+"""
 
 def add_test_attempt(user_id, test_id, score, total_questions, time_taken=None, attempt_date=None):
     """Add a single test attempt"""
-    conn = None
     try:
-        conn = psycopg2.connect(
-            host=os.getenv('DB_HOST', 'localhost'),
-            port=os.getenv('DB_PORT', '5432'),
-            database=os.getenv('DB_NAME', 'coursepro_db'),
-            user=os.getenv('DB_USER', 'postgres'),
-            password=os.getenv('DB_PASSWORD', 'admin123')
-        )
-        
-        cursor = conn.cursor()
-        
         # If no date provided, use current time
         if attempt_date is None:
             attempt_date = datetime.now()
         
         # Insert the test attempt
-        cursor.execute("""
+        attempt_id = execute_query_one("""
             INSERT INTO user_test_attempts (user_id, test_id, score, total_questions, time_taken, attempt_date)
-            VALUES (%s, %s, %s, %s, %s, %s)
+            VALUES ($1, $2, $3, $4, $5, $6)
             RETURNING attempt_id
-        """, [user_id, test_id, score, total_questions, time_taken, attempt_date])
-        
-        attempt_id = cursor.fetchone()[0]
-        conn.commit()
+        """, [user_id, test_id, score, total_questions, time_taken, attempt_date])['attempt_id']
         
         print(f"✅ Added test attempt {attempt_id} for user {user_id}")
         return attempt_id
         
     except Exception as error:
         print(f"❌ Error: {error}")
-        if conn:
-            conn.rollback()
-    finally:
-        if conn:
-            conn.close()
 
 def add_multiple_attempts(attempts_data):
     """
-    Add multiple test attempts at once
+    Add multiple test attempts at once (one multi-row INSERT, all or nothing)
     attempts_data: list of dicts with keys: user_id, test_id, score, total_questions, time_taken (optional), attempt_date (optional)
+    Returns the new attempt ids in input order
     """
-    for attempt in attempts_data:
-        add_test_attempt(
-            user_id=attempt['user_id'],
-            test_id=attempt['test_id'],
-            score=attempt['score'],
-            total_questions=attempt['total_questions'],
-            time_taken=attempt.get('time_taken'),
-            attempt_date=attempt.get('attempt_date')
-        )
+    try:
+        rows = [
+            (
+                attempt['user_id'],
+                attempt['test_id'],
+                attempt['score'],
+                attempt['total_questions'],
+                attempt.get('time_taken'),
+                attempt.get('attempt_date') or datetime.now()
+            )
+            for attempt in attempts_data
+        ]
+        inserted = insert_many(INSERT_ATTEMPTS_QUERY, rows, fetch=True)
+        for row, attempt in zip(inserted, rows):
+            print(f"✅ Added test attempt {row['attempt_id']} for user {attempt[0]}")
+        return [row['attempt_id'] for row in inserted]
+        
+    except Exception as error:
+        print(f"❌ Error: {error}")
 
 if __name__ == "__main__":
     print("📝 Test Attempt Data Migration Tool")
@@ -105,7 +99,11 @@ if __name__ == "__main__":
     
     if test_attempts:
         print(f"Adding {len(test_attempts)} test attempts...\n")
-        add_multiple_attempts(test_attempts)
-        print("\n✅ All test attempts added successfully!")
+        db_workload.set('maintenance')
+        try:
+            if add_multiple_attempts(test_attempts):
+                print("\n✅ All test attempts added successfully!")
+        finally:
+            close_all_connections()
     else:
         print("No test attempts configured. Add data and run again.")
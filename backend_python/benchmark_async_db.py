@@ -0,0 +1,79 @@
+"""
+Concurrency benchmark for the database layer
+Compares calling the blocking helpers from coroutines (old route behaviour)
+with the awaitable helpers, under a mix of slow analytics-style queries and
+fast login-style lookups sharing one event loop.
+
+Usage: python benchmark_async_db.py [concurrency] [slow_query_seconds]
+"""
+
+import asyncio
+import sys
+import time
+from models.database import (
+    get_db_pool, close_all_connections,
+    execute_query, execute_query_async
+)
+
+SLOW_QUERY = 'SELECT pg_sleep($1) as slept'
+FAST_QUERY = 'SELECT 1 as ok'
+
+async def blocking_request(slow_seconds):
+    """Route body as it used to be: a blocking call inside async def"""
+    execute_query(SLOW_QUERY, [slow_seconds])
+
+async def async_request(slow_seconds):
+    """Route body using the awaitable helper"""
+    await execute_query_async(SLOW_QUERY, [slow_seconds])
+
+async def fast_probe(latencies, query_func, stop):
+    """Keep issuing cheap queries and record how long each takes end to end"""
+    while not stop.is_set():
+        started = time.perf_counter()
+        result = query_func(FAST_QUERY)
+        if asyncio.iscoroutine(result):
+            await result
+        latencies.append(time.perf_counter() - started)
+        await asyncio.sleep(0.01)
+
+async def run_scenario(name, request_func, probe_func, concurrency, slow_seconds):
+    latencies = []
+    stop = asyncio.Event()
+    probe = asyncio.create_task(fast_probe(latencies, probe_func, stop))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(request_func(slow_seconds) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await probe
+
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0
+    print(f"\n{name}")
+    print(f"  {concurrency} slow requests finished in {elapsed:.2f}s "
+          f"({concurrency / elapsed:.1f} req/s)")
+    print(f"  fast probe queries completed: {len(latencies)}")
+    if latencies:
+        print(f"  fast probe latency p95: {p95 * 1000:.1f}ms, max: {latencies[-1] * 1000:.1f}ms")
+
+async def main(concurrency, slow_seconds):
+    await run_scenario("BEFORE: blocking helpers inside async routes",
+                       blocking_request, execute_query, concurrency, slow_seconds)
+    await run_scenario("AFTER: awaitable helpers on the database executor",
+                       async_request, execute_query_async, concurrency, slow_seconds)
+
+if __name__ == "__main__":
+    concurrency = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    slow_seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 0.2
+
+    print("=" * 60)
+    print("DATABASE CONCURRENCY BENCHMARK")
+    print("=" * 60)
+    print(f"Concurrency: {concurrency}, slow query: pg_sleep({slow_seconds})")
+
+    get_db_pool()
+    try:
+        asyncio.run(main(concurrency, slow_seconds))
+    finally:
+        close_all_connections()
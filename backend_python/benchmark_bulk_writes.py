@@ -0,0 +1,93 @@
+"""
+Throughput benchmark for the bulk write primitives
+Inserts the same attempt-shaped rows into a temporary table row by row,
+with execute_batch (execute_many), multi-row VALUES (insert_many, with and
+without RETURNING) and COPY (copy_rows), and reports rows per second.
+
+Usage: python benchmark_bulk_writes.py [rows]
+"""
+
+import sys
+import time
+from datetime import datetime, timedelta
+from models.database import transaction, close_all_connections, db_workload
+
+CREATE_TABLE = """
+    CREATE TEMP TABLE bench_attempts (
+        attempt_id SERIAL PRIMARY KEY,
+        user_id INTEGER,
+        test_id INTEGER,
+        score INTEGER,
+        total_questions INTEGER,
+        time_taken INTEGER,
+        attempt_date TIMESTAMP
+    ) ON COMMIT DROP
+"""
+COLUMNS = ['user_id', 'test_id', 'score', 'total_questions', 'time_taken', 'attempt_date']
+
+def generate_rows(count):
+    started = datetime.now()
+    for index in range(count):
+        yield (index % 500 + 1, index % 7 + 1, index % 11, 10, 30 + index % 20, started - timedelta(minutes=index))
+
+def row_by_row(tx, rows):
+    for row in rows:
+        tx.execute_query("""
+            INSERT INTO bench_attempts (user_id, test_id, score, total_questions, time_taken, attempt_date)
+            VALUES ($1, $2, $3, $4, $5, $6)
+        """, row, fetch=False)
+
+def batched(tx, rows):
+    tx.execute_many("""
+        INSERT INTO bench_attempts (user_id, test_id, score, total_questions, time_taken, attempt_date)
+        VALUES ($1, $2, $3, $4, $5, $6)
+    """, list(rows))
+
+def multi_row_values(tx, rows):
+    tx.insert_many("""
+        INSERT INTO bench_attempts (user_id, test_id, score, total_questions, time_taken, attempt_date)
+        VALUES %s
+    """, rows)
+
+def multi_row_values_returning(tx, rows):
+    tx.insert_many("""
+        INSERT INTO bench_attempts (user_id, test_id, score, total_questions, time_taken, attempt_date)
+        VALUES %s
+        RETURNING attempt_id
+    """, rows, fetch=True)
+
+def copy(tx, rows):
+    tx.copy_rows('bench_attempts', COLUMNS, rows)
+
+METHODS = [
+    ("row by row (execute_query)", row_by_row),
+    ("execute_batch (execute_many)", batched),
+    ("multi-row VALUES (insert_many)", multi_row_values),
+    ("multi-row VALUES + RETURNING", multi_row_values_returning),
+    ("COPY from iterator (copy_rows)", copy),
+]
+
+def measure(method, count):
+    """Time one method inside a transaction that drops its temp table on commit"""
+    with transaction() as tx:
+        tx.execute_query(CREATE_TABLE, fetch=False)
+        started = time.perf_counter()
+        method(tx, generate_rows(count))
+        elapsed = time.perf_counter() - started
+    return elapsed
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+
+    print("=" * 60)
+    print("BULK WRITE BENCHMARK")
+    print("=" * 60)
+    print(f"Rows: {rows:,}\n")
+
+    db_workload.set('maintenance')
+    try:
+        for name, method in METHODS:
+            elapsed = measure(method, rows)
+            print(f"{name:34} {elapsed:7.2f}s  {rows / elapsed:10,.0f} rows/s")
+    finally:
+        close_all_connections()
@@ -0,0 +1,67 @@
+"""
+Microbenchmark for the database layer's result modes
+Fetches the same generated result set as dict rows (RealDictCursor),
+plain tuples and columns, and reports wall time and peak Python memory.
+
+Usage: python benchmark_row_modes.py [rows]
+"""
+
+import sys
+import time
+import tracemalloc
+from models.database import (
+    get_db_pool, close_all_connections, db_workload,
+    execute_query, execute_query_rows, execute_query_columns, np
+)
+
+# Shaped like an analytics export: ids, counts, a ratio and a label
+BENCH_QUERY = """
+    SELECT
+        g as attempt_id,
+        g % 500 as user_id,
+        g % 11 as score,
+        10 as total_questions,
+        ROUND((g % 11)::numeric / 10 * 100, 2) as percentage,
+        'user' || (g % 500) as label
+    FROM generate_series(1, $1) g
+"""
+
+MODES = [
+    ("dict rows (execute_query)", execute_query),
+    ("tuple rows (execute_query_rows)", execute_query_rows),
+    ("columns (execute_query_columns)", execute_query_columns),
+]
+
+def measure(func, rows):
+    started = time.perf_counter()
+    result = func(BENCH_QUERY, [rows])
+    elapsed = time.perf_counter() - started
+    del result
+
+    tracemalloc.start()
+    result = func(BENCH_QUERY, [rows])
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return elapsed, peak
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+
+    print("=" * 60)
+    print("RESULT MODE MICROBENCHMARK")
+    print("=" * 60)
+    print(f"Rows: {rows:,}  (NumPy {'available' if np is not None else 'not installed: columns are lists'})\n")
+
+    # Export-sized fetches belong to the analytics workload (longer statement timeout)
+    db_workload.set('analytics')
+    get_db_pool()
+    try:
+        baseline = None
+        for name, func in MODES:
+            elapsed, peak = measure(func, rows)
+            baseline = baseline or elapsed
+            print(f"{name:34} {elapsed:7.2f}s  peak {peak / 1024 / 1024:8.1f} MB  "
+                  f"({baseline / elapsed:.1f}x vs dict)")
+    finally:
+        close_all_connections()
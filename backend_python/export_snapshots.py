@@ -0,0 +1,43 @@
+"""
+Export the attempt, recommendation and feedback tables as monthly columnar
+files (Parquet with pyarrow, otherwise NumPy .npz) under SNAPSHOT_DIR.
+Only months that changed since the last run are rewritten; --full rewrites all.
+
+Usage: python export_snapshots.py [--full] [dataset ...]
+"""
+
+import sys
+import time
+from models.database import close_all_connections, db_workload
+from models.snapshots import SNAPSHOT_DIR, SNAPSHOT_DATASETS, export_snapshots
+
+if __name__ == "__main__":
+    full = "--full" in sys.argv[1:]
+    datasets = [arg for arg in sys.argv[1:] if not arg.startswith("--")] or None
+
+    print("=" * 60)
+    print("SNAPSHOT EXPORT")
+    print("=" * 60)
+
+    unknown = [dataset for dataset in datasets or [] if dataset not in SNAPSHOT_DATASETS]
+    if unknown:
+        print(f"❌ Unknown dataset(s): {', '.join(unknown)}. Use: {', '.join(SNAPSHOT_DATASETS)}")
+        sys.exit(1)
+
+    db_workload.set('maintenance')
+    try:
+        print(f"\n🔄 {'Full' if full else 'Incremental'} export to {SNAPSHOT_DIR}...")
+        started = time.perf_counter()
+        summary = export_snapshots(full=full, datasets=datasets)
+        elapsed = time.perf_counter() - started
+
+        for partition in summary["exported"]:
+            print(f"✅ {partition}")
+        for partition in summary["removed"]:
+            print(f"🗑️  {partition} (no rows left)")
+        print(f"\n📝 {len(summary['exported'])} partition(s) written as {summary['format']}, "
+              f"{summary['skipped']} unchanged, in {elapsed:.2f}s")
+    except Exception as error:
+        print(f"\n❌ Error: {error}")
+    finally:
+        close_all_connections()
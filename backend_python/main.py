@@ -1,18 +1,32 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Depends, Request
+from fastapi.exception_handlers import http_exception_handler
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 import os
+import psycopg2.errors
 from dotenv import load_dotenv
-from models.database import get_db_pool, test_connection, close_all_connections
-from routes import users, courses, tests, recommendations, analytics, feedback, auth
+from models.database import (
+    get_db_pool, test_connection, test_connection_async, close_all_connections,
+    get_workload, is_query_cancelled, StreamLimitError
+)
+from models.query_stats import current_route
+from models.reports import report_scheduler
+from routes import users, courses, tests, recommendations, analytics, feedback, auth, admin, dashboard
 
 # Load environment variables
 load_dotenv()
 
+async def tag_query_route(request: Request):
+    """Attribute every query issued while handling this request to its route template"""
+    route = request.scope.get("route")
+    current_route.set(f"{request.method} {getattr(route, 'path', request.url.path)}")
+
 # Create FastAPI app
 app = FastAPI(
     title="Course Recommendation System API",
     description="Backend API for Course Recommendation System Admin Panel",
-    version="1.0.0"
+    version="1.0.0",
+    dependencies=[Depends(tag_query_route)]
 )
 
 # Configure CORS
@@ -25,6 +39,46 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+def query_cancelled_response(error):
+    """503 for a statement PostgreSQL cancelled because it exceeded its workload's budget"""
+    workload = get_workload()
+    return JSONResponse(
+        status_code=503,
+        content={
+            "detail": f"Query cancelled: exceeded the {workload.name} workload's "
+                      f"{workload.statement_timeout_ms}ms statement timeout",
+            "workload": workload.name
+        },
+        headers={"Retry-After": "5"}
+    )
+
+def stream_limit_response(error):
+    """503 for a stream refused because its workload already has DB_STREAM_MAX open"""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(error), "workload": get_workload().name},
+        headers={"Retry-After": "5"}
+    )
+
+# Routes wrap unexpected errors in HTTPException(500); surface cancelled queries
+# and refused streams as 503 instead
+@app.exception_handler(HTTPException)
+async def handle_http_exception(request: Request, error: HTTPException):
+    cause = error.__cause__ or error.__context__
+    if error.status_code == 500 and is_query_cancelled(cause):
+        return query_cancelled_response(cause)
+    if error.status_code == 500 and isinstance(cause, StreamLimitError):
+        return stream_limit_response(cause)
+    return await http_exception_handler(request, error)
+
+@app.exception_handler(psycopg2.errors.QueryCanceled)
+async def handle_query_cancelled(request: Request, error):
+    return query_cancelled_response(error)
+
+@app.exception_handler(StreamLimitError)
+async def handle_stream_limit(request: Request, error):
+    return stream_limit_response(error)
+
 # Include routers
 app.include_router(auth.router)
 app.include_router(users.router)
@@ -32,18 +86,22 @@ app.include_router(courses.router)
 app.include_router(tests.router)
 app.include_router(recommendations.router)
 app.include_router(analytics.router)
+app.include_router(dashboard.router)
 app.include_router(feedback.router)
+app.include_router(admin.router)
 
 # Startup event
 @app.on_event("startup")
 async def startup_event():
-    """Initialize database connection on startup"""
+    """Initialize database connection and start refreshing background reports on startup"""
     try:
         get_db_pool()
         if test_connection():
+            report_scheduler.start()
             print("✅ Backend server started successfully")
             print(f"   Environment: {os.getenv('ENVIRONMENT', 'development')}")
             print(f"   CORS enabled for: {', '.join(allowed_origins)}")
+            print(f"   Background reports: {', '.join(report_scheduler.reports)}")
     except Exception as error:
         print(f"❌ Failed to start server: {error}")
         raise error
@@ -51,7 +109,8 @@ async def startup_event():
 # Shutdown event
 @app.on_event("shutdown")
 async def shutdown_event():
-    """Close database connections on shutdown"""
+    """Stop background reports and close database connections on shutdown"""
+    await report_scheduler.stop()
     close_all_connections()
     print("✅ Server shutdown complete")
 
@@ -68,7 +127,7 @@ async def root():
 @app.get("/health")
 async def health_check():
     try:
-        if test_connection():
+        if await test_connection_async():
             return {"status": "healthy", "database": "connected"}
         else:
             raise HTTPException(status_code=503, detail="Database connection failed")
@@ -6,6 +6,13 @@ Run this once to update your existing database schema
 import psycopg2
 import os
 from dotenv import load_dotenv
+from models.rollups import ROLLUP_SCHEMA, ROLLUP_REBUILD
+from models.snapshots import SNAPSHOT_SCHEMA, SNAPSHOT_DATASETS, snapshot_trigger_sql
+from models.sketches import SKETCH_SCHEMA
+from models.funnel import FUNNEL_SCHEMA
+from models.dashboard import DASHBOARD_SCHEMA
+from models.cube import CUBE_SCHEMA, cube_trigger_sql
+from models.result_cache import RESULT_CACHE_SCHEMA, result_cache_trigger_sql
 
 load_dotenv()
 
@@ -85,6 +92,68 @@ def run_migrations():
         else:
             print("   ✅ user_test_attempts table already exists")
         
+        # Migration 4: Indexes behind the per-user assessment history endpoint
+        print("🔄 Checking assessment history indexes...")
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_user_test_attempts_user_date
+            ON user_test_attempts (user_id, attempt_date DESC, attempt_id DESC)
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_recommendations_attempt
+            ON recommendations (attempt_id)
+        """)
+        print("   ✅ Assessment history indexes in place")
+        
+        # Migration 5: Trigger-maintained rollup tables behind the analytics endpoints
+        print("🔄 Checking analytics rollup tables...")
+        cursor.execute("SELECT to_regclass('attempt_rollup_hourly') IS NOT NULL")
+        rollups_exist = cursor.fetchone()[0]
+        cursor.execute(ROLLUP_SCHEMA)
+        if not rollups_exist:
+            print("   Backfilling rollup tables...")
+            for statement in ROLLUP_REBUILD:
+                cursor.execute(statement)
+            print("   ✅ Rollup tables created and backfilled")
+        else:
+            print("   ✅ Rollup tables and triggers up to date")
+        
+        # Migration 6: Per-month change tracking for incremental snapshot exports
+        print("🔄 Checking snapshot export change tracking...")
+        cursor.execute(SNAPSHOT_SCHEMA)
+        for dataset in SNAPSHOT_DATASETS:
+            for statement in snapshot_trigger_sql(dataset):
+                cursor.execute(statement)
+        print("   ✅ Snapshot change tracking in place")
+        
+        # Migration 7: Daily sketches behind approx=true analytics (filled on first use)
+        print("🔄 Checking daily sketch table...")
+        cursor.execute(SKETCH_SCHEMA)
+        print("   ✅ attempt_daily_sketches table and day version triggers in place")
+        
+        # Migration 8: Recommendation funnel table and its stale-month triggers (months rebuilt on first read)
+        print("🔄 Checking recommendation funnel...")
+        cursor.execute(FUNNEL_SCHEMA)
+        print("   ✅ recommendation_funnel table and triggers in place")
+        
+        # Migration 9: Index behind the dashboard's recent signups list
+        print("🔄 Checking dashboard indexes...")
+        cursor.execute(DASHBOARD_SCHEMA)
+        print("   ✅ Dashboard indexes in place")
+        
+        # Migration 10: Activity cube and its stale-month triggers (months built on first read)
+        print("🔄 Checking activity cube...")
+        cursor.execute(CUBE_SCHEMA)
+        for statement in cube_trigger_sql():
+            cursor.execute(statement)
+        print("   ✅ analytics_cube table and triggers in place")
+        
+        # Migration 11: Per-table write versions that expire cached results in every worker
+        print("🔄 Checking result cache versions...")
+        cursor.execute(RESULT_CACHE_SCHEMA)
+        for statement in result_cache_trigger_sql():
+            cursor.execute(statement)
+        print("   ✅ result_cache_versions table and triggers in place")
+        
         conn.commit()
         print("\n✅ All migrations completed successfully!")
         
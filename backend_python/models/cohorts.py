@@ -0,0 +1,154 @@
+"""
+Signup cohorts and assessment retention.
+
+Users are grouped by the UTC week or month of users.created_at. For each cohort,
+one statement computes the retention matrix (distinct users with an attempt
+0, 1, 2, ... periods after the signup period), repeat-attempt rates and the
+days between consecutive attempts. The days between attempts come from LAG over
+each user's attempts. Matrices are cached by the endpoint (models/result_cache.py),
+and the default view is refreshed in the background (models/reports.py).
+"""
+
+from datetime import date, datetime, timedelta, timezone
+from models.database import transaction_async
+
+COHORT_PERIODS = ('week', 'month')
+DEFAULT_OFFSETS = 12
+MAX_OFFSETS = 104
+
+# $1 period ('week' | 'month'), $2 / $3 signup range [start, end), $4 number of offsets
+COHORT_QUERY = """
+    WITH cohort_users AS (
+        SELECT user_id, created_at, date_trunc($1, created_at AT TIME ZONE 'UTC') as cohort
+        FROM users
+        WHERE created_at >= $2 AND created_at < $3
+    ),
+    cohorts AS (
+        SELECT cohort, COUNT(*) as cohort_size
+        FROM cohort_users
+        GROUP BY cohort
+    ),
+    user_attempts AS (
+        SELECT
+            cu.user_id,
+            cu.cohort,
+            date_trunc($1, a.attempt_date AT TIME ZONE 'UTC') as period,
+            ROW_NUMBER() OVER w as attempt_number,
+            EXTRACT(EPOCH FROM a.attempt_date - LAG(a.attempt_date) OVER w) / 86400 as days_since_previous,
+            EXTRACT(EPOCH FROM a.attempt_date - cu.created_at) / 86400 as days_since_signup
+        FROM cohort_users cu
+        JOIN user_test_attempts a ON a.user_id = cu.user_id
+        WINDOW w AS (PARTITION BY a.user_id ORDER BY a.attempt_date, a.attempt_id)
+    ),
+    per_user AS (
+        SELECT
+            user_id,
+            cohort,
+            COUNT(*) as attempts,
+            MIN(days_since_signup) FILTER (WHERE attempt_number = 1) as days_to_first_attempt
+        FROM user_attempts
+        GROUP BY user_id, cohort
+    ),
+    gaps AS (
+        SELECT
+            cohort,
+            AVG(days_since_previous) as average_days_between_attempts,
+            percentile_cont(0.5) WITHIN GROUP (ORDER BY days_since_previous) as median_days_between_attempts
+        FROM user_attempts
+        WHERE days_since_previous IS NOT NULL
+        GROUP BY cohort
+    ),
+    offsets AS (
+        SELECT
+            cohort,
+            CASE WHEN $1 = 'month'
+                THEN (EXTRACT(YEAR FROM age(period, cohort)) * 12 + EXTRACT(MONTH FROM age(period, cohort)))::int
+                ELSE (period::date - cohort::date) / 7
+            END as period_offset,
+            COUNT(DISTINCT user_id) as active_users
+        FROM user_attempts
+        WHERE period >= cohort
+        GROUP BY 1, 2
+    ),
+    retention AS (
+        SELECT c.cohort, array_agg(COALESCE(o.active_users, 0) ORDER BY k.period_offset) as retention
+        FROM cohorts c
+        CROSS JOIN generate_series(0, $4::int - 1) k(period_offset)
+        LEFT JOIN offsets o ON o.cohort = c.cohort AND o.period_offset = k.period_offset
+        GROUP BY c.cohort
+    )
+    SELECT
+        c.cohort,
+        c.cohort_size,
+        COUNT(p.user_id) as active_users,
+        COUNT(p.user_id) FILTER (WHERE p.attempts >= 2) as repeat_users,
+        COALESCE(SUM(p.attempts), 0)::bigint as attempts,
+        percentile_cont(0.5) WITHIN GROUP (ORDER BY p.days_to_first_attempt) as median_days_to_first_attempt,
+        g.average_days_between_attempts,
+        g.median_days_between_attempts,
+        r.retention
+    FROM cohorts c
+    JOIN retention r ON r.cohort = c.cohort
+    LEFT JOIN gaps g ON g.cohort = c.cohort
+    LEFT JOIN per_user p ON p.cohort = c.cohort
+    GROUP BY c.cohort, c.cohort_size, g.average_days_between_attempts, g.median_days_between_attempts, r.retention
+    ORDER BY c.cohort
+"""
+
+def period_start(day, period):
+    """Start of the week (Monday) or month containing day"""
+    if period == 'month':
+        return day.replace(day=1)
+    return day - timedelta(days=day.weekday())
+
+def add_periods(day, period, count):
+    if period == 'month':
+        months = day.year * 12 + day.month - 1 + count
+        return date(months // 12, months % 12 + 1, 1)
+    return day + timedelta(weeks=count)
+
+def default_range(period, offsets):
+    """Signup range covering the current period and the offsets - 1 before it"""
+    today = datetime.now(timezone.utc).date()
+    return add_periods(period_start(today, period), period, -(offsets - 1)), today
+
+def ratio(part, whole):
+    return round(part / whole, 4) if whole else None
+
+def rounded(value):
+    return round(float(value), 2) if value is not None else None
+
+async def get_cohorts(period, first_day, last_day, offsets):
+    """Cohort matrix for users who signed up in the UTC days [first_day, last_day]"""
+    range_start = datetime(first_day.year, first_day.month, first_day.day, tzinfo=timezone.utc)
+    range_end = datetime(last_day.year, last_day.month, last_day.day, tzinfo=timezone.utc) + timedelta(days=1)
+    async with transaction_async(readonly=True, isolation='REPEATABLE READ') as tx:
+        rows = await tx.execute_query(COHORT_QUERY, [period, range_start, range_end, offsets], prepared=True)
+
+    current_period = period_start(datetime.now(timezone.utc).date(), period)
+    cohorts = []
+    for row in rows:
+        cohort_start = row['cohort'].date()
+        retention = []
+        for offset, active_users in enumerate(row['retention']):
+            # Periods that have not started yet are unknown, not zero
+            observed = add_periods(cohort_start, period, offset) <= current_period
+            retention.append({
+                "offset": offset,
+                "active_users": active_users if observed else None,
+                "rate": ratio(active_users, row['cohort_size']) if observed else None
+            })
+        cohorts.append({
+            "cohort": cohort_start.isoformat(),
+            "users": row['cohort_size'],
+            "active_users": row['active_users'],
+            "repeat_users": row['repeat_users'],
+            "attempts": row['attempts'],
+            "activation_rate": ratio(row['active_users'], row['cohort_size']),
+            "repeat_rate": ratio(row['repeat_users'], row['active_users']),
+            "median_days_to_first_attempt": rounded(row['median_days_to_first_attempt']),
+            "average_days_between_attempts": rounded(row['average_days_between_attempts']),
+            "median_days_between_attempts": rounded(row['median_days_between_attempts']),
+            "retention": retention
+        })
+    return cohorts
@@ -0,0 +1,369 @@
+"""
+Activity cube: attempts, recommendations and ratings by strand x course x test_type x month.
+
+Each fact is placed on all four dimensions:
+- strand: the acting student's academic_info strand ('Unknown' when missing)
+- course: the recommended course; 0 for attempts and for feedback not tied to a recommendation
+- test_type: the type of the test taken, or of the test whose attempt produced the
+  recommendation; 'none' when there is no such test
+- month: UTC month of attempt_date / recommended_at / the feedback's created_at
+
+analytics_cube holds every combination of those dimensions (GROUP BY CUBE, 16
+grouping sets). grouping_set is the GROUPING() bitmask, with one bit set per
+rolled-up dimension: month 8, strand 4, course 2, test_type 1. Any slice or dice
+is then a lookup in one grouping set, summed over that set's cells at most.
+All measures are sums, so they add up across cells.
+
+Triggers bump a month's version in analytics_cube_months when anything that
+places a fact in that month changes. That covers the facts
+themselves, a student's strand, a test's type, and the recommendation or attempt
+a fact is linked through. refresh_cube() rebuilds the 8 grouping sets that include
+month for the stale months only, from the raw tables. It then re-derives the 8
+month-less sets from the finest month rows, which hold one row per non-empty cell.
+"""
+
+from models.database import transaction, run_in_db_executor
+
+# dimension -> (GROUPING() bit, cube column)
+CUBE_DIMENSIONS = {
+    "month": (8, "month"),
+    "strand": (4, "strand"),
+    "course": (2, "course_id"),
+    "test_type": (1, "test_type")
+}
+CUBE_MEASURES = (
+    "attempts", "score_sum", "question_sum",
+    "recommendations", "accepted", "rejected", "pending",
+    "ratings", "rating_sum"
+)
+
+CUBE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS analytics_cube (
+    grouping_set SMALLINT NOT NULL,
+    month DATE,
+    strand TEXT,
+    course_id INTEGER,
+    test_type TEXT,
+    attempts BIGINT NOT NULL DEFAULT 0,
+    score_sum BIGINT NOT NULL DEFAULT 0,
+    question_sum BIGINT NOT NULL DEFAULT 0,
+    recommendations BIGINT NOT NULL DEFAULT 0,
+    accepted BIGINT NOT NULL DEFAULT 0,
+    rejected BIGINT NOT NULL DEFAULT 0,
+    pending BIGINT NOT NULL DEFAULT 0,
+    ratings BIGINT NOT NULL DEFAULT 0,
+    rating_sum BIGINT NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_analytics_cube_set ON analytics_cube (grouping_set, month);
+
+CREATE TABLE IF NOT EXISTS analytics_cube_months (
+    month DATE PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 1,
+    refreshed_version BIGINT NOT NULL DEFAULT 0
+);
+
+-- Mark the cube months a statement touched. Uses export_month() (models/snapshots.py)
+-- and rollup_delta_source() (models/rollups.py).
+CREATE OR REPLACE FUNCTION mark_cube_months() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+DECLARE
+    changed TEXT;
+    -- Months of the recommendations (and their feedback) made from the attempts in changed_attempts
+    linked_to_attempts CONSTANT TEXT := $sql$
+        SELECT export_month(r.recommended_at)
+        FROM changed_attempts c JOIN recommendations r ON r.attempt_id = c.attempt_id
+        UNION
+        SELECT export_month(f.created_at::timestamptz)
+        FROM changed_attempts c
+        JOIN recommendations r ON r.attempt_id = c.attempt_id
+        JOIN recommendation_feedback f ON f.recommendation_id = r.recommendation_id
+    $sql$;
+    months TEXT;
+BEGIN
+    changed := rollup_delta_source(TG_OP);
+
+    IF TG_TABLE_NAME = 'user_test_attempts' THEN
+        months := format(
+            'WITH changed_attempts AS (%s) SELECT export_month(attempt_date) FROM changed_attempts UNION %s',
+            changed, linked_to_attempts
+        );
+    ELSIF TG_TABLE_NAME = 'recommendations' THEN
+        months := format($sql$
+            WITH changed_recommendations AS (%s)
+            SELECT export_month(recommended_at) FROM changed_recommendations
+            UNION
+            SELECT export_month(f.created_at::timestamptz)
+            FROM changed_recommendations c
+            JOIN recommendation_feedback f ON f.recommendation_id = c.recommendation_id
+        $sql$, changed);
+    ELSIF TG_TABLE_NAME = 'recommendation_feedback' THEN
+        months := format('SELECT export_month(created_at::timestamptz) FROM (%s) changed', changed);
+    ELSE
+        -- tests: a type change moves the test's attempts and everything made from them
+        months := format($sql$
+            WITH changed_attempts AS (
+                SELECT a.attempt_id, a.attempt_date
+                FROM new_rows n
+                JOIN old_rows o ON o.test_id = n.test_id
+                JOIN user_test_attempts a ON a.test_id = n.test_id
+                WHERE n.test_type IS DISTINCT FROM o.test_type
+            )
+            SELECT export_month(attempt_date) FROM changed_attempts UNION %s
+        $sql$, linked_to_attempts);
+    END IF;
+
+    EXECUTE format($sql$
+        INSERT INTO analytics_cube_months AS m (month)
+        SELECT DISTINCT month FROM (%s) changed(month)
+        ORDER BY 1
+        ON CONFLICT (month) DO UPDATE SET version = m.version + 1
+    $sql$, months);
+    RETURN NULL;
+END
+$$;
+
+-- A strand change moves every fact of the user to another cell. A row trigger (see
+-- cube_trigger_sql), since transition tables cannot be combined with UPDATE OF academic_info.
+CREATE OR REPLACE FUNCTION mark_cube_user_months() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO analytics_cube_months AS m (month)
+    SELECT DISTINCT month FROM (
+        SELECT export_month(attempt_date) FROM user_test_attempts WHERE user_id = NEW.user_id
+        UNION
+        SELECT export_month(recommended_at) FROM recommendations WHERE user_id = NEW.user_id
+        UNION
+        SELECT export_month(created_at::timestamptz) FROM recommendation_feedback WHERE user_id = NEW.user_id
+    ) changed(month)
+    ORDER BY 1
+    ON CONFLICT (month) DO UPDATE SET version = m.version + 1;
+    RETURN NULL;
+END
+$$;
+"""
+
+# (table, operations) watched by mark_cube_months(); tests only on UPDATE
+CUBE_TRIGGER_TABLES = (
+    ("user_test_attempts", ("INSERT", "UPDATE", "DELETE")),
+    ("recommendations", ("INSERT", "UPDATE", "DELETE")),
+    ("recommendation_feedback", ("INSERT", "UPDATE", "DELETE")),
+    ("tests", ("UPDATE",))
+)
+
+CUBE_BACKFILL_MONTHS = """
+    INSERT INTO analytics_cube_months (month)
+    SELECT export_month(attempt_date) FROM user_test_attempts
+    UNION
+    SELECT export_month(recommended_at) FROM recommendations
+    UNION
+    SELECT export_month(created_at::timestamptz) FROM recommendation_feedback
+    ON CONFLICT (month) DO NOTHING
+"""
+
+def cube_trigger_sql():
+    """DDL (re)creating the triggers behind the stale-month tracking"""
+    transitions = {
+        "INSERT": "NEW TABLE AS new_rows",
+        "UPDATE": "OLD TABLE AS old_rows NEW TABLE AS new_rows",
+        "DELETE": "OLD TABLE AS old_rows"
+    }
+    statements = []
+    for table, operations in CUBE_TRIGGER_TABLES:
+        for operation in operations:
+            name = f"cube_{table}_{operation.lower()}"
+            statements.append(f"DROP TRIGGER IF EXISTS {name} ON {table}")
+            statements.append(
+                f"CREATE TRIGGER {name} AFTER {operation} ON {table} REFERENCING {transitions[operation]} "
+                f"FOR EACH STATEMENT EXECUTE FUNCTION mark_cube_months()"
+            )
+    # Only strand changes; logins (last_login) and other profile edits do not fire it
+    statements.append("DROP TRIGGER IF EXISTS cube_users_update ON users")
+    statements.append(
+        "CREATE TRIGGER cube_users_update AFTER UPDATE OF academic_info ON users FOR EACH ROW "
+        "WHEN (OLD.academic_info->>'strand' IS DISTINCT FROM NEW.academic_info->>'strand') "
+        "EXECUTE FUNCTION mark_cube_user_months()"
+    )
+    # Months that already hold facts start out stale
+    statements.append(CUBE_BACKFILL_MONTHS)
+    return statements
+
+# One row per fact with its four dimensions and measures.
+# $1 months, $2 / $3 bounds of those months: lets the timestamp indexes narrow the scan
+CUBE_FACTS = """
+    SELECT
+        export_month(a.attempt_date) as month,
+        COALESCE(NULLIF(u.academic_info->>'strand', ''), 'Unknown') as strand,
+        0 as course_id,
+        COALESCE(t.test_type, 'none') as test_type,
+        1 as attempts, a.score as score_sum, a.total_questions as question_sum,
+        0 as recommendations, 0 as accepted, 0 as rejected, 0 as pending,
+        0 as ratings, 0 as rating_sum
+    FROM user_test_attempts a
+    LEFT JOIN users u ON u.user_id = a.user_id
+    LEFT JOIN tests t ON t.test_id = a.test_id
+    WHERE (a.attempt_date >= $2 AND a.attempt_date < $3 OR a.attempt_date IS NULL)
+      AND export_month(a.attempt_date) = ANY($1::date[])
+    UNION ALL
+    SELECT
+        export_month(r.recommended_at),
+        COALESCE(NULLIF(u.academic_info->>'strand', ''), 'Unknown'),
+        COALESCE(r.course_id, 0),
+        COALESCE(t.test_type, 'none'),
+        0, 0, 0,
+        1, (r.status = 'accepted')::int, (r.status = 'rejected')::int, (r.status = 'pending')::int,
+        0, 0
+    FROM recommendations r
+    LEFT JOIN users u ON u.user_id = r.user_id
+    LEFT JOIN user_test_attempts a ON a.attempt_id = r.attempt_id
+    LEFT JOIN tests t ON t.test_id = a.test_id
+    WHERE (r.recommended_at >= $2 AND r.recommended_at < $3 OR r.recommended_at IS NULL)
+      AND export_month(r.recommended_at) = ANY($1::date[])
+    UNION ALL
+    SELECT
+        export_month(f.created_at::timestamptz),
+        COALESCE(NULLIF(u.academic_info->>'strand', ''), 'Unknown'),
+        COALESCE(r.course_id, 0),
+        COALESCE(t.test_type, 'none'),
+        0, 0, 0,
+        0, 0, 0, 0,
+        1, f.rating
+    FROM recommendation_feedback f
+    LEFT JOIN users u ON u.user_id = f.user_id
+    LEFT JOIN recommendations r ON r.recommendation_id = f.recommendation_id
+    LEFT JOIN user_test_attempts a ON a.attempt_id = r.attempt_id
+    LEFT JOIN tests t ON t.test_id = a.test_id
+    WHERE (f.created_at >= $2 AND f.created_at < $3 OR f.created_at IS NULL)
+      AND export_month(f.created_at::timestamptz) = ANY($1::date[])
+"""
+
+MEASURE_SUMS = ", ".join(f"COALESCE(SUM({measure}), 0)::bigint" for measure in CUBE_MEASURES)
+MEASURE_COLUMNS = ", ".join(CUBE_MEASURES)
+
+# The 8 grouping sets that include month, for the months in $1
+CUBE_MONTH_REFRESH_QUERY = f"""
+    INSERT INTO analytics_cube (grouping_set, month, strand, course_id, test_type, {MEASURE_COLUMNS})
+    SELECT GROUPING(month, strand, course_id, test_type), month, strand, course_id, test_type, {MEASURE_SUMS}
+    FROM ({CUBE_FACTS}) facts
+    GROUP BY month, CUBE(strand, course_id, test_type)
+"""
+
+# The 8 month-less grouping sets, summed from the finest (grouping_set 0) rows
+CUBE_TOTALS_REFRESH_QUERY = f"""
+    INSERT INTO analytics_cube (grouping_set, month, strand, course_id, test_type, {MEASURE_COLUMNS})
+    SELECT 8 | GROUPING(strand, course_id, test_type), NULL, strand, course_id, test_type, {MEASURE_SUMS}
+    FROM analytics_cube
+    WHERE grouping_set = 0
+    GROUP BY CUBE(strand, course_id, test_type)
+"""
+
+def refresh_cube(tx):
+    """Rebuild the months marked stale (and the month-less totals) inside tx; returns the number of months rebuilt"""
+    # The month rows only lock the stale months; the month-less totals are shared by every
+    # refresh, so concurrent refreshes queue here and the later one finds nothing stale
+    tx.execute_query("SELECT pg_advisory_xact_lock(hashtext('analytics_cube'))")
+    months = [
+        row['month'] for row in tx.execute_query("""
+            SELECT month FROM analytics_cube_months
+            WHERE version <> refreshed_version
+            ORDER BY month
+            FOR UPDATE
+        """)
+    ]
+    if not months:
+        return 0
+    bounds = tx.execute_query_one("""
+        SELECT MIN(m) AT TIME ZONE 'UTC' as range_start, (MAX(m) + INTERVAL '1 month') AT TIME ZONE 'UTC' as range_end
+        FROM unnest($1::date[]) m
+    """, [months])
+    tx.execute_query("DELETE FROM analytics_cube WHERE month = ANY($1::date[])", [months], fetch=False)
+    tx.execute_query(
+        CUBE_MONTH_REFRESH_QUERY, [months, bounds['range_start'], bounds['range_end']], fetch=False
+    )
+    tx.execute_query("DELETE FROM analytics_cube WHERE grouping_set & 8 <> 0", fetch=False)
+    tx.execute_query(CUBE_TOTALS_REFRESH_QUERY, fetch=False)
+    tx.execute_query(
+        "UPDATE analytics_cube_months SET refreshed_version = version WHERE month = ANY($1::date[])",
+        [months], fetch=False
+    )
+    return len(months)
+
+def cube_grouping_set(dimensions):
+    """GROUPING() bitmask of the grouping set that keeps exactly these dimensions"""
+    return sum(bit for dimension, (bit, _) in CUBE_DIMENSIONS.items() if dimension not in dimensions)
+
+def cube_query(group_by, strand=None, course_id=None, test_type=None, first_month=None, last_month=None):
+    """
+    SELECT answering one slice / dice from analytics_cube. Reads the grouping set that
+    keeps the group_by dimensions plus every filtered one, then sums away the filtered
+    dimensions that are not grouped on.
+    """
+    filters = [
+        ("strand", "c.strand = ${}", strand),
+        ("course", "c.course_id = ${}", course_id),
+        ("test_type", "c.test_type = ${}", test_type),
+        ("month", "c.month >= ${}", first_month),
+        ("month", "c.month <= ${}", last_month)
+    ]
+    kept = set(group_by) | {dimension for dimension, _, value in filters if value is not None}
+    params = [cube_grouping_set(kept)]
+    conditions = ["c.grouping_set = $1"]
+    for _, condition, value in filters:
+        if value is not None:
+            params.append(value)
+            conditions.append(condition.format(len(params)))
+
+    select_list = []
+    group_list = []
+    for dimension in group_by:
+        column = CUBE_DIMENSIONS[dimension][1]
+        if dimension == "month":
+            select_list.append("to_char(c.month, 'YYYY-MM') as month")
+        elif dimension == "course":
+            select_list += ["c.course_id", "co.course_name"]
+            group_list.append("co.course_name")
+        else:
+            select_list.append(f"c.{column}")
+        group_list.append(f"c.{column}")
+    # Months read chronologically; otherwise the busiest cells first
+    order_list = (["c.month"] if "month" in group_by else []) + ["attempts DESC", "recommendations DESC"]
+    order_list += [expression for expression in group_list if expression != "c.month"]
+    query = f"""
+        SELECT
+            {''.join(expression + ', ' for expression in select_list)}
+            {', '.join(f"COALESCE(SUM(c.{measure}), 0)::bigint as {measure}" for measure in CUBE_MEASURES)}
+        FROM analytics_cube c
+        {'LEFT JOIN courses co ON co.course_id = c.course_id' if 'course' in group_by else ''}
+        WHERE {' AND '.join(conditions)}
+        {'GROUP BY ' + ', '.join(group_list) if group_list else ''}
+        ORDER BY {', '.join(order_list)}
+    """
+    return query, params
+
+def cube_measures(row):
+    """Summed measures of one cube row plus the averages and rates derived from them"""
+    return {
+        "attempts": row['attempts'],
+        "average_score_pct": round(row['score_sum'] * 100 / row['question_sum'], 2) if row['question_sum'] else None,
+        "recommendations": row['recommendations'],
+        "accepted": row['accepted'],
+        "rejected": row['rejected'],
+        "pending": row['pending'],
+        "acceptance_rate": round(row['accepted'] / row['recommendations'], 4) if row['recommendations'] else None,
+        "ratings": row['ratings'],
+        "average_rating": round(row['rating_sum'] / row['ratings'], 2) if row['ratings'] else None
+    }
+
+def read_cube(group_by, strand=None, course_id=None, test_type=None, first_month=None, last_month=None):
+    """
+    Refresh stale months, then answer one slice of the cube and its totals.
+    Runs on the primary, since stale months are rewritten before they are read.
+    """
+    with transaction() as tx:
+        refreshed = refresh_cube(tx)
+        rows = tx.execute_query(*cube_query(group_by, strand, course_id, test_type, first_month, last_month))
+        totals = tx.execute_query_one(*cube_query([], strand, course_id, test_type, first_month, last_month))
+    return refreshed, rows, totals
+
+async def get_cube(group_by, strand=None, course_id=None, test_type=None, first_month=None, last_month=None):
+    """Awaitable read_cube"""
+    return await run_in_db_executor(read_cube, group_by, strand, course_id, test_type, first_month, last_month)
@@ -0,0 +1,90 @@
+"""
+Admin dashboard summary: headline counts plus the most recent signups, attempts,
+recommendations and feedback, read from one REPEATABLE READ snapshot so the
+counts and the lists agree. Counts come from the stats snapshot query (rollup
+tables); each list is a LIMIT over an index on its timestamp column.
+"""
+
+from models.database import transaction_async
+from models.stats import STATS_SNAPSHOT_QUERY
+
+DEFAULT_RECENT = 5
+MAX_RECENT = 20
+
+# Backs the recent signups list (the other timestamps are indexed by models/snapshots.py)
+DASHBOARD_SCHEMA = """
+CREATE INDEX IF NOT EXISTS idx_users_created_at ON users (created_at);
+"""
+
+# Tables the summary is read from, rollups included; for @cached_result
+DASHBOARD_TABLES = ("users", "courses", "tests", "user_test_attempts", "recommendations", "recommendation_feedback")
+
+FEEDBACK_TOTAL_QUERY = """
+    SELECT COALESCE(SUM(feedback_count), 0)::bigint as total_feedback
+    FROM feedback_rating_rollup
+"""
+
+# $1 number of rows per list
+RECENT_QUERIES = {
+    "signups": """
+        SELECT user_id, CONCAT(first_name, ' ', last_name) as user_name, email, created_at
+        FROM users
+        WHERE created_at IS NOT NULL
+        ORDER BY created_at DESC
+        LIMIT $1
+    """,
+    "attempts": """
+        SELECT
+            a.attempt_id, a.user_id, CONCAT(u.first_name, ' ', u.last_name) as user_name,
+            a.test_id, t.test_name, a.score, a.total_questions, a.attempt_date
+        FROM (
+            SELECT attempt_id, user_id, test_id, score, total_questions, attempt_date
+            FROM user_test_attempts
+            WHERE attempt_date IS NOT NULL
+            ORDER BY attempt_date DESC
+            LIMIT $1
+        ) a
+        JOIN users u ON u.user_id = a.user_id
+        JOIN tests t ON t.test_id = a.test_id
+        ORDER BY a.attempt_date DESC
+    """,
+    "recommendations": """
+        SELECT
+            r.recommendation_id, r.user_id, CONCAT(u.first_name, ' ', u.last_name) as user_name,
+            r.course_id, c.course_name, r.status, r.recommended_at
+        FROM (
+            SELECT recommendation_id, user_id, course_id, status, recommended_at
+            FROM recommendations
+            WHERE recommended_at IS NOT NULL
+            ORDER BY recommended_at DESC
+            LIMIT $1
+        ) r
+        LEFT JOIN users u ON u.user_id = r.user_id
+        LEFT JOIN courses c ON c.course_id = r.course_id
+        ORDER BY r.recommended_at DESC
+    """,
+    "feedback": """
+        SELECT
+            f.feedback_id, f.recommendation_id, f.user_id,
+            CONCAT(u.first_name, ' ', u.last_name) as user_name, f.rating, f.created_at
+        FROM (
+            SELECT feedback_id, recommendation_id, user_id, rating, created_at
+            FROM recommendation_feedback
+            WHERE created_at IS NOT NULL
+            ORDER BY created_at DESC
+            LIMIT $1
+        ) f
+        LEFT JOIN users u ON u.user_id = f.user_id
+        ORDER BY f.created_at DESC
+    """
+}
+
+async def get_dashboard_summary(recent=DEFAULT_RECENT):
+    """(stats snapshot row, total feedback, {list name: rows}) from one snapshot"""
+    async with transaction_async(readonly=True, isolation='REPEATABLE READ') as tx:
+        stats = await tx.execute_query_one(STATS_SNAPSHOT_QUERY, prepared=True)
+        feedback = await tx.execute_query_one(FEEDBACK_TOTAL_QUERY, prepared=True)
+        lists = {}
+        for name, query in RECENT_QUERIES.items():
+            lists[name] = await tx.execute_query(query, [recent], prepared=True) if recent else []
+    return stats, feedback['total_feedback'], lists
@@ -1,30 +1,320 @@
+import asyncio
+import contextvars
+import datetime
+import functools
+import json
+import re
+import threading
+import time
+import uuid
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager, asynccontextmanager
 import psycopg2
+import psycopg2.errors
+import psycopg2.extensions
 from psycopg2 import pool
-from psycopg2.extras import RealDictCursor
+from psycopg2.sql import SQL, Identifier
+from psycopg2.extras import RealDictCursor, execute_batch, execute_values
+from concurrent.futures import ThreadPoolExecutor
 import os
 from dotenv import load_dotenv
+from models.query_stats import track_statement, query_stats
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; column mode falls back to lists
+    np = None
 
 load_dotenv()
 
-# PostgreSQL connection pool
-connection_pool = None
+def _pool_max_from_env():
+    """Per-worker connection ceiling: DB_POOL_MAX, or DB_MAX_CONNECTIONS split across WEB_CONCURRENCY workers"""
+    if os.getenv('DB_POOL_MAX'):
+        return int(os.getenv('DB_POOL_MAX'))
+    if os.getenv('DB_MAX_CONNECTIONS'):
+        workers = max(int(os.getenv('WEB_CONCURRENCY', '1')), 1)
+        return max(int(os.getenv('DB_MAX_CONNECTIONS')) // workers, 1)
+    return 20
+
+# Pool bounds. The async helpers take one of a workload's connection slots (get_db_slots)
+# before they use an executor thread, and a transaction keeps its slot until it ends.
+# There is one slot per executor thread, so a pinned transaction always finds a
+# thread for its next statement, even when every connection is checked out.
+DB_POOL_MAX = _pool_max_from_env()
+DB_POOL_MIN = min(int(os.getenv('DB_POOL_MIN', '1')), DB_POOL_MAX)
+# Idle connections kept open between bursts (psycopg2 would close everything above min)
+DB_POOL_MAX_IDLE = min(int(os.getenv('DB_POOL_MAX_IDLE', str(DB_POOL_MAX))), DB_POOL_MAX)
+# Seconds a caller may queue for a connection before giving up
+DB_POOL_ACQUIRE_TIMEOUT = float(os.getenv('DB_POOL_ACQUIRE_TIMEOUT', '10'))
+# Rows fetched per round trip when streaming through a server-side cursor
+DB_ITERSIZE = int(os.getenv('DB_ITERSIZE', '2000'))
+# Streams (iter_query_async) pin a connection for the whole response; at most this many
+# per workload class at once, so slow downloads cannot starve short queries of connections
+DB_STREAM_MAX = int(os.getenv('DB_STREAM_MAX', '2'))
+# Bytes requested per read when feeding COPY FROM STDIN
+DB_COPY_BUFFER_SIZE = int(os.getenv('DB_COPY_BUFFER_SIZE', str(64 * 1024)))
+# Server-side prepared statements kept per pooled connection (LRU)
+DB_STATEMENT_CACHE_SIZE = int(os.getenv('DB_STATEMENT_CACHE_SIZE', '64'))
+
+# Optional read replica (libpq DSN/URI); read-only endpoints use it while it is healthy and caught up
+DB_REPLICA_DSN = os.getenv('DB_REPLICA_DSN', '')
+DB_REPLICA_POOL_MAX = int(os.getenv('DB_REPLICA_POOL_MAX', str(DB_POOL_MAX))) if DB_REPLICA_DSN else 0
+# Replication lag (seconds) beyond which reads fall back to the primary
+DB_REPLICA_MAX_LAG = float(os.getenv('DB_REPLICA_MAX_LAG', '10'))
+# How often (seconds) the replica's lag is re-checked
+DB_REPLICA_CHECK_INTERVAL = float(os.getenv('DB_REPLICA_CHECK_INTERVAL', '5'))
+
+# Workload class budgets, carved out of DB_POOL_MAX so the per-worker ceiling still holds.
+# Analytics gets its own small pool so long aggregates can never take login's connections.
+DB_ANALYTICS_POOL_MAX = int(os.getenv('DB_ANALYTICS_POOL_MAX', str(max(DB_POOL_MAX // 4, 1))))
+DB_MAINTENANCE_POOL_MAX = int(os.getenv('DB_MAINTENANCE_POOL_MAX', '1'))
+DB_OLTP_POOL_MAX = max(DB_POOL_MAX - DB_ANALYTICS_POOL_MAX - DB_MAINTENANCE_POOL_MAX, 1)
+# Per-statement time budgets (ms, 0 = unlimited); PostgreSQL cancels statements that exceed them
+DB_OLTP_STATEMENT_TIMEOUT_MS = int(os.getenv('DB_OLTP_STATEMENT_TIMEOUT_MS', '5000'))
+DB_ANALYTICS_STATEMENT_TIMEOUT_MS = int(os.getenv('DB_ANALYTICS_STATEMENT_TIMEOUT_MS', '30000'))
+DB_MAINTENANCE_STATEMENT_TIMEOUT_MS = int(os.getenv('DB_MAINTENANCE_STATEMENT_TIMEOUT_MS', '0'))
+# Sort/hash memory for analytics aggregates, so big GROUP BYs stay off disk
+DB_ANALYTICS_WORK_MEM = os.getenv('DB_ANALYTICS_WORK_MEM', '64MB')
 
-def get_db_pool():
-    """Initialize and return the database connection pool"""
-    global connection_pool
+class WorkloadClass:
+    """Connection budget, statement timeout and session settings for one kind of database work"""
+    
+    def __init__(self, name, pool_max, statement_timeout_ms, settings=None, pool_min=0):
+        self.name = name
+        self.pool_max = pool_max
+        self.pool_min = min(pool_min, pool_max)
+        self.statement_timeout_ms = statement_timeout_ms
+        self.settings = {"statement_timeout": statement_timeout_ms, **(settings or {})}
+        # Replica connections are split across workloads in the same proportions
+        self.replica_pool_max = max(round(DB_REPLICA_POOL_MAX * pool_max / DB_POOL_MAX), 1) if DB_REPLICA_POOL_MAX else 0
+    
+    @property
+    def options(self):
+        """libpq startup options, so settings apply from connect with no per-checkout SET"""
+        return ' '.join(f'-c {name}={value}' for name, value in self.settings.items())
+    
+    def describe(self):
+        return {
+            "pool_max": self.pool_max,
+            "replica_pool_max": self.replica_pool_max,
+            "statement_timeout_ms": self.statement_timeout_ms,
+            "settings": self.settings
+        }
+
+WORKLOADS = {
+    # Short interactive requests: logins, single-row reads, writes
+    'oltp': WorkloadClass('oltp', DB_OLTP_POOL_MAX, DB_OLTP_STATEMENT_TIMEOUT_MS, pool_min=DB_POOL_MIN),
+    # Dashboards, reports, exports: long scans and big aggregates
+    'analytics': WorkloadClass('analytics', DB_ANALYTICS_POOL_MAX, DB_ANALYTICS_STATEMENT_TIMEOUT_MS, {
+        "work_mem": DB_ANALYTICS_WORK_MEM
+    }),
+    # Scripts and background rebuilds that may legitimately run for minutes
+    'maintenance': WorkloadClass('maintenance', DB_MAINTENANCE_POOL_MAX, DB_MAINTENANCE_STATEMENT_TIMEOUT_MS, {
+        "work_mem": DB_ANALYTICS_WORK_MEM
+    })
+}
+
+class PoolTimeoutError(pool.PoolError):
+    """Raised when no connection became free within the acquire timeout"""
+    pass
+
+class StreamLimitError(Exception):
+    """Raised when a workload class already has its maximum number of streams open"""
+    pass
+
+class ObservableConnectionPool(pool.ThreadedConnectionPool):
+    """Thread-safe pool that queues callers when exhausted and records acquire metrics"""
+    
+    # Upper bounds (ms) of the acquire-wait histogram buckets; the last bucket is open-ended
+    WAIT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+    
+    def __init__(self, minconn, maxconn, *args, acquire_timeout=DB_POOL_ACQUIRE_TIMEOUT,
+                 max_idle=DB_POOL_MAX_IDLE, **kwargs):
+        self.acquire_timeout = acquire_timeout
+        self.max_idle = max(max_idle, minconn)
+        self._available = threading.Condition()
+        self.waiters = 0
+        self.acquired_total = 0
+        self.timeouts_total = 0
+        self.wait_seconds_total = 0.0
+        self.wait_histogram = [0] * (len(self.WAIT_BUCKETS_MS) + 1)
+        super().__init__(minconn, maxconn, *args, **kwargs)
     
-    if connection_pool is None:
+    def getconn(self, key=None, timeout=None):
+        """Get a connection, waiting up to timeout seconds for one to be returned"""
+        timeout = self.acquire_timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        with self._available:
+            while len(self._used) >= self.maxconn and key not in self._used:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.timeouts_total += 1
+                    raise PoolTimeoutError(
+                        f"No database connection available after {timeout:g}s "
+                        f"({self.maxconn} in use, {self.waiters} waiting)"
+                    )
+                self.waiters += 1
+                try:
+                    self._available.wait(remaining)
+                finally:
+                    self.waiters -= 1
+            conn = super().getconn(key)
+            self._record_wait(time.monotonic() - started)
+            return conn
+    
+    def putconn(self, conn=None, key=None, close=False):
+        """Return a connection and wake one queued caller"""
+        with self._available:
+            super().putconn(conn, key, close)
+            self._available.notify()
+    
+    def _putconn(self, conn, key=None, close=False):
+        """Same as psycopg2's _putconn, but keeps up to max_idle connections instead of minconn"""
+        if self.closed:
+            raise pool.PoolError("connection pool is closed")
+        
+        if key is None:
+            key = self._rused.get(id(conn))
+            if key is None:
+                raise pool.PoolError("trying to put unkeyed connection")
+        
+        if len(self._pool) < self.max_idle and not close and not conn.closed:
+            status = conn.info.transaction_status
+            if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                # server connection lost
+                conn.close()
+            else:
+                if status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                self._pool.append(conn)
+        elif not conn.closed:
+            conn.close()
+        
+        if not self.closed or key in self._used:
+            del self._used[key]
+            del self._rused[id(conn)]
+    
+    def closeall(self):
+        with self._available:
+            super().closeall()
+            self._available.notify_all()
+    
+    def _record_wait(self, waited):
+        self.acquired_total += 1
+        self.wait_seconds_total += waited
+        waited_ms = waited * 1000
+        for index, bound in enumerate(self.WAIT_BUCKETS_MS):
+            if waited_ms <= bound:
+                self.wait_histogram[index] += 1
+                return
+        self.wait_histogram[-1] += 1
+    
+    def stats(self):
+        """Snapshot of pool occupancy and acquire-wait metrics"""
+        with self._available:
+            buckets = {f"le_{bound}ms": count for bound, count in zip(self.WAIT_BUCKETS_MS, self.wait_histogram)}
+            buckets["gt_5000ms"] = self.wait_histogram[-1]
+            return {
+                "min_connections": self.minconn,
+                "max_connections": self.maxconn,
+                "max_idle": self.max_idle,
+                "in_use": len(self._used),
+                "idle": len(self._pool),
+                "waiters": self.waiters,
+                "acquire_timeout_seconds": self.acquire_timeout,
+                "acquired_total": self.acquired_total,
+                "timeouts_total": self.timeouts_total,
+                "acquire_wait": {
+                    "total_seconds": round(self.wait_seconds_total, 6),
+                    "average_ms": round(self.wait_seconds_total * 1000 / self.acquired_total, 3) if self.acquired_total else 0,
+                    "histogram": buckets
+                }
+            }
+
+# PostgreSQL connection pools, one per workload class
+connection_pools = {}
+# Read replica connection pools per workload class (only when DB_REPLICA_DSN is set)
+replica_pools = {}
+# Guards lazy pool creation when several threads hit the first query at once
+_pool_init_lock = threading.Lock()
+
+# Which server the current request's reads prefer; set per request by use_read_replica
+db_route = contextvars.ContextVar('db_route', default='primary')
+# Workload class of the current request or script; set per router by use_workload
+db_workload = contextvars.ContextVar('db_workload', default='oltp')
+# Connections checked out by the current executor call, so a cancelled await can cancel them
+active_connections = contextvars.ContextVar('active_connections', default=None)
+
+# Result of the most recent replica health/lag check
+replica_status = {
+    "healthy": False,
+    "lag_seconds": None,
+    "checked_at": None,
+    "last_error": None
+}
+_replica_check_lock = threading.Lock()
+_replica_checked_monotonic = 0.0
+
+REPLICA_LAG_QUERY = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM NOW() - pg_last_xact_replay_timestamp()), 0)
+    END as lag_seconds
+"""
+
+# Worker threads that run the blocking psycopg2 calls for the async helpers, per workload class
+db_executors = {}
+
+def get_workload(name=None):
+    """Return the named workload class, or the current request's"""
+    name = name or db_workload.get()
+    if name not in WORKLOADS:
+        raise ValueError(f"Unknown workload class: {name}")
+    return WORKLOADS[name]
+
+@functools.lru_cache(maxsize=None)
+def use_workload(name):
+    """
+    Router/route dependency declaring which workload class an endpoint's queries belong to:
+    APIRouter(..., dependencies=[Depends(use_workload('analytics'))])
+    """
+    get_workload(name)
+    
+    async def set_workload():
+        db_workload.set(name)
+    
+    return set_workload
+
+def get_db_pool(workload=None):
+    """Initialize and return the database connection pool for a workload class (default: current)"""
+    workload = get_workload(workload)
+    connection_pool = connection_pools.get(workload.name)
+    
+    if connection_pool is not None:
+        return connection_pool
+    
+    with _pool_init_lock:
+        if workload.name in connection_pools:
+            return connection_pools[workload.name]
         try:
-            connection_pool = psycopg2.pool.SimpleConnectionPool(
-                1, 20,  # min and max connections
+            connection_pool = ObservableConnectionPool(
+                workload.pool_min, workload.pool_max,  # min and max connections
+                max_idle=min(DB_POOL_MAX_IDLE, workload.pool_max),
                 host=os.getenv('DB_HOST', 'localhost'),
                 port=os.getenv('DB_PORT', '5432'),
                 database=os.getenv('DB_NAME', 'coursepro_db'),
                 user=os.getenv('DB_USER', 'postgres'),
-                password=os.getenv('DB_PASSWORD')
+                password=os.getenv('DB_PASSWORD'),
+                options=workload.options,
+                connection_factory=StatementCachingConnection
             )
-            print('✅ PostgreSQL database connected successfully')
-            print(f'   Connected to: {os.getenv("DB_HOST")}:{os.getenv("DB_PORT")}/{os.getenv("DB_NAME")}')
+            connection_pools[workload.name] = connection_pool
+            if workload.name == 'oltp':
+                print('✅ PostgreSQL database connected successfully')
+                print(f'   Connected to: {os.getenv("DB_HOST")}:{os.getenv("DB_PORT")}/{os.getenv("DB_NAME")}')
         except Exception as error:
             print(f'❌ Database connection failed: {error}')
             print('   Make sure PostgreSQL is running and credentials are correct in .env file')
@@ -32,71 +322,611 @@ def get_db_pool():
     
     return connection_pool
 
-def get_db_connection():
-    """Get a connection from the pool"""
-    pool = get_db_pool()
-    return pool.getconn()
+def get_replica_pool(workload=None):
+    """Initialize and return a workload's read replica pool (None when no replica is configured)"""
+    if not DB_REPLICA_DSN:
+        return None
+    workload = get_workload(workload)
+    replica_pool = replica_pools.get(workload.name)
+    
+    if replica_pool is not None:
+        return replica_pool
+    
+    with _pool_init_lock:
+        if workload.name not in replica_pools:
+            replica_pools[workload.name] = ObservableConnectionPool(
+                0, workload.replica_pool_max,
+                DB_REPLICA_DSN,
+                max_idle=workload.replica_pool_max,
+                options=workload.options,
+                connection_factory=StatementCachingConnection
+            )
+            print(f'✅ Read replica pool created ({workload.name})')
+    
+    return replica_pools[workload.name]
+
+def check_replica():
+    """Measure the replica's replication lag and record whether it is usable"""
+    global _replica_checked_monotonic
+    _replica_checked_monotonic = time.monotonic()
+    conn = None
+    try:
+        replica = get_replica_pool('oltp')
+        conn = replica.getconn(timeout=1)
+        lag = float(fetch_statement_one(conn, REPLICA_LAG_QUERY)['lag_seconds'])
+        replica_status.update(healthy=True, lag_seconds=lag, last_error=None)
+    except Exception as error:
+        replica_status.update(healthy=False, last_error=str(error))
+    finally:
+        replica_status["checked_at"] = time.time()
+        if conn is not None:
+            replica.putconn(conn)
+
+def replica_available():
+    """True when reads may go to the replica: configured, reachable and within DB_REPLICA_MAX_LAG"""
+    if not DB_REPLICA_DSN:
+        return False
+    if time.monotonic() - _replica_checked_monotonic >= DB_REPLICA_CHECK_INTERVAL:
+        # Only one thread re-checks; the rest use the previous result meanwhile
+        if _replica_check_lock.acquire(blocking=False):
+            try:
+                check_replica()
+            finally:
+                _replica_check_lock.release()
+    return replica_status["healthy"] and replica_status["lag_seconds"] <= DB_REPLICA_MAX_LAG
+
+async def use_read_replica():
+    """
+    Router/route dependency marking an endpoint as read-only, so its reads go to the
+    replica when one is available: APIRouter(..., dependencies=[Depends(use_read_replica)])
+    """
+    db_route.set('replica')
+
+def is_read_query(query):
+    """Plain SELECTs may be served by the replica; anything else goes to the primary"""
+    return query.lstrip().lstrip('(').upper().startswith('SELECT')
+
+def get_db_connection(read_only=False):
+    """Get a connection from the pool (the replica's pool for reads on replica-routed requests)"""
+    pool = None
+    if read_only and db_route.get() == 'replica' and replica_available():
+        pool = get_replica_pool()
+    try:
+        conn = (pool or get_db_pool()).getconn()
+    except psycopg2.OperationalError as error:
+        if pool is None:
+            raise
+        # Replica went away between checks; remember that and use the primary
+        replica_status.update(healthy=False, last_error=str(error))
+        pool = get_db_pool()
+        conn = pool.getconn()
+    conn.owner_pool = pool or get_db_pool()
+    active = active_connections.get()
+    if active is not None:
+        active.add(conn)
+    return conn
 
 def release_db_connection(conn):
-    """Return a connection to the pool"""
-    pool = get_db_pool()
+    """Return a connection to the pool it came from"""
+    active = active_connections.get()
+    if active is not None:
+        active.discard(conn)
+    pool = getattr(conn, 'owner_pool', None) or get_db_pool()
     pool.putconn(conn)
 
-def execute_query(query, params=None, fetch=True):
-    """Execute a database query"""
-    conn = None
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-        # Convert $1, $2 style to %s style for psycopg2
-        if params:
-            # Replace $1, $2, etc with %s
-            import re
-            query = re.sub(r'\$\d+', '%s', query)
-        cursor.execute(query, params or ())
-        
-        if fetch:
-            result = cursor.fetchall()
-            cursor.close()
-            return result
+def is_query_cancelled(error):
+    """True when PostgreSQL cancelled the statement (statement_timeout or a cancel request)"""
+    return isinstance(error, psycopg2.errors.QueryCanceled)
+
+# Matches $1, $2 ... placeholders in route SQL
+PARAM_PATTERN = re.compile(r'\$(\d+)')
+
+@functools.lru_cache(maxsize=1024)
+def translate_query(query):
+    """
+    Translate a $N-style query to psycopg2's %s style once per SQL shape.
+    Returns the translated SQL and the 1-based parameter number each %s consumes,
+    so repeated or out-of-order placeholders still bind the right values.
+    Queries without $N placeholders (already in %s style) are returned unchanged.
+    """
+    order = tuple(int(number) for number in PARAM_PATTERN.findall(query))
+    if not order:
+        return query, order
+    # In $N-style SQL every % is a literal (e.g. modulo), so escape it for psycopg2
+    return PARAM_PATTERN.sub('%s', query.replace('%', '%%')), order
+
+def bind_params(query, params):
+    """Return (sql, params) ready for cursor.execute"""
+    if not params:
+        # None, not (), so psycopg2 leaves literal % in parameterless SQL alone
+        return query, None
+    sql, order = translate_query(query)
+    if not order:
+        return sql, params
+    return sql, [params[number - 1] for number in order]
+
+class StatementCacheStats:
+    """Process-wide prepared statement counters"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def record(self, hit=False, miss=False, eviction=False):
+        with self._lock:
+            self.hits += hit
+            self.misses += miss
+            self.evictions += eviction
+    
+    def snapshot(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0
+            }
+
+statement_cache_stats = StatementCacheStats()
+
+class StatementCachingConnection(psycopg2.extensions.connection):
+    """Pooled connection: autocommit by default, remembers which SQL shapes it has server-side prepared"""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Standalone statements commit on their own; transaction() switches this off
+        self.autocommit = True
+        # SQL text -> prepared statement name, least recently used first
+        self.prepared_statements = OrderedDict()
+        self.statement_counter = 0
+
+def prepare_statement(cursor, query):
+    """Return the name of the server-side prepared statement for query on this cursor's connection"""
+    conn = cursor.connection
+    cache = conn.prepared_statements
+    name = cache.get(query)
+    if name is not None:
+        cache.move_to_end(query)
+        statement_cache_stats.record(hit=True)
+        return name
+    
+    conn.statement_counter += 1
+    name = f"stmt_{conn.statement_counter}"
+    cursor.execute(f"PREPARE {name} AS {query}")
+    cache[query] = name
+    statement_cache_stats.record(miss=True)
+    
+    if len(cache) > DB_STATEMENT_CACHE_SIZE:
+        _, evicted = cache.popitem(last=False)
+        cursor.execute(f"DEALLOCATE {evicted}")
+        statement_cache_stats.record(eviction=True)
+    return name
+
+def run_statement(cursor, query, params=None, prepared=False):
+    """Execute $N-style SQL on cursor, by prepared statement handle when requested"""
+    _, order = translate_query(query)
+    # Only $N-style SQL can be prepared; %s-style queries take the plain path
+    if prepared and (order or not params) and hasattr(cursor.connection, 'prepared_statements'):
+        name = prepare_statement(cursor, query)
+        count = max(order) if order else 0
+        if count:
+            cursor.execute(f"EXECUTE {name} ({', '.join(['%s'] * count)})", list(params)[:count])
         else:
-            conn.commit()
-            cursor.close()
-            return cursor.rowcount
-    except Exception as error:
-        if conn:
-            conn.rollback()
-        raise error
+            cursor.execute(f"EXECUTE {name}")
+        return
+    sql, bound = bind_params(query, params)
+    cursor.execute(sql, bound)
+
+def fetch_statement(conn, query, params=None, fetch=True, prepared=False):
+    """Run one statement on conn; return all rows, or the row count when fetch is False"""
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
+    try:
+        with track_statement(query, params) as tracked:
+            run_statement(cursor, query, params, prepared)
+            result = cursor.fetchall() if fetch else cursor.rowcount
+            tracked["rows"] = len(result) if fetch else cursor.rowcount
+        return result
     finally:
-        if conn:
-            release_db_connection(conn)
+        cursor.close()
 
-def execute_query_one(query, params=None):
-    """Execute a query and return one result"""
-    conn = None
+def fetch_statement_one(conn, query, params=None, prepared=False):
+    """Run one statement on conn and return its first row (None if it returns no rows)"""
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-        # Convert $1, $2 style to %s style for psycopg2
-        if params:
-            import re
-            query = re.sub(r'\$\d+', '%s', query)
-        cursor.execute(query, params or ())
-        
-        # Commit for INSERT, UPDATE, DELETE statements
-        if any(keyword in query.upper() for keyword in ['INSERT', 'UPDATE', 'DELETE']):
-            conn.commit()
-        
-        result = cursor.fetchone()
+        with track_statement(query, params) as tracked:
+            run_statement(cursor, query, params, prepared)
+            row = cursor.fetchone() if cursor.description else None
+            tracked["rows"] = cursor.rowcount
+        return row
+    finally:
         cursor.close()
-        return result
-    except Exception as error:
-        if conn:
-            conn.rollback()
-        raise error
+
+def fetch_statement_rows(conn, query, params=None, prepared=False):
+    """Run one statement on conn; return (column names, rows as plain tuples)"""
+    cursor = conn.cursor()
+    try:
+        with track_statement(query, params) as tracked:
+            run_statement(cursor, query, params, prepared)
+            rows = cursor.fetchall()
+            tracked["rows"] = len(rows)
+        return [column.name for column in cursor.description], rows
+    finally:
+        cursor.close()
+
+# Postgres type OIDs that convert cleanly to NumPy arrays
+INTEGER_TYPE_OIDS = {20, 21, 23}          # int8, int2, int4
+FLOAT_TYPE_OIDS = {700, 701, 1700}        # float4, float8, numeric
+
+def rows_to_columns(description, rows):
+    """
+    Pivot tuple rows into {column: values}. With NumPy installed, integer and
+    float/numeric columns become arrays (float64 with NaN for NULLs); others stay lists.
+    """
+    columns = {}
+    for index, column in enumerate(description):
+        values = [row[index] for row in rows]
+        if np is not None and column.type_code in INTEGER_TYPE_OIDS | FLOAT_TYPE_OIDS:
+            if column.type_code in INTEGER_TYPE_OIDS and None not in values:
+                values = np.array(values, dtype=np.int64)
+            else:
+                values = np.array([float('nan') if value is None else float(value) for value in values], dtype=np.float64)
+        columns[column.name] = values
+    return columns
+
+def fetch_statement_columns(conn, query, params=None, prepared=False):
+    """Run one statement on conn and return its result pivoted into columns"""
+    cursor = conn.cursor()
+    try:
+        with track_statement(query, params) as tracked:
+            run_statement(cursor, query, params, prepared)
+            rows = cursor.fetchall()
+            tracked["rows"] = len(rows)
+        return rows_to_columns(cursor.description, rows)
+    finally:
+        cursor.close()
+
+def execute_batch_statement(conn, query, params_list, page_size=1000):
+    """Run one statement per parameter set on conn in batched round trips"""
+    cursor = conn.cursor()
+    try:
+        sql, order = translate_query(query)
+        if order:
+            params_list = [[params[number - 1] for number in order] for params in params_list]
+        with track_statement(query) as tracked:
+            execute_batch(cursor, sql, params_list, page_size=page_size)
+            tracked["rows"] = len(params_list)
+        return len(params_list)
+    finally:
+        cursor.close()
+
+def insert_values_statement(conn, query, rows, page_size=1000, fetch=False, template=None):
+    """
+    Run a multi-row INSERT on conn: query has a single VALUES %s that is expanded
+    to page_size rows per statement. With fetch=True the RETURNING rows of every
+    page are returned (as dicts, in input order); otherwise the number of rows inserted.
+    """
+    rows = rows if isinstance(rows, (list, tuple)) else list(rows)
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
+    try:
+        with track_statement(query) as tracked:
+            returned = execute_values(cursor, query, rows, template=template, page_size=page_size, fetch=fetch)
+            tracked["rows"] = len(rows)
+        return returned if fetch else len(rows)
     finally:
-        if conn:
-            release_db_connection(conn)
+        cursor.close()
+
+# Characters COPY's text format needs escaped, and their escapes
+COPY_SPECIAL_CHARACTERS = re.compile(r'[\\\t\n\r]')
+COPY_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+def copy_text_value(value):
+    """Encode one value for COPY's text format"""
+    kind = type(value)
+    if kind is int or kind is float:
+        return str(value)
+    if value is None:
+        return '\\N'
+    if kind is bool:
+        return 't' if value else 'f'
+    if kind is str:
+        text = value
+    elif isinstance(value, (dict, list)):
+        text = json.dumps(value, default=str)
+    elif isinstance(value, (datetime.date, datetime.time)):
+        text = value.isoformat()
+    else:
+        text = str(value)
+    return text.translate(COPY_ESCAPES) if COPY_SPECIAL_CHARACTERS.search(text) else text
+
+class CopyRowReader:
+    """File-like object that encodes rows to COPY text format only as COPY reads them"""
+    
+    def __init__(self, rows, columns):
+        self.rows = iter(rows)
+        self.columns = columns
+        self.buffer = b''
+        self.count = 0
+    
+    def encode_row(self, row):
+        if isinstance(row, dict):
+            row = [row[column] for column in self.columns]
+        return ('\t'.join(copy_text_value(value) for value in row) + '\n').encode()
+    
+    def read(self, size=-1):
+        parts = [self.buffer]
+        length = len(self.buffer)
+        while size < 0 or length < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            line = self.encode_row(row)
+            parts.append(line)
+            length += len(line)
+            self.count += 1
+        data = b''.join(parts)
+        if size < 0 or len(data) <= size:
+            self.buffer = b''
+            return data
+        self.buffer = data[size:]
+        return data[:size]
+    
+    readline = read
+
+def copy_rows_statement(conn, table, columns, rows):
+    """
+    COPY rows (tuples in column order, or dicts keyed by column) from any iterable
+    into table on conn. Rows are encoded lazily, so generators stream with flat memory.
+    Returns the number of rows copied.
+    """
+    statement = SQL("COPY {} ({}) FROM STDIN").format(
+        Identifier(*table.split('.')),
+        SQL(', ').join(Identifier(column) for column in columns)
+    ).as_string(conn)
+    reader = CopyRowReader(rows, columns)
+    cursor = conn.cursor()
+    try:
+        with track_statement(statement) as tracked:
+            cursor.copy_expert(statement, reader, size=DB_COPY_BUFFER_SIZE)
+            tracked["rows"] = reader.count
+        return reader.count
+    finally:
+        cursor.close()
+
+def execute_query(query, params=None, fetch=True, prepared=False):
+    """Execute a database query (pool connections run standalone statements in autocommit)"""
+    conn = get_db_connection(read_only=fetch and is_read_query(query))
+    try:
+        return fetch_statement(conn, query, params, fetch, prepared)
+    finally:
+        release_db_connection(conn)
+
+def execute_query_one(query, params=None, prepared=False):
+    """Execute a query and return one result"""
+    conn = get_db_connection(read_only=is_read_query(query))
+    try:
+        return fetch_statement_one(conn, query, params, prepared)
+    finally:
+        release_db_connection(conn)
+
+def execute_query_rows(query, params=None, prepared=False):
+    """
+    Execute a query and return (columns, rows) with rows as plain tuples.
+    Much cheaper than the default dict rows for large aggregate/export results.
+    """
+    conn = get_db_connection(read_only=is_read_query(query))
+    try:
+        return fetch_statement_rows(conn, query, params, prepared)
+    finally:
+        release_db_connection(conn)
+
+def execute_query_columns(query, params=None, prepared=False):
+    """Execute a query and return {column: values} (NumPy arrays for numeric columns when available)"""
+    conn = get_db_connection(read_only=is_read_query(query))
+    try:
+        return fetch_statement_columns(conn, query, params, prepared)
+    finally:
+        release_db_connection(conn)
+
+def execute_many(query, params_list, page_size=1000):
+    """Execute a statement once per parameter set in batched round trips, all or nothing"""
+    with transaction() as tx:
+        return tx.execute_many(query, params_list, page_size)
+
+def insert_many(query, rows, page_size=1000, fetch=False, template=None):
+    """
+    Multi-row INSERT ... VALUES %s [RETURNING ...], all or nothing:
+    
+        ids = insert_many("INSERT INTO user_test_attempts (user_id, test_id, score) VALUES %s RETURNING attempt_id",
+                          [(1, 1, 8), (2, 1, 9)], fetch=True)
+    """
+    with transaction() as tx:
+        return tx.insert_many(query, rows, page_size, fetch, template)
+
+def copy_rows(table, columns, rows):
+    """COPY rows from an iterable into table, all or nothing; fastest path when no RETURNING is needed"""
+    with transaction() as tx:
+        return tx.copy_rows(table, columns, rows)
+
+def iter_query(query, params=None, itersize=DB_ITERSIZE):
+    """
+    Generator over a query's rows backed by a server-side cursor, so only
+    itersize rows are held in memory at a time. Keeps a connection (and its
+    transaction) until the generator is exhausted or closed.
+    """
+    with transaction(readonly=True) as tx:
+        yield from tx.iter_query(query, params, itersize)
+
+class Transaction:
+    """Statements that share one pinned connection and commit together; see transaction()"""
+    
+    def __init__(self, conn):
+        self.conn = conn
+    
+    def execute_query(self, query, params=None, fetch=True, prepared=False):
+        return fetch_statement(self.conn, query, params, fetch, prepared)
+    
+    def execute_query_one(self, query, params=None, prepared=False):
+        return fetch_statement_one(self.conn, query, params, prepared)
+    
+    def execute_query_rows(self, query, params=None, prepared=False):
+        return fetch_statement_rows(self.conn, query, params, prepared)
+    
+    def execute_query_columns(self, query, params=None, prepared=False):
+        return fetch_statement_columns(self.conn, query, params, prepared)
+    
+    def execute_many(self, query, params_list, page_size=1000):
+        return execute_batch_statement(self.conn, query, params_list, page_size)
+    
+    def insert_many(self, query, rows, page_size=1000, fetch=False, template=None):
+        return insert_values_statement(self.conn, query, rows, page_size, fetch, template)
+    
+    def copy_rows(self, table, columns, rows):
+        return copy_rows_statement(self.conn, table, columns, rows)
+    
+    def open_stream(self, query, params=None, itersize=DB_ITERSIZE, tuples=False):
+        """
+        Open a named (server-side) cursor; rows stay on the server until fetched.
+        tuples=True yields plain tuples instead of dicts (several times cheaper per row).
+        """
+        cursor = self.conn.cursor(
+            name=f"stream_{uuid.uuid4().hex}",
+            cursor_factory=None if tuples else RealDictCursor
+        )
+        cursor.itersize = itersize
+        sql, bound = bind_params(query, params)
+        # Times opening the cursor (the query's planning and first portal); rows arrive later
+        with track_statement(query, params):
+            cursor.execute(sql, bound)
+        return cursor
+    
+    def iter_query(self, query, params=None, itersize=DB_ITERSIZE, tuples=False):
+        """Yield rows from a server-side cursor, itersize rows per round trip"""
+        cursor = self.open_stream(query, params, itersize, tuples)
+        try:
+            yield from cursor
+        finally:
+            cursor.close()
+
+def begin_transaction(conn, readonly=False, isolation=None):
+    conn.set_session(isolation_level=isolation or 'DEFAULT', readonly=readonly or 'DEFAULT', autocommit=False)
+
+def end_transaction(conn):
+    """Put a connection back into autocommit and return it to the pool"""
+    try:
+        if not conn.closed:
+            conn.set_session(isolation_level='DEFAULT', readonly='DEFAULT', autocommit=True)
+    finally:
+        release_db_connection(conn)
+
+@contextmanager
+def transaction(readonly=False, isolation=None):
+    """
+    Hold one pooled connection for a multi-statement unit of work.
+    Commits once when the block exits normally, rolls back if it raises.
+    
+        with transaction() as tx:
+            tx.execute_query_one('SELECT ...', [...])
+            tx.execute_query('UPDATE ...', [...], fetch=False)
+    
+    readonly=True runs a READ ONLY transaction, which replica-routed requests
+    may serve from the read replica. isolation ('REPEATABLE READ', 'SERIALIZABLE')
+    overrides the server's default isolation level for this transaction.
+    """
+    conn = get_db_connection(read_only=readonly)
+    begin_transaction(conn, readonly, isolation)
+    try:
+        yield Transaction(conn)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        end_transaction(conn)
+
+def get_db_executor(workload=None):
+    """Initialize and return the thread pool used by the async helpers for a workload class"""
+    workload = get_workload(workload)
+    if workload.name in db_executors:
+        return db_executors[workload.name]
+    
+    with _pool_init_lock:
+        if workload.name not in db_executors:
+            db_executors[workload.name] = ThreadPoolExecutor(
+                max_workers=workload.pool_max + workload.replica_pool_max,
+                thread_name_prefix=f'db-{workload.name}'
+            )
+    
+    return db_executors[workload.name]
+
+# Per event loop: workload name -> asyncio.Semaphore of its connection slots
+_db_slots = weakref.WeakKeyDictionary()
+
+def get_db_slots(workload=None):
+    """
+    Semaphore with one slot per executor thread of a workload class (default: current).
+    Async callers wait here, on the event loop, instead of on an executor thread blocked
+    in getconn. A thread is only ever taken by a caller that holds a slot.
+    """
+    workload = get_workload(workload)
+    slots = _db_slots.setdefault(asyncio.get_running_loop(), {})
+    if workload.name not in slots:
+        slots[workload.name] = asyncio.Semaphore(workload.pool_max + workload.replica_pool_max)
+    return slots[workload.name]
+
+async def run_on_db_thread(func, *args, **kwargs):
+    """
+    Run a blocking database call on the executor, keeping the caller's context, for a
+    caller that already holds a connection slot (run_in_db_executor, transaction_async).
+    If the awaiting task is cancelled (client disconnect, wait_for timeout), statements
+    still running on connections checked out by this call are cancelled server-side too.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    active = set()
+    context.run(active_connections.set, active)
+    call = functools.partial(context.run, func, *args, **kwargs)
+    try:
+        return await loop.run_in_executor(get_db_executor(), call)
+    except asyncio.CancelledError:
+        for conn in list(active):
+            conn.cancel()
+        raise
+
+async def run_in_db_executor(func, *args, **kwargs):
+    """Run a blocking database call off the event loop, once a connection slot is free"""
+    async with get_db_slots():
+        return await run_on_db_thread(func, *args, **kwargs)
+
+async def execute_query_async(query, params=None, fetch=True, prepared=False):
+    """Awaitable version of execute_query"""
+    return await run_in_db_executor(execute_query, query, params, fetch, prepared)
+
+async def execute_query_one_async(query, params=None, prepared=False):
+    """Awaitable version of execute_query_one"""
+    return await run_in_db_executor(execute_query_one, query, params, prepared)
+
+async def execute_query_rows_async(query, params=None, prepared=False):
+    """Awaitable version of execute_query_rows"""
+    return await run_in_db_executor(execute_query_rows, query, params, prepared)
+
+async def execute_query_columns_async(query, params=None, prepared=False):
+    """Awaitable version of execute_query_columns"""
+    return await run_in_db_executor(execute_query_columns, query, params, prepared)
+
+async def execute_many_async(query, params_list, page_size=1000):
+    """Awaitable version of execute_many"""
+    return await run_in_db_executor(execute_many, query, params_list, page_size)
+
+async def insert_many_async(query, rows, page_size=1000, fetch=False, template=None):
+    """Awaitable version of insert_many"""
+    return await run_in_db_executor(insert_many, query, rows, page_size, fetch, template)
+
+async def copy_rows_async(table, columns, rows):
+    """Awaitable version of copy_rows (a plain iterable is consumed on the executor thread)"""
+    return await run_in_db_executor(copy_rows, table, columns, rows)
 
 def test_connection():
     """Test database connection"""
@@ -107,9 +937,195 @@ def test_connection():
         print(f'Connection test failed: {error}')
         return False
 
+def get_pool_stats():
+    """Return each workload class's budget and settings with its pool's occupancy and wait metrics"""
+    return {
+        name: {
+            **workload.describe(),
+            "pool": connection_pools[name].stats() if name in connection_pools else None,
+            "streams": {"open": open_streams.get(name, 0), "max": stream_limit(name)}
+        }
+        for name, workload in WORKLOADS.items()
+    }
+
+def get_replica_stats():
+    """Return replica configuration, last lag check and per-workload pool metrics"""
+    if not DB_REPLICA_DSN:
+        return {"configured": False}
+    return {
+        "configured": True,
+        "max_lag_seconds": DB_REPLICA_MAX_LAG,
+        **replica_status,
+        "pools": {name: replica.stats() for name, replica in replica_pools.items()}
+    }
+
+def get_statement_cache_stats():
+    """Return prepared statement cache counters and SQL translation cache info"""
+    translations = translate_query.cache_info()
+    return {
+        "prepared_statements": statement_cache_stats.snapshot(),
+        "max_per_connection": DB_STATEMENT_CACHE_SIZE,
+        "sql_translation": {
+            "hits": translations.hits,
+            "misses": translations.misses,
+            "cached_shapes": translations.currsize
+        }
+    }
+
+def get_query_stats(sort="total_ms", limit=50):
+    """Return per-fingerprint query timings (count, total, p50/p95/p99, rows, routes)"""
+    return query_stats.snapshot(sort, limit)
+
+def get_slow_queries(limit=50):
+    """Return the most recent slow-query log entries, newest first"""
+    return query_stats.recent_slow_queries(limit)
+
+def reset_query_stats():
+    """Clear query timings and the slow-query history"""
+    query_stats.reset()
+
+class AsyncTransaction:
+    """Awaitable view of a Transaction; each statement runs on the database executor"""
+    
+    def __init__(self, transaction):
+        self.transaction = transaction
+    
+    async def run(self, func, *args):
+        """Run func on the executor; cancel the pinned connection's statement if the await is cancelled"""
+        try:
+            # The transaction already holds a connection slot
+            return await run_on_db_thread(func, *args)
+        except asyncio.CancelledError:
+            self.transaction.conn.cancel()
+            raise
+    
+    async def execute_query(self, query, params=None, fetch=True, prepared=False):
+        return await self.run(self.transaction.execute_query, query, params, fetch, prepared)
+    
+    async def execute_query_one(self, query, params=None, prepared=False):
+        return await self.run(self.transaction.execute_query_one, query, params, prepared)
+    
+    async def execute_query_rows(self, query, params=None, prepared=False):
+        return await self.run(self.transaction.execute_query_rows, query, params, prepared)
+    
+    async def execute_query_columns(self, query, params=None, prepared=False):
+        return await self.run(self.transaction.execute_query_columns, query, params, prepared)
+    
+    async def execute_many(self, query, params_list, page_size=1000):
+        return await self.run(self.transaction.execute_many, query, params_list, page_size)
+    
+    async def insert_many(self, query, rows, page_size=1000, fetch=False, template=None):
+        return await self.run(self.transaction.insert_many, query, rows, page_size, fetch, template)
+    
+    async def copy_rows(self, table, columns, rows):
+        return await self.run(self.transaction.copy_rows, table, columns, rows)
+
+    async def iter_query(self, query, params=None, itersize=DB_ITERSIZE, tuples=False):
+        """Async generator over a server-side cursor; each batch is fetched on the database executor"""
+        cursor = await self.run(self.transaction.open_stream, query, params, itersize, tuples)
+        try:
+            while True:
+                rows = await self.run(cursor.fetchmany, itersize)
+                if not rows:
+                    break
+                for row in rows:
+                    yield row
+        finally:
+            await self.run(cursor.close)
+
+@asynccontextmanager
+async def transaction_async(readonly=False, isolation=None):
+    """
+    Awaitable version of transaction():
+    
+        async with transaction_async() as tx:
+            test = await tx.execute_query_one('SELECT ...', [...])
+            await tx.execute_query('INSERT ...', [...], fetch=False)
+    """
+    async with get_db_slots():
+        conn = await run_on_db_thread(get_db_connection, readonly)
+        begin_transaction(conn, readonly, isolation)
+        try:
+            yield AsyncTransaction(Transaction(conn))
+            await run_on_db_thread(conn.commit)
+        except BaseException:
+            await asyncio.shield(run_on_db_thread(conn.rollback))
+            raise
+        finally:
+            # Shielded, so a second cancellation cannot leak the connection
+            await asyncio.shield(run_on_db_thread(end_transaction, conn))
+
+# Workload name -> streams open right now
+open_streams = {}
+_streams_lock = threading.Lock()
+
+def stream_limit(workload=None):
+    """Streams a workload class may have open; always leaves it a connection slot for other queries"""
+    workload = get_workload(workload)
+    return max(min(DB_STREAM_MAX, workload.pool_max + workload.replica_pool_max - 1), 1)
+
+def claim_stream_slot(workload=None):
+    """
+    Claim one of a workload's stream slots without waiting; raises StreamLimitError when
+    none is free. Returns the function that gives it back (safe to call more than once).
+    """
+    workload = get_workload(workload)
+    with _streams_lock:
+        if open_streams.get(workload.name, 0) >= stream_limit(workload.name):
+            raise StreamLimitError(
+                f"Too many streams open for the {workload.name} workload ({stream_limit(workload.name)})"
+            )
+        open_streams[workload.name] = open_streams.get(workload.name, 0) + 1
+    released = []
+    
+    def release():
+        with _streams_lock:
+            if not released:
+                released.append(True)
+                open_streams[workload.name] -= 1
+    return release
+
+def iter_query_async(query, params=None, itersize=DB_ITERSIZE, isolation=None, tuples=False):
+    """
+    Awaitable version of iter_query. Close it (or exhaust it) to release the
+    connection; stream_json_object and the other helpers in utils/streaming.py do that.
+    isolation is passed to transaction_async (e.g. 'REPEATABLE READ' for exports).
+    Claims a stream slot right away, so call it before starting the response:
+    StreamLimitError (served as 503) means the workload already has DB_STREAM_MAX open.
+    """
+    release = claim_stream_slot()
+    rows = stream_query_rows(query, params, itersize, isolation, tuples, release)
+    # A generator that is never started never runs its finally block
+    weakref.finalize(rows, release)
+    return rows
+
+async def stream_query_rows(query, params, itersize, isolation, tuples, release):
+    try:
+        async with transaction_async(readonly=True, isolation=isolation) as tx:
+            rows = tx.iter_query(query, params, itersize, tuples)
+            try:
+                async for row in rows:
+                    yield row
+            finally:
+                # Close the cursor before the transaction ends (async for does not close it on early exit)
+                await rows.aclose()
+    finally:
+        release()
+
+async def test_connection_async():
+    """Awaitable version of test_connection"""
+    return await run_in_db_executor(test_connection)
+
 def close_all_connections():
     """Close all database connections"""
-    global connection_pool
-    if connection_pool:
-        connection_pool.closeall()
+    for executor in db_executors.values():
+        executor.shutdown(wait=True)
+    db_executors.clear()
+    for replica_pool in replica_pools.values():
+        replica_pool.closeall()
+    replica_pools.clear()
+    if connection_pools:
+        for connection_pool in connection_pools.values():
+            connection_pool.closeall()
+        connection_pools.clear()
         print('Database pool closed')
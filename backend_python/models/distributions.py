@@ -0,0 +1,137 @@
+"""
+Score and time-taken distributions of test attempts, per test or per test type.
+
+One statement computes the histogram (width_bucket), mean, standard deviation
+and percentile bands of score percentage (score / total_questions) and of
+time_taken, so no attempt rows leave the database.
+
+Results are cached by @cached_result on the endpoint, so a write to tests or
+user_test_attempts (in any process) recomputes them; test_type must be a type
+some test has.
+"""
+
+from models.database import execute_query_async, execute_query_one_async
+
+DEFAULT_BINS = 10
+MAX_BINS = 100
+PERCENTILE_BANDS = [0.1, 0.25, 0.5, 0.75, 0.9]
+
+# $1 test_id, $2 test_type, $3 bins, $4 percentile fractions
+DISTRIBUTION_QUERY = """
+    WITH scoped AS (
+        SELECT
+            uta.score::float8 * 100 / NULLIF(uta.total_questions, 0) as score_pct,
+            uta.time_taken::float8 as time_taken
+        FROM user_test_attempts uta
+        JOIN tests t ON t.test_id = uta.test_id
+        WHERE ($1::int IS NULL OR uta.test_id = $1) AND ($2::text IS NULL OR t.test_type = $2)
+    ),
+    summary AS (
+        SELECT
+            COUNT(*) as attempts,
+            COUNT(score_pct) as scored_attempts,
+            AVG(score_pct) as score_mean,
+            stddev_samp(score_pct) as score_stdev,
+            MIN(score_pct) as score_min,
+            MAX(score_pct) as score_max,
+            percentile_cont($4::float8[]) WITHIN GROUP (ORDER BY score_pct) as score_percentiles,
+            COUNT(time_taken) as timed_attempts,
+            AVG(time_taken) as time_mean,
+            stddev_samp(time_taken) as time_stdev,
+            MIN(time_taken) as time_min,
+            MAX(time_taken) as time_max,
+            percentile_cont($4::float8[]) WITHIN GROUP (ORDER BY time_taken) as time_percentiles
+        FROM scoped
+    ),
+    -- Out-of-range values (and each range's upper edge) fall into the first / last bin
+    score_bins AS (
+        SELECT LEAST(GREATEST(width_bucket(score_pct, 0, 100, $3::int), 1), $3::int) as bin, COUNT(*) as count
+        FROM scoped
+        WHERE score_pct IS NOT NULL
+        GROUP BY 1
+    ),
+    time_bins AS (
+        SELECT
+            LEAST(width_bucket(
+                s.time_taken, summary.time_min,
+                CASE WHEN summary.time_max > summary.time_min THEN summary.time_max ELSE summary.time_min + 1 END,
+                $3::int
+            ), $3::int) as bin,
+            COUNT(*) as count
+        FROM scoped s
+        CROSS JOIN summary
+        WHERE s.time_taken IS NOT NULL
+        GROUP BY 1
+    )
+    SELECT
+        summary.*,
+        ARRAY(
+            SELECT COALESCE(sb.count, 0)
+            FROM generate_series(1, $3::int) b(bin)
+            LEFT JOIN score_bins sb ON sb.bin = b.bin
+            ORDER BY b.bin
+        ) as score_histogram,
+        ARRAY(
+            SELECT COALESCE(tb.count, 0)
+            FROM generate_series(1, $3::int) b(bin)
+            LEFT JOIN time_bins tb ON tb.bin = b.bin
+            ORDER BY b.bin
+        ) as time_histogram
+    FROM summary
+"""
+
+async def get_test_types():
+    """The test_type values tests currently have"""
+    rows = await execute_query_async(
+        "SELECT DISTINCT test_type FROM tests WHERE test_type IS NOT NULL ORDER BY 1", prepared=True
+    )
+    return [row['test_type'] for row in rows]
+
+def band_key(fraction):
+    return f"p{round(fraction * 100)}"
+
+def rounded(value, digits=2):
+    return round(float(value), digits) if value is not None else None
+
+def summarize(count, mean, stdev, low, high, percentiles, histogram, bin_low, bin_high):
+    """One metric's figures; histogram counts are paired with their [start, end) edges"""
+    width = (bin_high - bin_low) / len(histogram) if bin_low is not None else None
+    return {
+        "count": count,
+        "mean": rounded(mean),
+        "stdev": rounded(stdev),
+        "min": rounded(low),
+        "max": rounded(high),
+        "percentiles": {
+            band_key(fraction): rounded(value)
+            for fraction, value in zip(PERCENTILE_BANDS, percentiles or [None] * len(PERCENTILE_BANDS))
+        },
+        "histogram": [
+            {
+                "start": rounded(bin_low + index * width) if width is not None else None,
+                "end": rounded(bin_low + (index + 1) * width) if width is not None else None,
+                "count": bin_count
+            }
+            for index, bin_count in enumerate(histogram)
+        ] if count else []
+    }
+
+async def get_score_distribution(test_id=None, test_type=None, bins=DEFAULT_BINS):
+    """Distribution of one test, one test type, or every attempt (both None)"""
+    row = await execute_query_one_async(DISTRIBUTION_QUERY, [test_id, test_type, bins, PERCENTILE_BANDS], prepared=True)
+
+    time_high = None
+    if row['time_min'] is not None:
+        time_high = row['time_max'] if row['time_max'] > row['time_min'] else row['time_min'] + 1
+    distribution = {
+        "attempts": row['attempts'],
+        "score_percentage": summarize(
+            row['scored_attempts'], row['score_mean'], row['score_stdev'], row['score_min'], row['score_max'],
+            row['score_percentiles'], row['score_histogram'], 0, 100
+        ),
+        "time_taken": summarize(
+            row['timed_attempts'], row['time_mean'], row['time_stdev'], row['time_min'], row['time_max'],
+            row['time_percentiles'], row['time_histogram'], row['time_min'], time_high
+        )
+    }
+    return distribution
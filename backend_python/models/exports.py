@@ -0,0 +1,53 @@
+"""
+Raw datasets served by the streaming export endpoint.
+Each dataset is one SELECT (so one snapshot) ordered by its primary key, and
+the columns listed are exactly the columns exported, in order.
+Password hashes and other credentials are never part of an export.
+"""
+
+EXPORT_DATASETS = {
+    "attempts": ("""
+        SELECT
+            uta.attempt_id, uta.user_id, uta.test_id, t.test_name, t.test_type,
+            uta.score, uta.total_questions, uta.time_taken, uta.attempt_date
+        FROM user_test_attempts uta
+        LEFT JOIN tests t ON t.test_id = uta.test_id
+        ORDER BY uta.attempt_id
+    """, [
+        "attempt_id", "user_id", "test_id", "test_name", "test_type",
+        "score", "total_questions", "time_taken", "attempt_date"
+    ]),
+    "recommendations": ("""
+        SELECT
+            r.recommendation_id, r.attempt_id, r.user_id, r.course_id, c.course_name,
+            r.status, r.recommended_at, r.reasoning
+        FROM recommendations r
+        LEFT JOIN courses c ON c.course_id = r.course_id
+        ORDER BY r.recommendation_id
+    """, [
+        "recommendation_id", "attempt_id", "user_id", "course_id", "course_name",
+        "status", "recommended_at", "reasoning"
+    ]),
+    "feedback": ("""
+        SELECT feedback_id, recommendation_id, user_id, rating, feedback_text, created_at
+        FROM recommendation_feedback
+        ORDER BY feedback_id
+    """, ["feedback_id", "recommendation_id", "user_id", "rating", "feedback_text", "created_at"]),
+    "users": ("""
+        SELECT
+            user_id, username, first_name, last_name, email,
+            academic_info->>'strand' as strand,
+            academic_info->>'gwa' as gwa,
+            is_active, created_at, last_login
+        FROM users
+        ORDER BY user_id
+    """, [
+        "user_id", "username", "first_name", "last_name", "email",
+        "strand", "gwa", "is_active", "created_at", "last_login"
+    ])
+}
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson")
+}
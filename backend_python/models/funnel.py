@@ -0,0 +1,254 @@
+"""
+Recommendation funnel: recommended -> rated -> accepted, per course, student strand and month.
+
+recommendation_funnel holds one row per (UTC month of recommended_at, course, strand),
+where strand is the recommended student's academic_info strand. Rows are refreshed
+one month at a time.
+
+Triggers bump a month's version in recommendation_funnel_months whenever
+something that feeds it changes:
+- a recommendation in that month is added, updated or deleted
+- feedback on one of its recommendations is added, updated or deleted
+- the strand of a user it recommended to changes (other user updates, such as
+  last_login on every login, do not fire the trigger)
+refresh_funnel() recomputes only the months whose version moved since their
+last refresh, so a read after a handful of writes rebuilds one or two months.
+The months being rebuilt are locked (FOR UPDATE), so a write that lands
+meanwhile waits and then marks its month again.
+"""
+
+from models.database import transaction, run_in_db_executor
+
+FUNNEL_SCHEMA = """
+CREATE TABLE IF NOT EXISTS recommendation_funnel (
+    month DATE NOT NULL,
+    course_id INTEGER NOT NULL,
+    strand TEXT NOT NULL,
+    recommended BIGINT NOT NULL DEFAULT 0,
+    rated BIGINT NOT NULL DEFAULT 0,
+    feedback_count BIGINT NOT NULL DEFAULT 0,
+    rating_sum BIGINT NOT NULL DEFAULT 0,
+    accepted BIGINT NOT NULL DEFAULT 0,
+    rejected BIGINT NOT NULL DEFAULT 0,
+    pending BIGINT NOT NULL DEFAULT 0,
+    rated_accepted BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (month, course_id, strand)
+);
+
+CREATE TABLE IF NOT EXISTS recommendation_funnel_months (
+    month DATE PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 1,
+    refreshed_version BIGINT NOT NULL DEFAULT 0
+);
+
+CREATE INDEX IF NOT EXISTS idx_recommendations_user ON recommendations (user_id);
+CREATE INDEX IF NOT EXISTS idx_recommendations_month ON recommendations (export_month(recommended_at));
+CREATE INDEX IF NOT EXISTS idx_recommendation_feedback_recommendation ON recommendation_feedback (recommendation_id);
+
+-- Mark the funnel months a statement touched. Uses export_month() (models/snapshots.py)
+-- and rollup_delta_source() (models/rollups.py).
+CREATE OR REPLACE FUNCTION mark_funnel_months() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+DECLARE
+    changed_months TEXT;
+BEGIN
+    IF TG_TABLE_NAME = 'recommendations' THEN
+        changed_months := format(
+            'SELECT export_month(recommended_at) FROM (%s) changed',
+            rollup_delta_source(TG_OP)
+        );
+    ELSE
+        -- recommendation_feedback
+        changed_months := format(
+            'SELECT export_month(r.recommended_at) FROM (%s) changed '
+            'JOIN recommendations r ON r.recommendation_id = changed.recommendation_id',
+            rollup_delta_source(TG_OP)
+        );
+    END IF;
+
+    EXECUTE format($sql$
+        INSERT INTO recommendation_funnel_months AS m (month)
+        SELECT DISTINCT month FROM (%s) changed(month)
+        ORDER BY 1
+        ON CONFLICT (month) DO UPDATE SET version = m.version + 1
+    $sql$, changed_months);
+    RETURN NULL;
+END
+$$;
+
+-- A user's strand change moves their recommendations to another funnel row. A row trigger,
+-- since transition tables cannot be combined with UPDATE OF academic_info.
+CREATE OR REPLACE FUNCTION mark_funnel_user_months() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO recommendation_funnel_months AS m (month)
+    SELECT DISTINCT export_month(recommended_at) FROM recommendations WHERE user_id = NEW.user_id
+    ORDER BY 1
+    ON CONFLICT (month) DO UPDATE SET version = m.version + 1;
+    RETURN NULL;
+END
+$$;
+
+DROP TRIGGER IF EXISTS funnel_recommendations_insert ON recommendations;
+DROP TRIGGER IF EXISTS funnel_recommendations_update ON recommendations;
+DROP TRIGGER IF EXISTS funnel_recommendations_delete ON recommendations;
+CREATE TRIGGER funnel_recommendations_insert AFTER INSERT ON recommendations
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION mark_funnel_months();
+CREATE TRIGGER funnel_recommendations_update AFTER UPDATE ON recommendations
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION mark_funnel_months();
+CREATE TRIGGER funnel_recommendations_delete AFTER DELETE ON recommendations
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION mark_funnel_months();
+
+DROP TRIGGER IF EXISTS funnel_feedback_insert ON recommendation_feedback;
+DROP TRIGGER IF EXISTS funnel_feedback_update ON recommendation_feedback;
+DROP TRIGGER IF EXISTS funnel_feedback_delete ON recommendation_feedback;
+CREATE TRIGGER funnel_feedback_insert AFTER INSERT ON recommendation_feedback
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION mark_funnel_months();
+CREATE TRIGGER funnel_feedback_update AFTER UPDATE ON recommendation_feedback
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION mark_funnel_months();
+CREATE TRIGGER funnel_feedback_delete AFTER DELETE ON recommendation_feedback
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION mark_funnel_months();
+
+DROP TRIGGER IF EXISTS funnel_users_update ON users;
+CREATE TRIGGER funnel_users_update AFTER UPDATE OF academic_info ON users
+    FOR EACH ROW WHEN (OLD.academic_info->>'strand' IS DISTINCT FROM NEW.academic_info->>'strand')
+    EXECUTE FUNCTION mark_funnel_user_months();
+
+-- Months that already hold recommendations start out stale
+INSERT INTO recommendation_funnel_months (month)
+SELECT DISTINCT export_month(recommended_at) FROM recommendations
+ON CONFLICT (month) DO NOTHING;
+"""
+
+# $1 months to rebuild
+FUNNEL_REFRESH_QUERY = """
+    WITH recs AS (
+        SELECT recommendation_id, course_id, user_id, status, export_month(recommended_at) as month
+        FROM recommendations
+        WHERE export_month(recommended_at) = ANY($1::date[])
+    ),
+    feedback AS (
+        SELECT f.recommendation_id, COUNT(*) as feedback_count, SUM(f.rating) as rating_sum
+        FROM recommendation_feedback f
+        JOIN recs ON recs.recommendation_id = f.recommendation_id
+        GROUP BY f.recommendation_id
+    )
+    INSERT INTO recommendation_funnel (
+        month, course_id, strand, recommended, rated, feedback_count, rating_sum,
+        accepted, rejected, pending, rated_accepted
+    )
+    SELECT
+        recs.month,
+        COALESCE(recs.course_id, 0),
+        COALESCE(NULLIF(u.academic_info->>'strand', ''), 'Unknown'),
+        COUNT(*),
+        COUNT(f.recommendation_id),
+        COALESCE(SUM(f.feedback_count), 0),
+        COALESCE(SUM(f.rating_sum), 0),
+        COUNT(*) FILTER (WHERE recs.status = 'accepted'),
+        COUNT(*) FILTER (WHERE recs.status = 'rejected'),
+        COUNT(*) FILTER (WHERE recs.status = 'pending'),
+        COUNT(f.recommendation_id) FILTER (WHERE recs.status = 'accepted')
+    FROM recs
+    LEFT JOIN users u ON u.user_id = recs.user_id
+    LEFT JOIN feedback f ON f.recommendation_id = recs.recommendation_id
+    GROUP BY 1, 2, 3
+"""
+
+# group_by dimension -> (SELECT expressions, GROUP BY expressions)
+FUNNEL_DIMENSIONS = {
+    "course": (["f.course_id", "c.course_name"], ["f.course_id", "c.course_name"]),
+    "strand": (["f.strand"], ["f.strand"]),
+    "month": (["to_char(f.month, 'YYYY-MM') as month"], ["f.month"])
+}
+
+def refresh_funnel(tx):
+    """Rebuild the months marked stale inside tx; returns the number of months rebuilt"""
+    months = [
+        row['month'] for row in tx.execute_query("""
+            SELECT month FROM recommendation_funnel_months
+            WHERE version <> refreshed_version
+            ORDER BY month
+            FOR UPDATE
+        """)
+    ]
+    if not months:
+        return 0
+    tx.execute_query("DELETE FROM recommendation_funnel WHERE month = ANY($1::date[])", [months], fetch=False)
+    tx.execute_query(FUNNEL_REFRESH_QUERY, [months], fetch=False)
+    tx.execute_query(
+        "UPDATE recommendation_funnel_months SET refreshed_version = version WHERE month = ANY($1::date[])",
+        [months], fetch=False
+    )
+    return len(months)
+
+def funnel_query(group_by, course_id=None, strand=None, first_month=None, last_month=None):
+    """SELECT over recommendation_funnel grouped by the given dimensions (keys of FUNNEL_DIMENSIONS)"""
+    select_list = [expression for dimension in group_by for expression in FUNNEL_DIMENSIONS[dimension][0]]
+    group_list = [expression for dimension in group_by for expression in FUNNEL_DIMENSIONS[dimension][1]]
+    conditions = []
+    params = []
+    for condition, value in (
+        ("f.course_id = ${}", course_id),
+        ("f.strand = ${}", strand),
+        ("f.month >= ${}", first_month),
+        ("f.month <= ${}", last_month)
+    ):
+        if value is not None:
+            params.append(value)
+            conditions.append(condition.format(len(params)))
+    # Months read chronologically; otherwise the largest groups first
+    order_list = (["f.month"] if "month" in group_by else []) + ["recommended DESC"]
+    order_list += [expression for expression in group_list if expression != "f.month"]
+    query = f"""
+        SELECT
+            {''.join(expression + ', ' for expression in select_list)}
+            SUM(f.recommended)::bigint as recommended,
+            SUM(f.rated)::bigint as rated,
+            SUM(f.feedback_count)::bigint as feedback_count,
+            SUM(f.rating_sum)::bigint as rating_sum,
+            SUM(f.accepted)::bigint as accepted,
+            SUM(f.rejected)::bigint as rejected,
+            SUM(f.pending)::bigint as pending,
+            SUM(f.rated_accepted)::bigint as rated_accepted
+        FROM recommendation_funnel f
+        LEFT JOIN courses c ON c.course_id = f.course_id
+        {'WHERE ' + ' AND '.join(conditions) if conditions else ''}
+        {'GROUP BY ' + ', '.join(group_list) if group_list else ''}
+        ORDER BY {', '.join(order_list)}
+    """
+    return query, params
+
+def funnel_stages(row):
+    """Counts of one funnel row plus the stage-to-stage rates"""
+    recommended = row['recommended'] or 0
+    rated = row['rated'] or 0
+    return {
+        "recommended": recommended,
+        "rated": rated,
+        "feedback_count": row['feedback_count'] or 0,
+        "average_rating": round(row['rating_sum'] / row['feedback_count'], 2) if row['feedback_count'] else None,
+        "accepted": row['accepted'] or 0,
+        "rejected": row['rejected'] or 0,
+        "pending": row['pending'] or 0,
+        "rated_accepted": row['rated_accepted'] or 0,
+        "rating_rate": round(rated / recommended, 4) if recommended else None,
+        "acceptance_rate": round(row['accepted'] / recommended, 4) if recommended else None,
+        "rated_acceptance_rate": round(row['rated_accepted'] / rated, 4) if rated else None
+    }
+
+def read_funnel(group_by, course_id=None, strand=None, first_month=None, last_month=None):
+    """
+    Refresh stale months, then read the funnel grouped by group_by.
+    Runs on the primary, since stale months are rewritten before they are read.
+    """
+    with transaction() as tx:
+        refreshed = refresh_funnel(tx)
+        query, params = funnel_query(group_by, course_id, strand, first_month, last_month)
+        rows = tx.execute_query(query, params)
+        totals = tx.execute_query_one(*funnel_query([], course_id, strand, first_month, last_month))
+    return refreshed, rows, totals
+
+async def get_funnel(group_by, course_id=None, strand=None, first_month=None, last_month=None):
+    """Awaitable read_funnel"""
+    return await run_in_db_executor(read_funnel, group_by, course_id, strand, first_month, last_month)
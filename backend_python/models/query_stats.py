@@ -0,0 +1,180 @@
+"""
+Per-statement instrumentation for the database layer: timing, row counts,
+the route that issued the query and a normalized statement fingerprint.
+Aggregates are served by the admin router; statements slower than
+DB_SLOW_QUERY_MS are also written to the slow-query log.
+"""
+
+import contextvars
+import functools
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# Statements slower than this (milliseconds) go to the slow-query log
+DB_SLOW_QUERY_MS = float(os.getenv('DB_SLOW_QUERY_MS', '500'))
+# Latency samples kept per fingerprint for the percentiles
+DB_QUERY_SAMPLES = int(os.getenv('DB_QUERY_SAMPLES', '1000'))
+# Recent slow queries kept in memory for the admin endpoint
+DB_SLOW_QUERY_HISTORY = int(os.getenv('DB_SLOW_QUERY_HISTORY', '200'))
+
+slow_query_logger = logging.getLogger('db.slow_queries')
+
+# Route that issued the current statement, e.g. "GET /api/users/{user_id}"
+current_route = contextvars.ContextVar('current_route', default='(no route)')
+
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+PLACEHOLDER = re.compile(r'\$\d+|%s')
+VALUE_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+LINE_COMMENT = re.compile(r'--[^\n]*')
+WHITESPACE = re.compile(r'\s+')
+
+@functools.lru_cache(maxsize=2048)
+def fingerprint_query(query):
+    """
+    Normalize a statement so every execution of the same shape aggregates together:
+    literals and placeholders become ?, value lists collapse to (...), whitespace collapses.
+    Returns (fingerprint id, normalized text).
+    """
+    normalized = LINE_COMMENT.sub(' ', query)
+    normalized = STRING_LITERAL.sub('?', normalized)
+    normalized = PLACEHOLDER.sub('?', normalized)
+    normalized = NUMBER_LITERAL.sub('?', normalized)
+    normalized = VALUE_LIST.sub('(...)', normalized)
+    normalized = WHITESPACE.sub(' ', normalized).strip()
+    return hashlib.md5(normalized.encode()).hexdigest()[:12], normalized
+
+def describe_params(params):
+    """Shape of the parameters (types and sizes, never values) for the slow-query log"""
+    if not params:
+        return []
+    shape = []
+    for value in params:
+        if value is None:
+            shape.append('null')
+        elif isinstance(value, str):
+            shape.append(f'str[{len(value)}]')
+        elif isinstance(value, (list, tuple)):
+            shape.append(f'{type(value).__name__}[{len(value)}]')
+        else:
+            shape.append(type(value).__name__)
+    return shape
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0
+    index = max(int(round(fraction * len(sorted_values))) - 1, 0)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+class FingerprintStats:
+    """Running totals and a bounded latency sample for one statement fingerprint"""
+
+    def __init__(self, normalized):
+        self.query = normalized
+        self.count = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.rows = 0
+        self.slow_count = 0
+        self.routes = {}
+        self.samples = deque(maxlen=DB_QUERY_SAMPLES)
+
+    def to_dict(self, fingerprint):
+        samples = sorted(self.samples)
+        return {
+            "fingerprint": fingerprint,
+            "query": self.query,
+            "count": self.count,
+            "total_ms": round(self.total_seconds * 1000, 3),
+            "mean_ms": round(self.total_seconds * 1000 / self.count, 3) if self.count else 0,
+            "p50_ms": round(percentile(samples, 0.50) * 1000, 3),
+            "p95_ms": round(percentile(samples, 0.95) * 1000, 3),
+            "p99_ms": round(percentile(samples, 0.99) * 1000, 3),
+            "max_ms": round(self.max_seconds * 1000, 3),
+            "rows": self.rows,
+            "slow_count": self.slow_count,
+            "routes": dict(sorted(self.routes.items(), key=lambda item: -item[1]))
+        }
+
+class QueryStatsRegistry:
+    """Thread-safe per-fingerprint aggregates plus the recent slow-query history"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.by_fingerprint = {}
+        self.slow_queries = deque(maxlen=DB_SLOW_QUERY_HISTORY)
+        self.started_at = datetime.now(timezone.utc)
+
+    def record(self, query, params, elapsed, rows):
+        fingerprint, normalized = fingerprint_query(query)
+        route = current_route.get()
+        slow = elapsed * 1000 >= DB_SLOW_QUERY_MS
+        with self._lock:
+            stats = self.by_fingerprint.get(fingerprint)
+            if stats is None:
+                stats = self.by_fingerprint[fingerprint] = FingerprintStats(normalized)
+            stats.count += 1
+            stats.total_seconds += elapsed
+            stats.max_seconds = max(stats.max_seconds, elapsed)
+            stats.rows += rows or 0
+            stats.routes[route] = stats.routes.get(route, 0) + 1
+            stats.samples.append(elapsed)
+            if slow:
+                stats.slow_count += 1
+
+        if slow:
+            entry = {
+                "at": datetime.now(timezone.utc).isoformat(),
+                "fingerprint": fingerprint,
+                "route": route,
+                "duration_ms": round(elapsed * 1000, 3),
+                "rows": rows,
+                "param_shape": describe_params(params),
+                "query": normalized
+            }
+            self.slow_queries.append(entry)
+            slow_query_logger.warning(
+                "slow query %.1fms route=%s fingerprint=%s rows=%s params=%s: %s",
+                entry["duration_ms"], route, fingerprint, rows, entry["param_shape"], normalized
+            )
+
+    def snapshot(self, sort="total_ms", limit=50):
+        with self._lock:
+            items = [stats.to_dict(fingerprint) for fingerprint, stats in self.by_fingerprint.items()]
+        items.sort(key=lambda item: item.get(sort, 0), reverse=True)
+        return {
+            "since": self.started_at.isoformat(),
+            "slow_query_threshold_ms": DB_SLOW_QUERY_MS,
+            "fingerprints": len(items),
+            "queries": items[:limit]
+        }
+
+    def recent_slow_queries(self, limit=50):
+        return list(self.slow_queries)[-limit:][::-1]
+
+    def reset(self):
+        with self._lock:
+            self.by_fingerprint.clear()
+            self.slow_queries.clear()
+            self.started_at = datetime.now(timezone.utc)
+
+query_stats = QueryStatsRegistry()
+
+@contextmanager
+def track_statement(query, params=None):
+    """
+    Time one statement. The block sets tracked['rows'] once the row count is known;
+    statements that raise are not recorded.
+    """
+    tracked = {"rows": None}
+    started = time.perf_counter()
+    yield tracked
+    query_stats.record(query, params, time.perf_counter() - started, tracked["rows"])
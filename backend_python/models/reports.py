@@ -0,0 +1,101 @@
+"""
+Heavy analytics reports refreshed in the background.
+
+An endpoint decorated with scheduled_report() has its default view (every query
+parameter left at its default) registered with report_scheduler. main.py starts
+the scheduler on startup. A report is computed on its first request, then again
+every `interval` seconds, or every interval / 4 while the report is hot
+(REPORT_HOT_REQUESTS requests within REPORT_HOT_WINDOW seconds). A write to one
+of the tables its @cached_result declares (in this or another process, see
+models/result_cache.py) brings the next refresh forward to REPORT_MIN_INTERVAL
+seconds after the last one. Reports not requested for REPORT_IDLE_SECONDS are
+not refreshed until they are requested again.
+
+Requests for the default view never wait for the database once a first result
+exists. They get the last good result, with its age in seconds in the Age
+header. A refresh that fails keeps that result and is retried after
+REPORT_RETRY_SECONDS. Any other parameter set calls the endpoint as before.
+"""
+
+import functools
+import inspect
+import os
+from fastapi import HTTPException, Response
+from models.database import db_route, db_workload
+from models.query_stats import current_route
+from models.result_cache import table_versions, sync_table_versions
+from utils.scheduler import ReportScheduler
+
+# Default seconds between refreshes of a report
+REPORT_REFRESH_INTERVAL = float(os.getenv('REPORT_REFRESH_INTERVAL', '300'))
+# A report requested this often within the window is refreshed four times as often
+REPORT_HOT_REQUESTS = int(os.getenv('REPORT_HOT_REQUESTS', '10'))
+REPORT_HOT_WINDOW = float(os.getenv('REPORT_HOT_WINDOW', '60'))
+# Wait before retrying a failed refresh
+REPORT_RETRY_SECONDS = float(os.getenv('REPORT_RETRY_SECONDS', '30'))
+# Shortest time between refreshes caused by writes to a report's tables
+REPORT_MIN_INTERVAL = float(os.getenv('REPORT_MIN_INTERVAL', '30'))
+# A report nobody requested for this long is no longer refreshed in the background
+REPORT_IDLE_SECONDS = float(os.getenv('REPORT_IDLE_SECONDS', '900'))
+
+report_scheduler = ReportScheduler(
+    hot_requests=REPORT_HOT_REQUESTS,
+    hot_window=REPORT_HOT_WINDOW,
+    retry_delay=REPORT_RETRY_SECONDS,
+    min_interval=REPORT_MIN_INTERVAL,
+    idle_after=REPORT_IDLE_SECONDS
+)
+
+def parameter_defaults(endpoint):
+    """{name: default value} of an endpoint's parameters, with Query(...) defaults resolved"""
+    return {
+        name: getattr(parameter.default, 'default', parameter.default)
+        for name, parameter in inspect.signature(endpoint).parameters.items()
+    }
+
+def scheduled_report(name, interval=REPORT_REFRESH_INTERVAL, workload='analytics', read_replica=True):
+    """
+    Serve an endpoint's default view from report_scheduler. Refreshes run as the given
+    workload class, on the read replica when read_replica is set and one is healthy.
+    Goes above @cached_result: refreshes call the undecorated endpoint.
+
+        @router.get("/admin/cohorts")
+        @scheduled_report("cohorts", interval=600)
+        @cached_result("users", "user_test_attempts", max_age=300)
+        async def get_cohort_retention(period: str = Query("week")): ...
+    """
+    def decorator(endpoint):
+        defaults = parameter_defaults(endpoint)
+        compute_endpoint = inspect.unwrap(endpoint)
+
+        async def compute():
+            # Runs in the scheduler's own task, so these only apply to this refresh
+            db_workload.set(workload)
+            db_route.set('replica' if read_replica else 'primary')
+            current_route.set(f"REPORT {name}")
+            return await compute_endpoint(**defaults)
+
+        report_scheduler.register(name, compute, interval)
+        table_versions.on_change(getattr(endpoint, 'tables', ()), lambda: report_scheduler.mark_stale(name))
+
+        @functools.wraps(endpoint)
+        async def scheduled_endpoint(response: Response, **params):
+            if params != defaults:
+                return await endpoint(**params)
+            # Picks up writes made by other processes
+            await sync_table_versions()
+            try:
+                value, age = await report_scheduler.get(name)
+            except RuntimeError as error:
+                raise HTTPException(status_code=503, detail=str(error), headers={"Retry-After": "30"})
+            response.headers["Age"] = str(int(age))
+            return value
+
+        # FastAPI reads the parameters from __signature__: the endpoint's plus the Response
+        signature = inspect.signature(endpoint)
+        scheduled_endpoint.__signature__ = signature.replace(parameters=[
+            inspect.Parameter('response', inspect.Parameter.POSITIONAL_OR_KEYWORD, annotation=Response),
+            *signature.parameters.values()
+        ])
+        return scheduled_endpoint
+    return decorator
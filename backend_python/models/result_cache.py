@@ -0,0 +1,163 @@
+"""
+Result cache for the analytics and stats endpoints.
+
+Each cached endpoint declares the tables its answer is read from, including the
+source tables behind any rollup. Its results are keyed by endpoint and parameters.
+Write routes call bump_table_versions() after their transaction commits, and
+every result that read one of the bumped tables is dropped on its next lookup.
+
+Writes made anywhere else (other workers, scripts, psql) are seen through
+result_cache_versions: a statement trigger on every cached table bumps the
+table's row there in the writing transaction. Updates of users only count when
+they change a column cached results read, so logins (last_login) do not.
+Cached lookups read that table from the primary at most every
+RESULT_CACHE_SYNC_SECONDS and bump the local version of each table whose row
+moved. Every entry also expires after RESULT_CACHE_MAX_AGE seconds, so a result
+is never older than that even without the triggers (migration 11).
+"""
+
+import functools
+import os
+import time
+import psycopg2
+from models.database import db_route, execute_query, run_in_db_executor
+from utils.cache import ResultCache, TableVersions
+
+# Upper bound on the JSON size of all cached results together
+RESULT_CACHE_MAX_BYTES = int(os.getenv('RESULT_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+# Seconds between reads of result_cache_versions: how long another process's write can go unseen
+RESULT_CACHE_SYNC_SECONDS = float(os.getenv('RESULT_CACHE_SYNC_SECONDS', '2'))
+# Age after which any cached result is recomputed, whatever max_age the endpoint set
+RESULT_CACHE_MAX_AGE = float(os.getenv('RESULT_CACHE_MAX_AGE', '600'))
+
+# Tables whose writes are counted in result_cache_versions
+RESULT_CACHE_TABLES = (
+    "users", "courses", "tests", "questions", "options",
+    "user_test_attempts", "recommendations", "recommendation_feedback"
+)
+
+# Tables where only updates of these columns count, through a row trigger. Cached results
+# never read users.last_login / is_active / password_hash, and every login sets last_login.
+RESULT_CACHE_UPDATE_COLUMNS = {
+    "users": ("username", "first_name", "last_name", "email", "academic_info", "created_at")
+}
+
+RESULT_CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS result_cache_versions (
+    table_name TEXT PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0
+);
+
+CREATE OR REPLACE FUNCTION bump_result_cache_version() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO result_cache_versions AS v (table_name, version) VALUES (TG_TABLE_NAME, 1)
+    ON CONFLICT (table_name) DO UPDATE SET version = v.version + 1;
+    RETURN NULL;
+END;
+$$;
+"""
+
+# Rows removed along with a deleted parent (ON DELETE CASCADE)
+ON_DELETE_CASCADE = {
+    "users": ("user_test_attempts", "recommendations", "recommendation_feedback"),
+    "courses": ("recommendations", "recommendation_feedback"),
+    "tests": ("user_test_attempts", "questions", "options"),
+    "questions": ("options",),
+    "recommendations": ("recommendation_feedback",)
+}
+
+table_versions = TableVersions()
+result_cache = ResultCache('analytics_results', table_versions, RESULT_CACHE_MAX_BYTES)
+
+# Versions last read from result_cache_versions, and when
+database_versions = {}
+version_sync = {"synced_at": None, "last_error": None}
+
+def result_cache_trigger_sql():
+    """DDL (re)creating the triggers that bump result_cache_versions"""
+    statements = []
+    for table in RESULT_CACHE_TABLES:
+        name = f"result_cache_{table}"
+        columns = RESULT_CACHE_UPDATE_COLUMNS.get(table)
+        statements.append(f"DROP TRIGGER IF EXISTS {name} ON {table}")
+        statements.append(f"DROP TRIGGER IF EXISTS {name}_update ON {table}")
+        statements.append(
+            f"CREATE TRIGGER {name} AFTER INSERT OR {'' if columns else 'UPDATE OR '}DELETE OR TRUNCATE ON {table} "
+            f"FOR EACH STATEMENT EXECUTE FUNCTION bump_result_cache_version()"
+        )
+        if columns:
+            old_values = ", ".join(f"OLD.{column}" for column in columns)
+            new_values = ", ".join(f"NEW.{column}" for column in columns)
+            statements.append(
+                f"CREATE TRIGGER {name}_update AFTER UPDATE OF {', '.join(columns)} ON {table} FOR EACH ROW "
+                f"WHEN (({old_values}) IS DISTINCT FROM ({new_values})) "
+                f"EXECUTE FUNCTION bump_result_cache_version()"
+            )
+    return statements
+
+def read_database_versions():
+    """{table: version} from the primary; a lagging replica could hide or reorder bumps"""
+    # Runs in the executor's copy of the caller's context, so the route does not leak back
+    db_route.set('primary')
+    rows = execute_query("SELECT table_name, version FROM result_cache_versions", prepared=True)
+    return {row['table_name']: row['version'] for row in rows}
+
+async def sync_table_versions():
+    """
+    Bump the local version of every table whose result_cache_versions row moved since the last read.
+    This process's own writes are bumped twice: right after commit by bump_table_versions()
+    (so its next read sees them), and again here, because a moved row cannot tell them apart
+    from another process's write committed meanwhile. That costs at most one extra recompute
+    per cached result and write.
+    """
+    now = time.monotonic()
+    if version_sync["synced_at"] is not None and now - version_sync["synced_at"] < RESULT_CACHE_SYNC_SECONDS:
+        return
+    # Lookups arriving during the read keep using the versions already known
+    version_sync["synced_at"] = now
+    try:
+        versions = await run_in_db_executor(read_database_versions)
+    except psycopg2.Error as error:
+        # Without the table, RESULT_CACHE_MAX_AGE alone bounds staleness
+        version_sync["last_error"] = str(error)
+        return
+    version_sync["last_error"] = None
+    changed = [table for table, version in versions.items() if database_versions.get(table) != version]
+    database_versions.update(versions)
+    if changed:
+        table_versions.bump(*changed)
+
+def bump_table_versions(*tables, deleted=False):
+    """Record a committed write to tables; deleted=True also bumps the tables rows cascade to"""
+    changed = list(tables)
+    if deleted:
+        for table in tables:
+            changed.extend(ON_DELETE_CASCADE.get(table, ()))
+    table_versions.bump(*dict.fromkeys(changed))
+
+def cached_result(*tables, max_age=None):
+    """
+    Cache an endpoint's return value per parameter set until one of tables changes,
+    for RESULT_CACHE_MAX_AGE seconds at most. A shorter max_age (seconds) is for
+    answers that also depend on the clock, such as "last 30 days" ranges that default to now.
+
+        @router.get("/admin/assessments")
+        @cached_result("tests", "user_test_attempts", max_age=300)
+        async def get_assessments_analytics(): ...
+    """
+    def decorator(endpoint):
+        @functools.wraps(endpoint)
+        async def cached_endpoint(**params):
+            key = (
+                f"{endpoint.__module__}.{endpoint.__qualname__}",
+                tuple(sorted((name, repr(value)) for name, value in params.items()))
+            )
+            await sync_table_versions()
+            return await result_cache.get(
+                key, tables, lambda: endpoint(**params), min(max_age or RESULT_CACHE_MAX_AGE, RESULT_CACHE_MAX_AGE)
+            )
+        # Read by scheduled_report() to expire its background result on the same writes
+        cached_endpoint.tables = tables
+        return cached_endpoint
+    return decorator
@@ -0,0 +1,372 @@
+"""
+Rollup tables for the analytics endpoints, kept current by statement-level
+triggers on user_test_attempts, recommendations and recommendation_feedback.
+Triggers apply each write's delta (+1 for new rows, -1 for old rows), so a
+COPY of 100k attempts costs one aggregated upsert, not 100k. Row triggers on
+tests move a test's attempts in or out of the per-user adaptive counts when
+its test_type changes or an adaptive test is deleted.
+
+    attempt_rollup_hourly         attempts / score totals per UTC hour and test
+    recommendation_rollup_hourly  recommendations per UTC hour and course
+    user_activity_rollup          per-user attempt and recommendation totals, last attempt dates
+    course_recommendation_rollup  per-course recommendation totals by status
+    feedback_rating_rollup        feedback rating histogram
+
+Hourly buckets are UTC, so day/week/month series can be re-bucketed into any
+whole-hour timezone at read time. install_rollups() is idempotent;
+rebuild_rollups() recomputes everything from the source tables (backfills,
+after TRUNCATE or bulk changes made with triggers disabled).
+"""
+
+from models.database import transaction, run_in_db_executor
+
+ROLLUP_SCHEMA = """
+CREATE TABLE IF NOT EXISTS attempt_rollup_hourly (
+    bucket TIMESTAMPTZ NOT NULL,
+    test_id INTEGER NOT NULL,
+    attempts BIGINT NOT NULL DEFAULT 0,
+    score_sum BIGINT NOT NULL DEFAULT 0,
+    question_sum BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (bucket, test_id)
+);
+
+CREATE TABLE IF NOT EXISTS recommendation_rollup_hourly (
+    bucket TIMESTAMPTZ NOT NULL,
+    course_id INTEGER NOT NULL,
+    recommendations BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (bucket, course_id)
+);
+
+CREATE TABLE IF NOT EXISTS user_activity_rollup (
+    user_id INTEGER PRIMARY KEY,
+    attempts BIGINT NOT NULL DEFAULT 0,
+    adaptive_attempts BIGINT NOT NULL DEFAULT 0,
+    last_attempt_at TIMESTAMPTZ,
+    last_adaptive_attempt_at TIMESTAMPTZ,
+    recommendations BIGINT NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_user_activity_rollup_attempts ON user_activity_rollup (attempts DESC);
+
+CREATE TABLE IF NOT EXISTS course_recommendation_rollup (
+    course_id INTEGER PRIMARY KEY,
+    recommendations BIGINT NOT NULL DEFAULT 0,
+    accepted BIGINT NOT NULL DEFAULT 0,
+    rejected BIGINT NOT NULL DEFAULT 0,
+    pending BIGINT NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS feedback_rating_rollup (
+    rating SMALLINT PRIMARY KEY,
+    feedback_count BIGINT NOT NULL DEFAULT 0,
+    with_comment_count BIGINT NOT NULL DEFAULT 0
+);
+
+-- UTC hour a timestamp belongs to; undated rows land in the epoch bucket so totals still add up
+CREATE OR REPLACE FUNCTION rollup_hour(ts TIMESTAMPTZ) RETURNS TIMESTAMPTZ
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT date_trunc('hour', COALESCE(ts, 'epoch'::timestamptz) AT TIME ZONE 'UTC') AT TIME ZONE 'UTC'
+$$;
+
+-- Rows a statement added (+1) and removed (-1), read from the trigger's transition tables
+CREATE OR REPLACE FUNCTION rollup_delta_source(op TEXT) RETURNS TEXT
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT CASE op
+        WHEN 'INSERT' THEN 'SELECT n.*, 1 AS sign FROM new_rows n'
+        WHEN 'DELETE' THEN 'SELECT o.*, -1 AS sign FROM old_rows o'
+        ELSE 'SELECT n.*, 1 AS sign FROM new_rows n UNION ALL SELECT o.*, -1 AS sign FROM old_rows o'
+    END
+$$;
+
+CREATE OR REPLACE FUNCTION rollup_user_test_attempts() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    EXECUTE format($sql$
+        WITH delta AS (%s)
+        INSERT INTO attempt_rollup_hourly AS r (bucket, test_id, attempts, score_sum, question_sum)
+        SELECT rollup_hour(attempt_date), test_id, SUM(sign), SUM(sign * score), SUM(sign * total_questions)
+        FROM delta
+        GROUP BY 1, 2
+        ORDER BY 1, 2
+        ON CONFLICT (bucket, test_id) DO UPDATE SET
+            attempts = r.attempts + EXCLUDED.attempts,
+            score_sum = r.score_sum + EXCLUDED.score_sum,
+            question_sum = r.question_sum + EXCLUDED.question_sum
+    $sql$, rollup_delta_source(TG_OP));
+
+    EXECUTE format($sql$
+        WITH delta AS (%s)
+        INSERT INTO user_activity_rollup AS r (user_id, attempts, adaptive_attempts, last_attempt_at, last_adaptive_attempt_at)
+        SELECT
+            d.user_id,
+            SUM(d.sign),
+            COALESCE(SUM(d.sign) FILTER (WHERE t.test_type = 'adaptive'), 0),
+            MAX(d.attempt_date) FILTER (WHERE d.sign > 0),
+            MAX(d.attempt_date) FILTER (WHERE d.sign > 0 AND t.test_type = 'adaptive')
+        FROM delta d
+        LEFT JOIN tests t ON t.test_id = d.test_id
+        GROUP BY d.user_id
+        ORDER BY d.user_id
+        ON CONFLICT (user_id) DO UPDATE SET
+            attempts = r.attempts + EXCLUDED.attempts,
+            adaptive_attempts = r.adaptive_attempts + EXCLUDED.adaptive_attempts,
+            last_attempt_at = GREATEST(r.last_attempt_at, EXCLUDED.last_attempt_at),
+            last_adaptive_attempt_at = GREATEST(r.last_adaptive_attempt_at, EXCLUDED.last_adaptive_attempt_at)
+    $sql$, rollup_delta_source(TG_OP));
+
+    IF TG_OP <> 'INSERT' THEN
+        -- A removed attempt may have been the latest one; re-read the latest dates for those users
+        UPDATE user_activity_rollup r SET
+            last_attempt_at = (
+                SELECT MAX(attempt_date) FROM user_test_attempts WHERE user_id = r.user_id
+            ),
+            last_adaptive_attempt_at = (
+                SELECT MAX(uta.attempt_date) FROM user_test_attempts uta
+                JOIN tests t ON t.test_id = uta.test_id
+                WHERE uta.user_id = r.user_id AND t.test_type = 'adaptive'
+            )
+        WHERE r.user_id IN (SELECT user_id FROM old_rows);
+        DELETE FROM attempt_rollup_hourly
+        WHERE attempts = 0 AND (bucket, test_id) IN (SELECT rollup_hour(attempt_date), test_id FROM old_rows);
+    END IF;
+    RETURN NULL;
+END
+$$;
+
+CREATE OR REPLACE FUNCTION rollup_recommendations() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    EXECUTE format($sql$
+        WITH delta AS (%s)
+        INSERT INTO recommendation_rollup_hourly AS r (bucket, course_id, recommendations)
+        SELECT rollup_hour(recommended_at), COALESCE(course_id, 0), SUM(sign)
+        FROM delta
+        GROUP BY 1, 2
+        ORDER BY 1, 2
+        ON CONFLICT (bucket, course_id) DO UPDATE SET
+            recommendations = r.recommendations + EXCLUDED.recommendations
+    $sql$, rollup_delta_source(TG_OP));
+
+    EXECUTE format($sql$
+        WITH delta AS (%s)
+        INSERT INTO course_recommendation_rollup AS r (course_id, recommendations, accepted, rejected, pending)
+        SELECT
+            COALESCE(course_id, 0),
+            SUM(sign),
+            COALESCE(SUM(sign) FILTER (WHERE status = 'accepted'), 0),
+            COALESCE(SUM(sign) FILTER (WHERE status = 'rejected'), 0),
+            COALESCE(SUM(sign) FILTER (WHERE status = 'pending'), 0)
+        FROM delta
+        GROUP BY 1
+        ORDER BY 1
+        ON CONFLICT (course_id) DO UPDATE SET
+            recommendations = r.recommendations + EXCLUDED.recommendations,
+            accepted = r.accepted + EXCLUDED.accepted,
+            rejected = r.rejected + EXCLUDED.rejected,
+            pending = r.pending + EXCLUDED.pending
+    $sql$, rollup_delta_source(TG_OP));
+
+    EXECUTE format($sql$
+        WITH delta AS (%s)
+        INSERT INTO user_activity_rollup AS r (user_id, recommendations)
+        SELECT user_id, SUM(sign)
+        FROM delta
+        WHERE user_id IS NOT NULL
+        GROUP BY user_id
+        ORDER BY user_id
+        ON CONFLICT (user_id) DO UPDATE SET
+            recommendations = r.recommendations + EXCLUDED.recommendations
+    $sql$, rollup_delta_source(TG_OP));
+    RETURN NULL;
+END
+$$;
+
+CREATE OR REPLACE FUNCTION rollup_recommendation_feedback() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    EXECUTE format($sql$
+        WITH delta AS (%s)
+        INSERT INTO feedback_rating_rollup AS r (rating, feedback_count, with_comment_count)
+        SELECT
+            rating,
+            SUM(sign),
+            COALESCE(SUM(sign) FILTER (WHERE feedback_text IS NOT NULL AND feedback_text != ''), 0)
+        FROM delta
+        GROUP BY rating
+        ORDER BY rating
+        ON CONFLICT (rating) DO UPDATE SET
+            feedback_count = r.feedback_count + EXCLUDED.feedback_count,
+            with_comment_count = r.with_comment_count + EXCLUDED.with_comment_count
+    $sql$, rollup_delta_source(TG_OP));
+    RETURN NULL;
+END
+$$;
+
+-- Adaptive counts follow the test's current type. Deleting an adaptive test takes its attempts
+-- out before the cascade, whose attempt delta no longer finds the test row.
+CREATE OR REPLACE FUNCTION rollup_tests() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+DECLARE
+    sign INTEGER := CASE WHEN TG_OP = 'UPDATE' AND NEW.test_type = 'adaptive' THEN 1 ELSE -1 END;
+BEGIN
+    UPDATE user_activity_rollup r SET
+        adaptive_attempts = r.adaptive_attempts + sign * a.attempts
+    FROM (
+        SELECT user_id, COUNT(*) as attempts
+        FROM user_test_attempts
+        WHERE test_id = OLD.test_id
+        GROUP BY user_id
+    ) a
+    WHERE r.user_id = a.user_id;
+
+    IF TG_OP = 'UPDATE' THEN
+        UPDATE user_activity_rollup r SET
+            last_adaptive_attempt_at = (
+                SELECT MAX(uta.attempt_date) FROM user_test_attempts uta
+                JOIN tests t ON t.test_id = uta.test_id
+                WHERE uta.user_id = r.user_id AND t.test_type = 'adaptive'
+            )
+        WHERE r.user_id IN (SELECT user_id FROM user_test_attempts WHERE test_id = NEW.test_id);
+    END IF;
+    RETURN OLD;
+END
+$$;
+
+DROP TRIGGER IF EXISTS rollup_tests_type ON tests;
+DROP TRIGGER IF EXISTS rollup_tests_delete ON tests;
+CREATE TRIGGER rollup_tests_type AFTER UPDATE OF test_type ON tests
+    FOR EACH ROW WHEN (OLD.test_type IS DISTINCT FROM NEW.test_type AND (OLD.test_type = 'adaptive' OR NEW.test_type = 'adaptive'))
+    EXECUTE FUNCTION rollup_tests();
+CREATE TRIGGER rollup_tests_delete BEFORE DELETE ON tests
+    FOR EACH ROW WHEN (OLD.test_type = 'adaptive') EXECUTE FUNCTION rollup_tests();
+
+DROP TRIGGER IF EXISTS rollup_attempts_insert ON user_test_attempts;
+DROP TRIGGER IF EXISTS rollup_attempts_update ON user_test_attempts;
+DROP TRIGGER IF EXISTS rollup_attempts_delete ON user_test_attempts;
+CREATE TRIGGER rollup_attempts_insert AFTER INSERT ON user_test_attempts
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION rollup_user_test_attempts();
+CREATE TRIGGER rollup_attempts_update AFTER UPDATE ON user_test_attempts
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION rollup_user_test_attempts();
+CREATE TRIGGER rollup_attempts_delete AFTER DELETE ON user_test_attempts
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION rollup_user_test_attempts();
+
+DROP TRIGGER IF EXISTS rollup_recommendations_insert ON recommendations;
+DROP TRIGGER IF EXISTS rollup_recommendations_update ON recommendations;
+DROP TRIGGER IF EXISTS rollup_recommendations_delete ON recommendations;
+CREATE TRIGGER rollup_recommendations_insert AFTER INSERT ON recommendations
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION rollup_recommendations();
+CREATE TRIGGER rollup_recommendations_update AFTER UPDATE ON recommendations
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION rollup_recommendations();
+CREATE TRIGGER rollup_recommendations_delete AFTER DELETE ON recommendations
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION rollup_recommendations();
+
+DROP TRIGGER IF EXISTS rollup_feedback_insert ON recommendation_feedback;
+DROP TRIGGER IF EXISTS rollup_feedback_update ON recommendation_feedback;
+DROP TRIGGER IF EXISTS rollup_feedback_delete ON recommendation_feedback;
+CREATE TRIGGER rollup_feedback_insert AFTER INSERT ON recommendation_feedback
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION rollup_recommendation_feedback();
+CREATE TRIGGER rollup_feedback_update AFTER UPDATE ON recommendation_feedback
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION rollup_recommendation_feedback();
+CREATE TRIGGER rollup_feedback_delete AFTER DELETE ON recommendation_feedback
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION rollup_recommendation_feedback();
+"""
+
+# Recompute every rollup from the source tables. Writers are blocked (SHARE lock) so no
+# trigger delta can interleave; readers keep seeing the old rollups until commit.
+ROLLUP_REBUILD = [
+    "LOCK TABLE tests, user_test_attempts, recommendations, recommendation_feedback IN SHARE MODE",
+    "DELETE FROM attempt_rollup_hourly",
+    "DELETE FROM recommendation_rollup_hourly",
+    "DELETE FROM user_activity_rollup",
+    "DELETE FROM course_recommendation_rollup",
+    "DELETE FROM feedback_rating_rollup",
+    """
+    INSERT INTO attempt_rollup_hourly (bucket, test_id, attempts, score_sum, question_sum)
+    SELECT rollup_hour(attempt_date), test_id, COUNT(*), SUM(score), SUM(total_questions)
+    FROM user_test_attempts
+    GROUP BY 1, 2
+    """,
+    """
+    INSERT INTO recommendation_rollup_hourly (bucket, course_id, recommendations)
+    SELECT rollup_hour(recommended_at), COALESCE(course_id, 0), COUNT(*)
+    FROM recommendations
+    GROUP BY 1, 2
+    """,
+    """
+    INSERT INTO user_activity_rollup (user_id, attempts, adaptive_attempts, last_attempt_at, last_adaptive_attempt_at, recommendations)
+    SELECT
+        COALESCE(a.user_id, r.user_id),
+        COALESCE(a.attempts, 0),
+        COALESCE(a.adaptive_attempts, 0),
+        a.last_attempt_at,
+        a.last_adaptive_attempt_at,
+        COALESCE(r.recommendations, 0)
+    FROM (
+        SELECT
+            uta.user_id,
+            COUNT(*) as attempts,
+            COUNT(*) FILTER (WHERE t.test_type = 'adaptive') as adaptive_attempts,
+            MAX(uta.attempt_date) as last_attempt_at,
+            MAX(uta.attempt_date) FILTER (WHERE t.test_type = 'adaptive') as last_adaptive_attempt_at
+        FROM user_test_attempts uta
+        LEFT JOIN tests t ON t.test_id = uta.test_id
+        GROUP BY uta.user_id
+    ) a
+    FULL JOIN (
+        SELECT user_id, COUNT(*) as recommendations
+        FROM recommendations
+        WHERE user_id IS NOT NULL
+        GROUP BY user_id
+    ) r ON r.user_id = a.user_id
+    """,
+    """
+    INSERT INTO course_recommendation_rollup (course_id, recommendations, accepted, rejected, pending)
+    SELECT
+        COALESCE(course_id, 0),
+        COUNT(*),
+        COUNT(*) FILTER (WHERE status = 'accepted'),
+        COUNT(*) FILTER (WHERE status = 'rejected'),
+        COUNT(*) FILTER (WHERE status = 'pending')
+    FROM recommendations
+    GROUP BY 1
+    """,
+    """
+    INSERT INTO feedback_rating_rollup (rating, feedback_count, with_comment_count)
+    SELECT
+        rating,
+        COUNT(*),
+        COUNT(*) FILTER (WHERE feedback_text IS NOT NULL AND feedback_text != '')
+    FROM recommendation_feedback
+    GROUP BY rating
+    """
+]
+
+ROLLUP_TABLES = [
+    'attempt_rollup_hourly',
+    'recommendation_rollup_hourly',
+    'user_activity_rollup',
+    'course_recommendation_rollup',
+    'feedback_rating_rollup'
+]
+
+def install_rollups(tx):
+    """Create (or update) the rollup tables, functions and triggers inside tx"""
+    tx.execute_query(ROLLUP_SCHEMA, fetch=False)
+
+def rebuild_rollups(tx):
+    """Recompute every rollup table from its source table inside tx; returns rows per table"""
+    for statement in ROLLUP_REBUILD:
+        tx.execute_query(statement, fetch=False)
+    return {
+        table: tx.execute_query_one(f"SELECT COUNT(*) as count FROM {table}")['count']
+        for table in ROLLUP_TABLES
+    }
+
+def install_and_rebuild_rollups():
+    """Install the rollups and backfill them in one transaction"""
+    with transaction() as tx:
+        install_rollups(tx)
+        return rebuild_rollups(tx)
+
+async def install_and_rebuild_rollups_async():
+    """Awaitable version of install_and_rebuild_rollups"""
+    return await run_in_db_executor(install_and_rebuild_rollups)
@@ -0,0 +1,237 @@
+"""
+Daily sketches of user_test_attempts for approx=true analytics.
+
+One row per UTC day holds a HyperLogLog of the users who made an attempt and
+KLL sketches of score percentage and time_taken (utils/sketches.py). A range
+query merges its days' sketches, so its cost follows the number of days and
+not the number of attempts.
+
+A statement trigger on user_test_attempts bumps the version of every UTC day a
+write touches in attempt_day_versions (inserts, deletes, rescores, time_taken
+edits alike). A day's sketch is stale when its version differs from the one the
+sketch was built from. Stale days are rebuilt in the background by the
+daily_sketches job of report_scheduler, never by a request: a request merges
+the current sketches and sketches the remaining days in memory from
+user_test_attempts, inside one read-only transaction.
+"""
+
+import os
+from datetime import date, datetime, timedelta, timezone
+from models.database import db_route, db_workload, transaction, run_in_db_executor
+from models.query_stats import current_route
+from models.reports import report_scheduler
+from models.result_cache import table_versions
+from utils.sketches import HyperLogLog, KLL, KLL_RANK_ERROR
+
+# Seconds between background rebuilds of stale daily sketches (sooner after writes to user_test_attempts)
+SKETCH_REFRESH_INTERVAL = float(os.getenv('SKETCH_REFRESH_INTERVAL', '300'))
+# Share of a range's days without a current sketch above which approx=true scans the range exactly
+SKETCH_EXACT_FALLBACK = float(os.getenv('SKETCH_EXACT_FALLBACK', '0.25'))
+
+SKETCH_SCHEMA = """
+CREATE TABLE IF NOT EXISTS attempt_daily_sketches (
+    day DATE PRIMARY KEY,
+    attempts BIGINT NOT NULL,
+    users_hll BYTEA NOT NULL,
+    score_kll BYTEA NOT NULL,
+    time_taken_kll BYTEA NOT NULL,
+    built_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+-- attempt_day_versions.version the sketch was built from (0: built before versions existed)
+ALTER TABLE attempt_daily_sketches ADD COLUMN IF NOT EXISTS version BIGINT NOT NULL DEFAULT 0;
+
+CREATE TABLE IF NOT EXISTS attempt_day_versions (
+    day DATE PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 1
+);
+
+-- Reuses rollup_delta_source() from models/rollups.py. Undated attempts belong to no day.
+CREATE OR REPLACE FUNCTION track_attempt_days() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    EXECUTE format($sql$
+        INSERT INTO attempt_day_versions AS v (day)
+        SELECT DISTINCT (attempt_date AT TIME ZONE 'UTC')::date
+        FROM (%s) changed
+        WHERE attempt_date IS NOT NULL
+        ORDER BY 1
+        ON CONFLICT (day) DO UPDATE SET version = v.version + 1
+    $sql$, rollup_delta_source(TG_OP));
+    RETURN NULL;
+END
+$$;
+
+DROP TRIGGER IF EXISTS sketch_attempts_insert ON user_test_attempts;
+DROP TRIGGER IF EXISTS sketch_attempts_update ON user_test_attempts;
+DROP TRIGGER IF EXISTS sketch_attempts_delete ON user_test_attempts;
+CREATE TRIGGER sketch_attempts_insert AFTER INSERT ON user_test_attempts
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION track_attempt_days();
+CREATE TRIGGER sketch_attempts_update AFTER UPDATE ON user_test_attempts
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION track_attempt_days();
+CREATE TRIGGER sketch_attempts_delete AFTER DELETE ON user_test_attempts
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION track_attempt_days();
+
+-- Days that already hold attempts start at version 1 (the rollup avoids scanning the attempts)
+INSERT INTO attempt_day_versions (day)
+SELECT DISTINCT (bucket AT TIME ZONE 'UTC')::date
+FROM attempt_rollup_hourly
+WHERE bucket <> 'epoch'::timestamptz AND attempts > 0
+ON CONFLICT (day) DO NOTHING;
+"""
+
+QUANTILES = [0.5, 0.9, 0.99]
+
+def day_start(day):
+    return datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+
+def stale_days(tx, first_day, last_day):
+    """Days in [first_day, last_day] whose sketch is missing or older than the day's current version"""
+    return tx.execute_query("""
+        SELECT v.day, v.version
+        FROM attempt_day_versions v
+        LEFT JOIN attempt_daily_sketches s ON s.day = v.day
+        WHERE v.day >= $1 AND v.day <= $2 AND s.version IS DISTINCT FROM v.version
+        ORDER BY 1
+    """, [first_day, last_day])
+
+def build_day(tx, day):
+    """Sketch one day's attempts from the source table"""
+    users = HyperLogLog()
+    scores = KLL(seed=day.toordinal())
+    times = KLL(seed=-day.toordinal())
+    attempts = 0
+    for user_id, score, total_questions, time_taken in tx.iter_query("""
+        SELECT user_id, score, total_questions, time_taken
+        FROM user_test_attempts
+        WHERE attempt_date >= $1 AND attempt_date < $2
+    """, [day_start(day), day_start(day) + timedelta(days=1)], tuples=True):
+        attempts += 1
+        users.add(user_id)
+        if total_questions:
+            scores.update(score * 100 / total_questions)
+        if time_taken is not None:
+            times.update(time_taken)
+    return attempts, users, scores, times
+
+def refresh_daily_sketches(tx, first_day, last_day):
+    """Rebuild the stale sketches in [first_day, last_day] inside tx; returns the number of days rebuilt"""
+    stale = stale_days(tx, first_day, last_day)
+    for row in stale:
+        attempts, users, scores, times = build_day(tx, row['day'])
+        if not attempts:
+            # Emptied day: forget it unless a write bumped it again meanwhile
+            tx.execute_query("DELETE FROM attempt_daily_sketches WHERE day = $1", [row['day']], fetch=False)
+            tx.execute_query(
+                "DELETE FROM attempt_day_versions WHERE day = $1 AND version = $2",
+                [row['day'], row['version']], fetch=False
+            )
+            continue
+        tx.execute_query("""
+            INSERT INTO attempt_daily_sketches (day, attempts, users_hll, score_kll, time_taken_kll, version, built_at)
+            VALUES ($1, $2, $3, $4, $5, $6, NOW())
+            ON CONFLICT (day) DO UPDATE SET
+                attempts = EXCLUDED.attempts,
+                users_hll = EXCLUDED.users_hll,
+                score_kll = EXCLUDED.score_kll,
+                time_taken_kll = EXCLUDED.time_taken_kll,
+                version = EXCLUDED.version,
+                built_at = EXCLUDED.built_at
+        """, [row['day'], attempts, users.to_bytes(), scores.to_bytes(), times.to_bytes(), row['version']], fetch=False)
+    return len(stale)
+
+def refresh_stale_sketches():
+    """Rebuild every stale daily sketch in one transaction on the primary; returns the number of days rebuilt"""
+    with transaction() as tx:
+        return refresh_daily_sketches(tx, date.min, date.max)
+
+async def refresh_sketches_job():
+    """daily_sketches job of report_scheduler; runs in the scheduler's own task"""
+    db_workload.set('maintenance')
+    db_route.set('primary')
+    current_route.set("REPORT daily_sketches")
+    return {"days_rebuilt": await run_in_db_executor(refresh_stale_sketches)}
+
+report_scheduler.register("daily_sketches", refresh_sketches_job, SKETCH_REFRESH_INTERVAL)
+table_versions.on_change(("user_test_attempts",), lambda: report_scheduler.mark_stale("daily_sketches"))
+
+def approximate_activity(first_day, last_day):
+    """
+    Merge the daily sketches of [first_day, last_day]. Days without a current sketch are
+    sketched in memory from user_test_attempts instead, or the whole range is answered
+    exactly when more than SKETCH_EXACT_FALLBACK of its days have none (the exact scan is
+    cheaper than sketching that many days in Python). Nothing is written, so this may run
+    on the read replica. Returns attempts (exact), active_users and score / time_taken
+    quantiles (approximate).
+    """
+    users = HyperLogLog()
+    scores = KLL(seed=0)
+    times = KLL(seed=1)
+    attempts = 0
+    with transaction(readonly=True, isolation='REPEATABLE READ') as tx:
+        unsketched = stale_days(tx, first_day, last_day)
+        if len(unsketched) > SKETCH_EXACT_FALLBACK * ((last_day - first_day).days + 1):
+            return {
+                **exact_figures(tx, first_day, last_day),
+                "unsketched_days": len(unsketched),
+                "error_bounds": {"active_users_relative_standard_error": 0.0, "percentile_rank_error": 0.0}
+            }
+        for row in tx.iter_query("""
+            SELECT s.attempts, s.users_hll, s.score_kll, s.time_taken_kll
+            FROM attempt_daily_sketches s
+            JOIN attempt_day_versions v ON v.day = s.day AND v.version = s.version
+            WHERE s.day >= $1 AND s.day <= $2
+        """, [first_day, last_day], tuples=True):
+            attempts += row[0]
+            users.merge(HyperLogLog.from_bytes(row[1]))
+            scores.merge(KLL.from_bytes(row[2]))
+            times.merge(KLL.from_bytes(row[3]))
+        for row in unsketched:
+            day_attempts, day_users, day_scores, day_times = build_day(tx, row['day'])
+            attempts += day_attempts
+            users.merge(day_users)
+            scores.merge(day_scores)
+            times.merge(day_times)
+    return {
+        "attempts": attempts,
+        "active_users": users.count() if attempts else 0,
+        "score_percentiles": scores.quantiles(QUANTILES),
+        "time_taken_percentiles": times.quantiles(QUANTILES),
+        "unsketched_days": len(unsketched),
+        "error_bounds": {
+            "active_users_relative_standard_error": round(users.standard_error, 4),
+            "percentile_rank_error": KLL_RANK_ERROR
+        }
+    }
+
+def exact_figures(tx, first_day, last_day):
+    """The same figures as approximate_activity, computed exactly from user_test_attempts inside tx"""
+    row = tx.execute_query_one("""
+        SELECT
+            COUNT(*) as attempts,
+            COUNT(DISTINCT user_id) as active_users,
+            percentile_disc($3::float8[]) WITHIN GROUP (
+                ORDER BY score * 100.0 / NULLIF(total_questions, 0)
+            ) as score_percentiles,
+            percentile_disc($3::float8[]) WITHIN GROUP (ORDER BY time_taken) as time_taken_percentiles
+        FROM user_test_attempts
+        WHERE attempt_date >= $1 AND attempt_date < $2
+    """, [day_start(first_day), day_start(last_day) + timedelta(days=1), QUANTILES])
+    return {
+        "attempts": row['attempts'],
+        "active_users": row['active_users'],
+        "score_percentiles": [float(value) if value is not None else None for value in row['score_percentiles'] or [None] * len(QUANTILES)],
+        "time_taken_percentiles": [float(value) if value is not None else None for value in row['time_taken_percentiles'] or [None] * len(QUANTILES)]
+    }
+
+def exact_activity(first_day, last_day):
+    """Exact activity figures for [first_day, last_day] in a read-only transaction"""
+    with transaction(readonly=True) as tx:
+        return exact_figures(tx, first_day, last_day)
+
+async def get_activity_stats(first_day, last_day, approx=False):
+    """Awaitable activity figures for the UTC days [first_day, last_day]"""
+    if approx:
+        # Sketch demand keeps the background rebuild going; the request never waits for it
+        report_scheduler.touch("daily_sketches")
+    compute = approximate_activity if approx else exact_activity
+    return await run_in_db_executor(compute, first_day, last_day)
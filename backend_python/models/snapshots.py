@@ -0,0 +1,259 @@
+"""
+Columnar snapshots of the attempt, recommendation and feedback tables for offline analysis.
+
+Each table is written as one compressed file per calendar month (UTC), under
+SNAPSHOT_DIR/<dataset>/month=YYYY-MM/, as Parquet when pyarrow is installed,
+otherwise as NumPy .npz. A manifest (SNAPSHOT_DIR/manifest.json) records
+what was written.
+
+Exports are incremental. Statement-level triggers bump a per-(dataset, month)
+version in export_partition_versions whenever rows of that month are inserted,
+updated or deleted, and a run only rewrites the months whose version differs
+from the manifest. A run reads the versions and the data from one REPEATABLE
+READ snapshot, so a write that lands mid-run is picked up by the next run.
+"""
+
+import json
+import os
+from datetime import date, datetime, timezone
+from models.database import db_route, transaction, np
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is optional; snapshots fall back to NumPy .npz
+    pa = None
+    pq = None
+
+SNAPSHOT_DIR = os.getenv(
+    'SNAPSHOT_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'snapshots')
+)
+
+# dataset -> (table, partition column, SELECT list). The partition column decides the month.
+SNAPSHOT_DATASETS = {
+    "attempts": ("user_test_attempts", "attempt_date", """
+        attempt_id, user_id, test_id, score, total_questions, time_taken, attempt_date
+    """),
+    "recommendations": ("recommendations", "recommended_at", """
+        recommendation_id, attempt_id, user_id, course_id, status, recommended_at, reasoning
+    """),
+    "feedback": ("recommendation_feedback", "created_at", """
+        feedback_id, recommendation_id, user_id, rating, feedback_text, created_at
+    """)
+}
+
+SNAPSHOT_SCHEMA = """
+CREATE TABLE IF NOT EXISTS export_partition_versions (
+    dataset TEXT NOT NULL,
+    month DATE NOT NULL,
+    version BIGINT NOT NULL DEFAULT 1,
+    changed_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (dataset, month)
+);
+
+-- UTC month a timestamp belongs to; undated rows land in the epoch month
+CREATE OR REPLACE FUNCTION export_month(ts TIMESTAMPTZ) RETURNS DATE
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT date_trunc('month', COALESCE(ts, 'epoch'::timestamptz) AT TIME ZONE 'UTC')::date
+$$;
+
+-- TG_ARGV: dataset name, partition column. Reuses rollup_delta_source() from models/rollups.py.
+CREATE OR REPLACE FUNCTION track_export_partitions() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    EXECUTE format($sql$
+        INSERT INTO export_partition_versions AS v (dataset, month)
+        SELECT DISTINCT %L, export_month(%I::timestamptz)
+        FROM (%s) changed
+        ORDER BY 2
+        ON CONFLICT (dataset, month) DO UPDATE SET version = v.version + 1, changed_at = NOW()
+    $sql$, TG_ARGV[0], TG_ARGV[1], rollup_delta_source(TG_OP));
+    RETURN NULL;
+END
+$$;
+
+CREATE INDEX IF NOT EXISTS idx_user_test_attempts_date ON user_test_attempts (attempt_date);
+CREATE INDEX IF NOT EXISTS idx_recommendations_recommended_at ON recommendations (recommended_at);
+CREATE INDEX IF NOT EXISTS idx_recommendation_feedback_created_at ON recommendation_feedback (created_at);
+"""
+
+def snapshot_trigger_sql(dataset):
+    """DDL (re)creating the three version-tracking triggers of one dataset"""
+    table, column, _ = SNAPSHOT_DATASETS[dataset]
+    statements = []
+    for operation, transition in (
+        ("INSERT", "NEW TABLE AS new_rows"),
+        ("UPDATE", "OLD TABLE AS old_rows NEW TABLE AS new_rows"),
+        ("DELETE", "OLD TABLE AS old_rows")
+    ):
+        name = f"snapshot_{dataset}_{operation.lower()}"
+        statements.append(f"DROP TRIGGER IF EXISTS {name} ON {table}")
+        statements.append(
+            f"CREATE TRIGGER {name} AFTER {operation} ON {table} REFERENCING {transition} "
+            f"FOR EACH STATEMENT EXECUTE FUNCTION track_export_partitions('{dataset}', '{column}')"
+        )
+    # Months that already hold rows start at version 1
+    statements.append(f"""
+        INSERT INTO export_partition_versions (dataset, month)
+        SELECT DISTINCT '{dataset}', export_month({column}::timestamptz) FROM {table}
+        ON CONFLICT (dataset, month) DO NOTHING
+    """)
+    return statements
+
+def install_snapshot_tracking(tx):
+    """Create (or update) the version table, triggers and partition indexes inside tx"""
+    tx.execute_query(SNAPSHOT_SCHEMA, fetch=False)
+    for dataset in SNAPSHOT_DATASETS:
+        for statement in snapshot_trigger_sql(dataset):
+            tx.execute_query(statement, fetch=False)
+
+def snapshot_format():
+    """'parquet' when pyarrow is available, else 'npz' (needs NumPy)"""
+    if pa is not None:
+        return "parquet"
+    if np is not None:
+        return "npz"
+    raise RuntimeError("Snapshot exports need pyarrow (Parquet) or numpy (.npz); install one of them")
+
+def npz_column(values):
+    """Lists that rows_to_columns left alone: timestamps -> datetime64 (UTC), anything else -> strings"""
+    if all(value is None or isinstance(value, (datetime, date)) for value in values):
+        return np.array([
+            np.datetime64('NaT') if value is None
+            else value.astimezone(timezone.utc).replace(tzinfo=None) if getattr(value, 'tzinfo', None)
+            else value
+            for value in values
+        ], dtype='datetime64[us]')
+    return np.array(['' if value is None else str(value) for value in values], dtype=np.str_)
+
+def fetch_partition(tx, fmt, query, params):
+    """Run a partition query; returns ({column: values}, row count) shaped for fmt"""
+    if fmt == "parquet":
+        names, rows = tx.execute_query_rows(query, params)
+        return {name: [row[index] for row in rows] for index, name in enumerate(names)}, len(rows)
+    columns = tx.execute_query_columns(query, params)
+    return columns, len(next(iter(columns.values()), []))
+
+def write_partition(path, fmt, columns):
+    """Write one month's columns to path atomically (temp file + rename)"""
+    temp_path = path + ".tmp"
+    if fmt == "parquet":
+        pq.write_table(pa.table(columns), temp_path, compression="zstd")
+    else:
+        arrays = {
+            name: values if isinstance(values, np.ndarray) else npz_column(values)
+            for name, values in columns.items()
+        }
+        with open(temp_path, "wb") as file:
+            np.savez_compressed(file, **arrays)
+    os.replace(temp_path, path)
+
+def manifest_path():
+    return os.path.join(SNAPSHOT_DIR, "manifest.json")
+
+def load_manifest():
+    """The last run's manifest ({"datasets": {dataset: {month: entry}}, ...}), empty before the first run"""
+    try:
+        with open(manifest_path()) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {"datasets": {}}
+
+def save_manifest(manifest):
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    temp_path = manifest_path() + ".tmp"
+    with open(temp_path, "w") as file:
+        json.dump(manifest, file, indent=2)
+    os.replace(temp_path, manifest_path())
+
+def partition_file(dataset, month, fmt):
+    """Path of one partition, relative to SNAPSHOT_DIR"""
+    return os.path.join(dataset, f"month={month}", f"data.{fmt}")
+
+def remove_partition_file(path):
+    """Delete a partition file (relative to SNAPSHOT_DIR) and its month directory once empty"""
+    full_path = os.path.join(SNAPSHOT_DIR, path)
+    if os.path.exists(full_path):
+        os.remove(full_path)
+    try:
+        os.rmdir(os.path.dirname(full_path))
+    except OSError:
+        pass
+
+class SnapshotInProgressError(RuntimeError):
+    """Raised when a snapshot export is started while another one is running"""
+
+def export_snapshots(full=False, datasets=None):
+    """
+    Write every month whose version changed since the last run (every month with full=True).
+    Returns {"format", "exported", "skipped", "removed"}; exported/removed list "dataset/YYYY-MM".
+    One run at a time across all workers and scripts: the run holds a transaction-level
+    advisory lock from before it reads the manifest until after it saves it. Advisory locks
+    are not shared with the replica, so the run always reads the primary.
+    """
+    db_route.set('primary')
+    with transaction(readonly=True, isolation='REPEATABLE READ') as tx:
+        locked = tx.execute_query_one(
+            "SELECT pg_try_advisory_xact_lock(hashtext('export_snapshots')) as locked"
+        )['locked']
+        if not locked:
+            raise SnapshotInProgressError("A snapshot export is already running")
+
+        fmt = snapshot_format()
+        manifest = load_manifest()
+        summary = {"format": fmt, "exported": [], "skipped": 0, "removed": []}
+
+        versions = tx.execute_query("""
+            SELECT dataset, month, version
+            FROM export_partition_versions
+            WHERE dataset = ANY($1)
+            ORDER BY dataset, month
+        """, [list(datasets or SNAPSHOT_DATASETS)])
+
+        for partition in versions:
+            dataset = partition['dataset']
+            month = partition['month'].strftime('%Y-%m')
+            entries = manifest["datasets"].setdefault(dataset, {})
+            entry = entries.get(month)
+            path = partition_file(dataset, month, fmt)
+            if (not full and entry and entry["version"] == partition['version']
+                    and entry["file"] == path and os.path.exists(os.path.join(SNAPSHOT_DIR, path))):
+                summary["skipped"] += 1
+                continue
+
+            table, column, select_list = SNAPSHOT_DATASETS[dataset]
+            month_start = datetime.combine(partition['month'], datetime.min.time(), timezone.utc)
+            month_end = datetime(month_start.year + month_start.month // 12, month_start.month % 12 + 1, 1, tzinfo=timezone.utc)
+            # The epoch month also holds rows without a date (see export_month)
+            columns, row_count = fetch_partition(tx, fmt, f"""
+                SELECT {select_list}
+                FROM {table}
+                WHERE ({column}::timestamptz >= $1 AND {column}::timestamptz < $2) OR ($3 AND {column} IS NULL)
+                ORDER BY 1
+            """, [month_start, month_end, partition['month'] == date(1970, 1, 1)])
+
+            if entry and entry["file"] != path:
+                remove_partition_file(entry["file"])
+            if not row_count:
+                remove_partition_file(path)
+                entries.pop(month, None)
+                summary["removed"].append(f"{dataset}/{month}")
+                continue
+
+            os.makedirs(os.path.dirname(os.path.join(SNAPSHOT_DIR, path)), exist_ok=True)
+            write_partition(os.path.join(SNAPSHOT_DIR, path), fmt, columns)
+            entries[month] = {
+                "version": partition['version'],
+                "rows": row_count,
+                "file": path,
+                "bytes": os.path.getsize(os.path.join(SNAPSHOT_DIR, path)),
+                "format": fmt,
+                "exported_at": datetime.now(timezone.utc).isoformat()
+            }
+            summary["exported"].append(f"{dataset}/{month}")
+
+        manifest["format"] = fmt
+        manifest["last_run_at"] = datetime.now(timezone.utc).isoformat()
+        save_manifest(manifest)
+    return summary
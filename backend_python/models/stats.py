@@ -0,0 +1,88 @@
+"""
+System-wide counters shared by the overview and export endpoints.
+One statement computes all of them from a single REPEATABLE READ snapshot,
+and the result is cached in-process for STATS_CACHE_TTL seconds, or until one of
+STATS_TABLES is written through the API (models/result_cache.py).
+Attempt and recommendation figures come from the rollup tables (models/rollups.py).
+"""
+
+import os
+from models.database import transaction_async
+from utils.cache import AsyncTTLCache
+from models.result_cache import table_versions
+
+# Seconds a stats snapshot is served before one request recomputes it
+STATS_CACHE_TTL = float(os.getenv('STATS_CACHE_TTL', '30'))
+
+STATS_SNAPSHOT_QUERY = """
+    WITH user_stats AS (
+        SELECT
+            COUNT(*) as total_users,
+            COUNT(*) FILTER (WHERE created_at >= NOW() - INTERVAL '30 days') as new_users_30d
+        FROM users
+    ),
+    attempt_stats AS (
+        SELECT
+            COALESCE(SUM(r.attempts), 0)::bigint as total_attempts,
+            COALESCE(SUM(r.attempts) FILTER (WHERE t.test_type = 'adaptive'), 0)::bigint as adaptive_attempts,
+            COALESCE(SUM(r.attempts) FILTER (WHERE t.test_type = 'assessment'), 0)::bigint as standard_attempts
+        FROM attempt_rollup_hourly r
+        LEFT JOIN tests t ON r.test_id = t.test_id
+    ),
+    recommendation_stats AS (
+        SELECT
+            COALESCE(SUM(recommendations), 0)::bigint as total_recommendations,
+            (
+                SELECT COALESCE(SUM(recommendations), 0)::bigint
+                FROM recommendation_rollup_hourly
+                WHERE bucket >= date_trunc('hour', NOW() - INTERVAL '30 days')
+            ) as new_recommendations_30d,
+            COALESCE(SUM(accepted), 0)::bigint as accepted,
+            COALESCE(SUM(rejected), 0)::bigint as rejected,
+            COALESCE(SUM(pending), 0)::bigint as pending
+        FROM course_recommendation_rollup
+    ),
+    most_active AS (
+        SELECT CONCAT(u.first_name, ' ', u.last_name) as fullname, top.attempts
+        FROM (
+            SELECT user_id, attempts
+            FROM user_activity_rollup
+            WHERE attempts > 0
+            ORDER BY attempts DESC
+            LIMIT 1
+        ) top
+        JOIN users u ON u.user_id = top.user_id
+    )
+    SELECT
+        user_stats.*,
+        (SELECT COUNT(*) FROM courses) as total_courses,
+        (SELECT COUNT(*) FROM tests) as total_tests,
+        attempt_stats.*,
+        recommendation_stats.*,
+        most_active.fullname as most_active_user,
+        COALESCE(most_active.attempts, 0) as most_active_user_assessments,
+        NOW() as snapshot_at
+    FROM user_stats
+    CROSS JOIN attempt_stats
+    CROSS JOIN recommendation_stats
+    LEFT JOIN most_active ON TRUE
+"""
+
+# Source tables of the snapshot (rollups included); a write through the API to any of them expires it
+STATS_TABLES = ("users", "courses", "tests", "user_test_attempts", "recommendations")
+
+stats_cache = AsyncTTLCache('stats_snapshot', STATS_CACHE_TTL)
+table_versions.on_change(STATS_TABLES, stats_cache.invalidate)
+
+async def compute_stats_snapshot():
+    """Run the snapshot query in a read-only REPEATABLE READ transaction"""
+    async with transaction_async(readonly=True, isolation='REPEATABLE READ') as tx:
+        row = await tx.execute_query_one(STATS_SNAPSHOT_QUERY, prepared=True)
+    snapshot = dict(row)
+    total = snapshot['total_recommendations']
+    snapshot['acceptance_rate'] = round(snapshot['accepted'] * 100 / total, 2) if total else None
+    return snapshot
+
+async def get_stats_snapshot():
+    """Cached stats snapshot; see STATS_CACHE_TTL"""
+    return await stats_cache.get('snapshot', compute_stats_snapshot)
@@ -0,0 +1,129 @@
+"""
+Gap-filled activity time series, bucketed in the database.
+
+One statement per request: generate_series() lays out every bucket of the
+range in the requested timezone and each metric is LEFT JOINed onto it, so
+empty buckets come back as zeros. Attempts and recommendations are summed
+from the hourly rollups (models/rollups.py), so the cost follows the number
+of hours in the range, not the number of rows; new users and feedback are
+counted from their own tables.
+"""
+
+from datetime import timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from models.database import execute_query_async
+
+TIMESERIES_BUCKETS = {
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+    "week": timedelta(weeks=1),
+    "month": timedelta(days=28)
+}
+
+# Longest series one request may ask for (a year of hourly buckets fits)
+MAX_TIMESERIES_BUCKETS = 10_000
+
+# metric -> (CTE body, output columns). In the CTE bodies $1 is the bucket unit,
+# $4 the timezone, and {filters} is where the optional test_type filter goes.
+TIMESERIES_METRICS = {
+    "attempts": ("""
+        SELECT
+            date_trunc($1, r.bucket AT TIME ZONE $4) as local_start,
+            SUM(r.attempts) as attempts,
+            SUM(r.score_sum) as score_sum,
+            SUM(r.question_sum) as question_sum
+        FROM attempt_rollup_hourly r
+        CROSS JOIN bounds
+        {test_join}
+        WHERE r.bucket >= bounds.range_start AND r.bucket < bounds.range_end {filters}
+        GROUP BY 1
+    """, [
+        "COALESCE(attempts.attempts, 0)::bigint as attempts",
+        "ROUND(attempts.score_sum * 100.0 / NULLIF(attempts.question_sum, 0), 2) as average_score"
+    ]),
+    "recommendations": ("""
+        SELECT date_trunc($1, r.bucket AT TIME ZONE $4) as local_start, SUM(r.recommendations) as recommendations
+        FROM recommendation_rollup_hourly r
+        CROSS JOIN bounds
+        WHERE r.bucket >= bounds.range_start AND r.bucket < bounds.range_end
+        GROUP BY 1
+    """, ["COALESCE(recommendations.recommendations, 0)::bigint as recommendations"]),
+    "new_users": ("""
+        SELECT date_trunc($1, u.created_at AT TIME ZONE $4) as local_start, COUNT(*) as new_users
+        FROM users u
+        CROSS JOIN bounds
+        WHERE u.created_at >= bounds.range_start AND u.created_at < bounds.range_end
+        GROUP BY 1
+    """, ["COALESCE(new_users.new_users, 0) as new_users"]),
+    "feedback": ("""
+        SELECT
+            date_trunc($1, f.created_at::timestamptz AT TIME ZONE $4) as local_start,
+            COUNT(*) as feedback,
+            AVG(f.rating) as average_rating
+        FROM recommendation_feedback f
+        CROSS JOIN bounds
+        WHERE f.created_at::timestamptz >= bounds.range_start AND f.created_at::timestamptz < bounds.range_end
+        GROUP BY 1
+    """, [
+        "COALESCE(feedback.feedback, 0) as feedback",
+        "ROUND(feedback.average_rating, 2) as average_rating"
+    ])
+}
+
+def resolve_timezone(name):
+    """ZoneInfo for name; raises ValueError for unknown timezones"""
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"Unknown timezone: {name}")
+
+def whole_hour_offset(zone, start, end):
+    """
+    Whether zone is a whole number of hours from UTC at both ends of [start, end)
+    (naive wall-clock times). Hourly rollup buckets cannot be split across a
+    half-hour offset such as Asia/Kolkata's.
+    """
+    return all(zone.utcoffset(moment) % timedelta(hours=1) == timedelta(0) for moment in (start, end))
+
+def to_local(value, zone):
+    """Naive wall-clock time in zone; naive inputs are taken to already be in zone"""
+    return value.astimezone(zone).replace(tzinfo=None) if value.tzinfo else value
+
+def build_timeseries_query(metrics, test_type=None):
+    """One gap-filling statement for the given metrics ($5 is test_type when filtering)"""
+    ctes = ["""bounds AS (
+        SELECT
+            date_trunc($1, $2::timestamp) AT TIME ZONE $4 as range_start,
+            $3::timestamp AT TIME ZONE $4 as range_end
+    )""", """buckets AS (
+        SELECT local_start
+        FROM generate_series(date_trunc($1, $2::timestamp), $3::timestamp - INTERVAL '1 microsecond', ('1 ' || $1)::interval) as local_start
+    )"""]
+    columns = ["buckets.local_start"]
+    joins = []
+    for metric in metrics:
+        body, metric_columns = TIMESERIES_METRICS[metric]
+        if metric == "attempts" and test_type:
+            body = body.format(test_join="JOIN tests t ON t.test_id = r.test_id", filters="AND t.test_type = $5")
+        else:
+            body = body.format(test_join="", filters="")
+        ctes.append(f"{metric} AS ({body})")
+        columns.extend(metric_columns)
+        joins.append(f"LEFT JOIN {metric} ON {metric}.local_start = buckets.local_start")
+    return f"""
+        WITH {', '.join(ctes)}
+        SELECT {', '.join(columns)}
+        FROM buckets
+        {' '.join(joins)}
+        ORDER BY buckets.local_start
+    """
+
+async def get_timeseries(metrics, bucket, start, end, timezone, test_type=None):
+    """
+    Gap-filled rows (local_start plus one column per metric) for [start, end) in timezone.
+    start and end are naive wall-clock times in that timezone.
+    """
+    params = [bucket, start, end, timezone]
+    if test_type and "attempts" in metrics:
+        params.append(test_type)
+    return await execute_query_async(build_timeseries_query(metrics, test_type), params, prepared=True)
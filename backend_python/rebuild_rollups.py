@@ -0,0 +1,31 @@
+"""
+Install the analytics rollup tables and triggers, then recompute them from
+the source tables. Run after a backfill, a TRUNCATE, or any bulk change made
+with triggers disabled. Writes to the source tables wait while it runs.
+
+Usage: python rebuild_rollups.py
+"""
+
+import time
+from models.database import close_all_connections, db_workload
+from models.rollups import install_and_rebuild_rollups
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("ROLLUP REBUILD")
+    print("=" * 60)
+
+    db_workload.set('maintenance')
+    try:
+        print("\n🔄 Installing rollup tables and triggers, recomputing from source tables...")
+        started = time.perf_counter()
+        counts = install_and_rebuild_rollups()
+        elapsed = time.perf_counter() - started
+
+        for table, count in counts.items():
+            print(f"✅ {table}: {count:,} rows")
+        print(f"\n📝 Rebuilt in {elapsed:.2f}s")
+    except Exception as error:
+        print(f"\n❌ Error: {error}")
+    finally:
+        close_all_connections()
@@ -0,0 +1,105 @@
+from fastapi import APIRouter, HTTPException, Query, Depends
+from models.database import (
+    get_pool_stats, get_replica_stats, get_statement_cache_stats,
+    get_query_stats, get_slow_queries, reset_query_stats, use_workload
+)
+from models.stats import stats_cache
+from models.result_cache import result_cache, database_versions, version_sync
+from models.reports import report_scheduler
+
+router = APIRouter(prefix="/api/admin", tags=["admin"], dependencies=[Depends(use_workload("oltp"))])
+
+# Get per-workload connection pool occupancy and acquire-wait metrics
+@router.get("/db/pool")
+async def get_db_pool_stats():
+    try:
+        return {
+            "success": True,
+            "workloads": get_pool_stats(),
+            "replica": get_replica_stats()
+        }
+    except Exception as error:
+        raise HTTPException(status_code=500, detail=f"Failed to fetch pool stats: {str(error)}")
+
+# Get prepared statement cache hit/miss counters
+@router.get("/db/statements")
+async def get_db_statement_stats():
+    try:
+        return {
+            "success": True,
+            "statements": get_statement_cache_stats()
+        }
+    except Exception as error:
+        raise HTTPException(status_code=500, detail=f"Failed to fetch statement cache stats: {str(error)}")
+
+QUERY_SORT_FIELDS = ["total_ms", "count", "mean_ms", "p95_ms", "p99_ms", "max_ms", "rows", "slow_count"]
+
+# Get per-query timings grouped by normalized statement fingerprint
+@router.get("/db/queries")
+async def get_db_query_stats(
+    sort: str = Query("total_ms"),
+    limit: int = Query(50, ge=1, le=500)
+):
+    try:
+        if sort not in QUERY_SORT_FIELDS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid sort field. Use one of: {', '.join(QUERY_SORT_FIELDS)}"
+            )
+        return {
+            "success": True,
+            **get_query_stats(sort, limit)
+        }
+    except HTTPException:
+        raise
+    except Exception as error:
+        raise HTTPException(status_code=500, detail=f"Failed to fetch query stats: {str(error)}")
+
+# Get the most recent slow queries
+@router.get("/db/slow-queries")
+async def get_db_slow_queries(limit: int = Query(50, ge=1, le=500)):
+    try:
+        slow_queries = get_slow_queries(limit)
+        return {
+            "success": True,
+            "slow_queries": slow_queries,
+            "count": len(slow_queries)
+        }
+    except Exception as error:
+        raise HTTPException(status_code=500, detail=f"Failed to fetch slow queries: {str(error)}")
+
+# Reset query timings and the slow-query history
+@router.delete("/db/queries")
+async def reset_db_query_stats():
+    try:
+        reset_query_stats()
+        return {"success": True, "message": "Query stats reset"}
+    except Exception as error:
+        raise HTTPException(status_code=500, detail=f"Failed to reset query stats: {str(error)}")
+
+# Get hit/miss counters of the in-process caches
+@router.get("/cache")
+async def get_cache_stats():
+    try:
+        return {
+            "success": True,
+            "results": result_cache.stats(),
+            "table_versions": {"database": database_versions, "last_sync_error": version_sync["last_error"]},
+            "caches": [stats_cache.stats()],
+            "reports": report_scheduler.stats()
+        }
+    except Exception as error:
+        raise HTTPException(status_code=500, detail=f"Failed to fetch cache stats: {str(error)}")
+
+# Drop every cached result without waiting for the next version sync.
+# Background reports keep serving their current result until their refresh completes.
+@router.delete("/cache")
+async def clear_caches():
+    try:
+        dropped = len(result_cache.entries)
+        result_cache.clear()
+        stats_cache.invalidate()
+        report_scheduler.expire()
+        return {"success": True, "results_dropped": dropped}
+    except Exception as error:
+        raise HTTPException(status_code=500, detail=f"Failed to clear caches: {str(error)}")
@@ -1,52 +1,66 @@
-from fastapi import APIRouter, HTTPException
-from models.database import execute_query, execute_query_one
-from datetime import datetime, timedelta
+from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi.responses import StreamingResponse, FileResponse
+from models.database import (
+    execute_query_one_async, execute_query_rows_async, iter_query_async,
+    transaction_async, run_in_db_executor, use_read_replica, use_workload
+)
+from utils.streaming import stream_json_object, stream_ndjson, stream_csv, gzip_stream
+from utils.pagination import encode_cursor, decode_cursor
+from models.stats import STATS_TABLES, get_stats_snapshot
+from models.result_cache import cached_result
+from models.reports import scheduled_report
+from models.exports import EXPORT_DATASETS, EXPORT_FORMATS
+from models.snapshots import (
+    SNAPSHOT_DIR, SNAPSHOT_DATASETS, SnapshotInProgressError, export_snapshots, load_manifest
+)
+from models.timeseries import (
+    TIMESERIES_BUCKETS, TIMESERIES_METRICS, MAX_TIMESERIES_BUCKETS, get_timeseries, resolve_timezone, to_local,
+    whole_hour_offset
+)
+from models.sketches import QUANTILES, get_activity_stats
+from models.distributions import DEFAULT_BINS, MAX_BINS, get_score_distribution, get_test_types
+from models.funnel import FUNNEL_DIMENSIONS, funnel_stages, get_funnel
+from models.cube import CUBE_DIMENSIONS, cube_measures, get_cube
+from models.cohorts import COHORT_PERIODS, DEFAULT_OFFSETS, MAX_OFFSETS, default_range, get_cohorts
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+import math
+import os
+from typing import Optional
 
-router = APIRouter(prefix="/api/analytics", tags=["analytics"])
+PERCENTILE_KEYS = [f"p{round(fraction * 100)}" for fraction in QUANTILES]
+
+# Analytics reads may be served by the read replica. The endpoints that write (the funnel and
+# cube refreshes, the snapshot export) run read-write transactions, which always use the primary
+router = APIRouter(
+    prefix="/api/analytics", tags=["analytics"],
+    dependencies=[Depends(use_read_replica), Depends(use_workload("analytics"))]
+)
 
 # Get system analytics overview
 @router.get("/system/overview")
+@cached_result(*STATS_TABLES)
 async def get_system_overview():
     try:
-        # Total counts
-        user_count = execute_query_one('SELECT COUNT(*) as count FROM users')
-        course_count = execute_query_one('SELECT COUNT(*) as count FROM courses')
-        test_count = execute_query_one('SELECT COUNT(*) as count FROM tests')
-        recommendation_count = execute_query_one('SELECT COUNT(*) as count FROM recommendations')
-        
-        # Recent activity (last 30 days)
-        recent_users = execute_query_one("""
-            SELECT COUNT(*) as count FROM users 
-            WHERE created_at >= NOW() - INTERVAL '30 days'
-        """)
-        recent_recommendations = execute_query_one("""
-            SELECT COUNT(*) as count FROM recommendations 
-            WHERE recommended_at >= NOW() - INTERVAL '30 days'
-        """)
-        
-        # System performance metrics
-        recommendation_accuracy = execute_query_one("""
-            SELECT 
-                COUNT(*) as total,
-                COUNT(CASE WHEN status = 'accepted' THEN 1 END) as accepted,
-                COUNT(CASE WHEN status = 'rejected' THEN 1 END) as rejected,
-                COUNT(CASE WHEN status = 'pending' THEN 1 END) as pending,
-                ROUND((COUNT(CASE WHEN status = 'accepted' THEN 1 END)::numeric / NULLIF(COUNT(*), 0)) * 100, 2) as acceptance_rate
-            FROM recommendations
-        """)
+        stats = await get_stats_snapshot()
         
         return {
             "system_overview": {
-                "total_users": int(user_count['count']),
-                "total_courses": int(course_count['count']),
-                "total_tests": int(test_count['count']),
-                "total_recommendations": int(recommendation_count['count'])
+                "total_users": stats['total_users'],
+                "total_courses": stats['total_courses'],
+                "total_tests": stats['total_tests'],
+                "total_recommendations": stats['total_recommendations']
             },
             "recent_activity": {
-                "new_users_30d": int(recent_users['count']),
-                "new_recommendations_30d": int(recent_recommendations['count'])
+                "new_users_30d": stats['new_users_30d'],
+                "new_recommendations_30d": stats['new_recommendations_30d']
             },
-            "system_performance": dict(recommendation_accuracy)
+            "system_performance": {
+                "total": stats['total_recommendations'],
+                "accepted": stats['accepted'],
+                "rejected": stats['rejected'],
+                "pending": stats['pending'],
+                "acceptance_rate": stats['acceptance_rate']
+            }
         }
     except Exception as error:
         raise HTTPException(status_code=500, detail=f"Failed to fetch system analytics: {str(error)}")
@@ -55,6 +69,7 @@ async def get_system_overview():
 # ========== ADMIN ANALYTICS API ENDPOINTS ==========
 
 @router.get("/admin/overview")
+@cached_result(*STATS_TABLES)
 async def get_admin_analytics_overview():
     """
     Get system-wide analytics for admin dashboard
@@ -64,44 +79,26 @@ async def get_admin_analytics_overview():
     - System health metrics
     """
     try:
-        total_users = execute_query_one('SELECT COUNT(*) as count FROM users')
-        # Only count adaptive test attempts for total assessments
-        total_assessments = execute_query_one("""
-            SELECT COUNT(*) as count FROM user_test_attempts uta
-            JOIN tests t ON uta.test_id = t.test_id
-            WHERE t.test_type = 'adaptive'
-        """)
-        total_recommendations = execute_query_one('SELECT COUNT(*) as count FROM recommendations')
-        
-        # Get assessment breakdown by type
-        standard_assessments = execute_query_one("""
-            SELECT COUNT(*) as count FROM user_test_attempts uta
-            JOIN tests t ON uta.test_id = t.test_id
-            WHERE t.test_type = 'assessment'
-        """)
+        stats = await get_stats_snapshot()
         
-        adaptive_assessments = execute_query_one("""
-            SELECT COUNT(*) as count FROM user_test_attempts uta
-            JOIN tests t ON uta.test_id = t.test_id
-            WHERE t.test_type = 'adaptive'
-        """)
+        # Only count adaptive test attempts for total assessments
+        total_assess = stats['adaptive_attempts']
+        total_recs = stats['total_recommendations']
         
         # Average recommendations per assessment
-        total_assess = int(total_assessments['count'])
-        total_recs = int(total_recommendations['count'])
         avg_recommendations = total_recs / total_assess if total_assess > 0 else 0
         
         return {
             "success": True,
             "timestamp": str(datetime.now()),
             "overview": {
-                "total_users": int(total_users['count']),
+                "total_users": stats['total_users'],
                 "total_assessments_taken": total_assess,
                 "total_recommendations_generated": total_recs,
                 "average_recommendations_per_assessment": round(avg_recommendations, 2),
                 "assessment_breakdown": {
-                    "standard_assessment": int(standard_assessments['count']),
-                    "smart_assessment_adaptive": int(adaptive_assessments['count'])
+                    "standard_assessment": stats['standard_attempts'],
+                    "smart_assessment_adaptive": stats['adaptive_attempts']
                 }
             }
         }
@@ -110,54 +107,58 @@ async def get_admin_analytics_overview():
 
 
 @router.get("/admin/assessments")
+@cached_result("tests", "user_test_attempts", max_age=300)
 async def get_assessments_analytics():
     """
     Get detailed assessment statistics
     - Assessments by type
     - Assessments by date
     - Assessment completion rates
+    
+    Read from attempt_rollup_hourly, so the cost follows the number of tests and hours, not attempts.
     """
     try:
-        # Total by type
-        assessment_types = execute_query("""
+        # Total by type (tuple rows: these are reshaped below, no need for per-row dicts)
+        _, assessment_types = await execute_query_rows_async("""
             SELECT 
                 t.test_type,
                 t.test_name,
-                COUNT(uta.attempt_id) as count
+                COALESCE(SUM(r.attempts), 0)::bigint as count
             FROM tests t
-            LEFT JOIN user_test_attempts uta ON t.test_id = uta.test_id
+            LEFT JOIN attempt_rollup_hourly r ON t.test_id = r.test_id
             GROUP BY t.test_id, t.test_type, t.test_name
             ORDER BY count DESC
-        """)
+        """, prepared=True)
         
-        # Assessments by date (last 30 days)
-        assessments_by_date = execute_query("""
+        # Assessments by date (last 30 days, whole hours)
+        _, assessments_by_date = await execute_query_rows_async("""
             SELECT 
-                DATE(attempt_date) as date,
-                COUNT(attempt_id) as count
-            FROM user_test_attempts
-            WHERE attempt_date >= NOW() - INTERVAL '30 days'
-            GROUP BY DATE(attempt_date)
+                DATE(bucket) as date,
+                SUM(attempts)::bigint as count
+            FROM attempt_rollup_hourly
+            WHERE bucket >= date_trunc('hour', NOW() - INTERVAL '30 days')
+            GROUP BY DATE(bucket)
+            HAVING SUM(attempts) > 0
             ORDER BY date ASC
-        """)
+        """, prepared=True)
         
         return {
             "success": True,
             "assessments": {
                 "by_type": [
                     {
-                        "type": t['test_type'],
-                        "name": t['test_name'],
-                        "total": t['count']
+                        "type": test_type,
+                        "name": test_name,
+                        "total": count
                     }
-                    for t in assessment_types
+                    for test_type, test_name, count in assessment_types
                 ],
                 "by_date_last_30_days": [
                     {
-                        "date": str(a['date']),
-                        "count": a['count']
+                        "date": str(date),
+                        "count": count
                     }
-                    for a in assessments_by_date
+                    for date, count in assessments_by_date
                 ]
             }
         }
@@ -165,83 +166,431 @@ async def get_assessments_analytics():
         raise HTTPException(status_code=500, detail=f"Failed to fetch assessments analytics: {str(error)}")
 
 
+# Get gap-filled activity time series
+@router.get("/admin/timeseries")
+@scheduled_report("timeseries")
+@cached_result("users", "tests", "user_test_attempts", "recommendations", "recommendation_feedback", max_age=300)
+async def get_activity_timeseries(
+    metrics: str = Query("attempts,new_users,recommendations,feedback"),
+    bucket: str = Query("day"),
+    start: Optional[datetime] = Query(None),
+    end: Optional[datetime] = Query(None),
+    timezone: str = Query("UTC"),
+    test_type: Optional[str] = Query(None)
+):
+    """
+    Activity over time, one row per bucket with zeros for empty buckets
+    - metrics: comma-separated subset of attempts, new_users, recommendations, feedback
+    - bucket: hour, day, week or month, aligned in the requested timezone
+    - start / end: range [start, end); dates or times without an offset are read in timezone.
+      Defaults to the 30 days up to now
+    - test_type: only count attempts on tests of this type
+
+    Attempts and recommendations come from the hourly rollups, so they have hour resolution
+    and a one-year range costs about as much as a one-week range.
+    """
+    try:
+        requested = list(dict.fromkeys(metric.strip() for metric in metrics.split(",") if metric.strip()))
+        unknown = [metric for metric in requested if metric not in TIMESERIES_METRICS]
+        if not requested or unknown:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid metrics. Use any of: {', '.join(TIMESERIES_METRICS)}"
+            )
+        if bucket not in TIMESERIES_BUCKETS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid bucket. Use one of: {', '.join(TIMESERIES_BUCKETS)}"
+            )
+        try:
+            zone = resolve_timezone(timezone)
+        except ValueError as error:
+            raise HTTPException(status_code=400, detail=str(error))
+
+        range_end = to_local(end, zone) if end else datetime.now(zone).replace(tzinfo=None)
+        range_start = to_local(start, zone) if start else range_end - timedelta(days=30)
+        if range_start >= range_end:
+            raise HTTPException(status_code=400, detail="start must be before end")
+        if not whole_hour_offset(zone, range_start, range_end):
+            raise HTTPException(
+                status_code=400,
+                detail=f"Timezone {timezone} is not a whole number of hours from UTC; hourly data cannot be bucketed in it"
+            )
+        if (range_end - range_start) / TIMESERIES_BUCKETS[bucket] > MAX_TIMESERIES_BUCKETS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Range too long: at most {MAX_TIMESERIES_BUCKETS} {bucket} buckets per request"
+            )
+
+        rows = await get_timeseries(requested, bucket, range_start, range_end, timezone, test_type)
+
+        series = []
+        totals = {metric: 0 for metric in requested}
+        for row in rows:
+            point = {"bucket": row['local_start'].isoformat()}
+            for metric in requested:
+                point[metric] = int(row[metric])
+                totals[metric] += point[metric]
+            if "attempts" in requested:
+                point["average_score"] = float(row['average_score']) if row['average_score'] is not None else None
+            if "feedback" in requested:
+                point["average_rating"] = float(row['average_rating']) if row['average_rating'] is not None else None
+            series.append(point)
+
+        return {
+            "success": True,
+            "bucket": bucket,
+            "timezone": timezone,
+            "start": range_start.isoformat(),
+            "end": range_end.isoformat(),
+            "test_type": test_type,
+            "totals": totals,
+            "series": series
+        }
+    except HTTPException:
+        raise
+    except Exception as error:
+        raise HTTPException(status_code=500, detail=f"Failed to fetch activity time series: {str(error)}")
+
+
+# Histogram, mean / stdev and percentile bands of score percentage and time taken
+@router.get("/admin/score-distribution")
+@scheduled_report("score_distribution")
+@cached_result("tests", "user_test_attempts")
+async def get_score_distribution_stats(
+    test_id: Optional[int] = Query(None),
+    test_type: Optional[str] = Query(None),
+    bins: int = Query(DEFAULT_BINS, ge=1, le=MAX_BINS)
+):
+    """
+    Distribution of score percentage (score / total_questions) and time_taken over the
+    attempts of one test (test_id), of every test of one type (test_type), or of all attempts.
+    Cached until tests or user_test_attempts change.
+    """
+    try:
+        if test_id is not None:
+            test = await execute_query_one_async(
+                "SELECT test_id, test_name, test_type FROM tests WHERE test_id = $1", [test_id], prepared=True
+            )
+            if not test:
+                raise HTTPException(status_code=404, detail="Test not found")
+        if test_type is not None:
+            test_types = await get_test_types()
+            if test_type not in test_types:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Invalid test_type. Use one of: {', '.join(test_types)}"
+                )
+
+        distribution = await get_score_distribution(test_id, test_type, bins)
+
+        return {
+            "success": True,
+            "test_id": test_id,
+            "test_type": test_type,
+            "bins": bins,
+            **distribution
+        }
+    except HTTPException:
+        raise
+    except Exception as error:
+        raise HTTPException(status_code=500, detail=f"Failed to fetch score distribution: {str(error)}")
+
+# Signup cohorts with retention matrix, repeat-attempt rates and time between attempts
+@router.get("/admin/cohorts")
+@scheduled_report("cohorts", interval=600)
+@cached_result("users", "user_test_attempts", max_age=300)
+async def get_cohort_retention(
+    period: str = Query("week"),
+    start: Optional[date] = Query(None),
+    end: Optional[date] = Query(None),
+    offsets: int = Query(DEFAULT_OFFSETS, ge=1, le=MAX_OFFSETS)
+):
+    """
+    Users grouped by the UTC week or month they signed up in
+    - retention[k]: cohort users with an attempt k periods after their signup period
+      (null for periods that have not started yet)
+    - repeat_rate: share of cohort users with an attempt who made at least two
+    - start / end: signup days, both inclusive. Defaults to the last `offsets` periods
+    """
+    try:
+        if period not in COHORT_PERIODS:
+            raise HTTPException(status_code=400, detail=f"Invalid period. Use one of: {', '.join(COHORT_PERIODS)}")
+        default_start, default_end = default_range(period, offsets)
+        range_start = start or default_start
+        range_end = end or default_end
+        if range_start > range_end:
+            raise HTTPException(status_code=400, detail="start must not be after end")
+
+        cohorts = await get_cohorts(period, range_start, range_end, offsets)
+
+        users = sum(cohort["users"] for cohort in cohorts)
+        active_users = sum(cohort["active_users"] for cohort in cohorts)
+        repeat_users = sum(cohort["repeat_users"] for cohort in cohorts)
+        return {
+            "success": True,
+            "period": period,
+            "start": range_start.isoformat(),
+            "end": range_end.isoformat(),
+            "offsets": offsets,
+            "totals": {
+                "users": users,
+                "active_users": active_users,
+                "repeat_users": repeat_users,
+                "activation_rate": round(active_users / users, 4) if users else None,
+                "repeat_rate": round(repeat_users / active_users, 4) if active_users else None
+            },
+            "cohorts": cohorts
+        }
+    except HTTPException:
+        raise
+    except Exception as error:
+        raise HTTPException(status_code=500, detail=f"Failed to fetch cohort retention: {str(error)}")
+
+# Recommended -> rated -> accepted funnel per course, strand and month
+@router.get("/admin/recommendation-funnel")
+@cached_result("users", "courses", "recommendations", "recommendation_feedback")
+async def get_recommendation_funnel(
+    group_by: str = Query("course,strand"),
+    course_id: Optional[int] = Query(None),
+    strand: Optional[str] = Query(None),
+    start_month: Optional[str] = Query(None),
+    end_month: Optional[str] = Query(None)
+):
+    """
+    Funnel counts and rates read from recommendation_funnel (one row per month, course and strand)
+    - group_by: comma-separated subset of course, strand, month (empty: totals only)
+    - strand is the recommended student's strand; start_month / end_month are YYYY-MM, inclusive
+    Months changed since their last refresh are rebuilt first.
+    """
+    try:
+        dimensions = list(dict.fromkeys(part.strip() for part in group_by.split(",") if part.strip()))
+        unknown = [dimension for dimension in dimensions if dimension not in FUNNEL_DIMENSIONS]
+        if unknown:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid group_by. Use any of: {', '.join(FUNNEL_DIMENSIONS)}"
+            )
+        try:
+            first_month = datetime.strptime(start_month, "%Y-%m").date() if start_month else None
+            last_month = datetime.strptime(end_month, "%Y-%m").date() if end_month else None
+        except ValueError:
+            raise HTTPException(status_code=400, detail="start_month and end_month must be YYYY-MM")
+        if first_month and last_month and first_month > last_month:
+            raise HTTPException(status_code=400, detail="start_month must not be after end_month")
+
+        refreshed, rows, totals = await get_funnel(dimensions, course_id, strand, first_month, last_month)
+
+        return {
+            "success": True,
+            "group_by": dimensions,
+            "months_refreshed": refreshed,
+            "totals": funnel_stages(totals),
+            "funnel": [
+                {
+                    **{key: row[key] for key in row if key in ("course_id", "course_name", "strand", "month")},
+                    **funnel_stages(row)
+                }
+                for row in rows
+            ]
+        }
+    except HTTPException:
+        raise
+    except Exception as error:
+        raise HTTPException(status_code=500, detail=f"Failed to fetch recommendation funnel: {str(error)}")
+
+# Attempts, recommendations and ratings sliced by any of strand, course, test_type and month
+@router.get("/admin/cube")
+@cached_result("users", "courses", "tests", "user_test_attempts", "recommendations", "recommendation_feedback")
+async def get_activity_cube(
+    group_by: str = Query("strand"),
+    strand: Optional[str] = Query(None),
+    course_id: Optional[int] = Query(None),
+    test_type: Optional[str] = Query(None),
+    start_month: Optional[str] = Query(None),
+    end_month: Optional[str] = Query(None)
+):
+    """
+    Slice / dice of the activity cube (models/cube.py)
+    - group_by: comma-separated subset of strand, course, test_type, month (empty: totals only)
+    - strand / course_id / test_type: keep only that member; course_id 0 holds attempts and
+      feedback without a course, test_type 'none' recommendations without a test
+    - start_month / end_month: YYYY-MM, inclusive
+    Months changed since their last refresh are rebuilt first.
+    """
+    try:
+        dimensions = list(dict.fromkeys(part.strip() for part in group_by.split(",") if part.strip()))
+        unknown = [dimension for dimension in dimensions if dimension not in CUBE_DIMENSIONS]
+        if unknown:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid group_by. Use any of: {', '.join(CUBE_DIMENSIONS)}"
+            )
+        try:
+            first_month = datetime.strptime(start_month, "%Y-%m").date() if start_month else None
+            last_month = datetime.strptime(end_month, "%Y-%m").date() if end_month else None
+        except ValueError:
+            raise HTTPException(status_code=400, detail="start_month and end_month must be YYYY-MM")
+        if first_month and last_month and first_month > last_month:
+            raise HTTPException(status_code=400, detail="start_month must not be after end_month")
+
+        refreshed, rows, totals = await get_cube(dimensions, strand, course_id, test_type, first_month, last_month)
+
+        return {
+            "success": True,
+            "group_by": dimensions,
+            "months_refreshed": refreshed,
+            "totals": cube_measures(totals),
+            "cells": [
+                {
+                    **{key: row[key] for key in row if key in ("strand", "course_id", "course_name", "test_type", "month")},
+                    **cube_measures(row)
+                }
+                for row in rows
+            ]
+        }
+    except HTTPException:
+        raise
+    except Exception as error:
+        raise HTTPException(status_code=500, detail=f"Failed to fetch activity cube: {str(error)}")
+
+# Distinct active users and score / time-taken percentiles over a date range
+@router.get("/admin/activity-stats")
+@scheduled_report("activity_stats")
+@cached_result("user_test_attempts", max_age=300)
+async def get_activity_summary(
+    start: Optional[date] = Query(None),
+    end: Optional[date] = Query(None),
+    approx: bool = Query(False)
+):
+    """
+    Attempts, distinct active users and p50/p90/p99 of score percentage and time taken
+    for the UTC days [start, end] (both inclusive; defaults to the last 30 days).
+    approx=true answers from merged daily HyperLogLog / KLL sketches instead of scanning
+    every attempt, and reports the error bounds of the estimates.
+    """
+    try:
+        range_end = end or datetime.now(dt_timezone.utc).date()
+        range_start = start or range_end - timedelta(days=29)
+        if range_start > range_end:
+            raise HTTPException(status_code=400, detail="start must not be after end")
+
+        stats = await get_activity_stats(range_start, range_end, approx)
+
+        result = {
+            "success": True,
+            "approx": approx,
+            "start": range_start.isoformat(),
+            "end": range_end.isoformat(),
+            "attempts": stats["attempts"],
+            "active_users": stats["active_users"],
+            "score_percentiles": dict(zip(PERCENTILE_KEYS, stats["score_percentiles"])),
+            "time_taken_percentiles": dict(zip(PERCENTILE_KEYS, stats["time_taken_percentiles"]))
+        }
+        if approx:
+            result["error_bounds"] = stats["error_bounds"]
+            result["unsketched_days"] = stats["unsketched_days"]
+        return result
+    except HTTPException:
+        raise
+    except Exception as error:
+        raise HTTPException(status_code=500, detail=f"Failed to fetch activity stats: {str(error)}")
+
+
 @router.get("/admin/users/{user_id}/assessments")
-async def get_user_assessment_history_admin(user_id: int):
+@cached_result("users", "courses", "tests", "user_test_attempts", "recommendations")
+async def get_user_assessment_history_admin(
+    user_id: int,
+    page: int = Query(1, ge=1),
+    limit: int = Query(20, ge=1, le=100)
+):
     """
-    Get COMPLETE assessment history for a specific user (admin view)
+    Get COMPLETE assessment history for a specific user (admin view), one page of attempts at a time
     - How many assessments they took
     - When they took them
-    - Recommendations from each assessment
-    - Questions and answers from each assessment
+    - Recommendations from each assessment (linked by attempt_id)
+    
+    Always three queries (user, page of attempts, their recommendations) however long the history is.
     """
     try:
-        user = execute_query_one("""
-            SELECT user_id, first_name, last_name, email 
-            FROM users 
-            WHERE user_id = %s
-        """, [user_id])
+        offset = (page - 1) * limit
         
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
+        async with transaction_async(readonly=True) as tx:
+            user = await tx.execute_query_one("""
+                SELECT 
+                    u.user_id, u.first_name, u.last_name, u.email,
+                    COALESCE(a.attempts, 0) as total_attempts
+                FROM users u
+                LEFT JOIN user_activity_rollup a ON a.user_id = u.user_id
+                WHERE u.user_id = $1
+            """, [user_id], prepared=True)
+            
+            if not user:
+                raise HTTPException(status_code=404, detail="User not found")
+            
+            attempts = await tx.execute_query("""
+                SELECT 
+                    uta.attempt_id, uta.attempt_date, uta.score, uta.total_questions, uta.time_taken,
+                    t.test_type, t.test_name
+                FROM user_test_attempts uta
+                LEFT JOIN tests t ON t.test_id = uta.test_id
+                WHERE uta.user_id = $1
+                ORDER BY uta.attempt_date DESC, uta.attempt_id DESC
+                LIMIT $2 OFFSET $3
+            """, [user_id, limit, offset], prepared=True)
+            
+            recommendations = await tx.execute_query("""
+                SELECT 
+                    r.attempt_id, r.reasoning, r.recommended_at,
+                    c.course_id, c.course_name, c.description, c.minimum_gwa, c.required_strand, c.trait_tag
+                FROM recommendations r
+                JOIN courses c ON c.course_id = r.course_id
+                WHERE r.attempt_id = ANY($1)
+                ORDER BY r.attempt_id, r.recommended_at DESC
+            """, [[attempt['attempt_id'] for attempt in attempts]], prepared=True)
         
-        # Get all test attempts
-        attempts = execute_query("""
-            SELECT * FROM user_test_attempts 
-            WHERE user_id = %s
-            ORDER BY attempt_date DESC
-        """, [user_id])
+        courses_by_attempt = {}
+        for rec in recommendations:
+            courses_by_attempt.setdefault(rec['attempt_id'], []).append({
+                "course_id": rec['course_id'],
+                "course_name": rec['course_name'],
+                "description": rec['description'] or '',
+                "minimum_gwa": float(rec['minimum_gwa']) if rec['minimum_gwa'] else None,
+                "required_strand": rec['required_strand'] or '',
+                "trait_tag": rec['trait_tag'] or '',
+                "reasoning": rec['reasoning'] or '',
+                "recommended_at": str(rec['recommended_at']) if rec['recommended_at'] else None
+            })
         
         assessment_history = []
-        
         for attempt in attempts:
-            # Get test details
-            test = execute_query_one("""
-                SELECT * FROM tests WHERE test_id = %s
-            """, [attempt['test_id']])
-            
-            # Get recommendations for this attempt (if stored with attempt_id reference)
-            recommendations = execute_query("""
-                SELECT * FROM recommendations WHERE user_id = %s
-                ORDER BY recommended_at DESC LIMIT 10
-            """, [user_id])
-            
-            recommended_courses = []
-            for rec in recommendations:
-                course = execute_query_one("""
-                    SELECT * FROM courses WHERE course_id = %s
-                """, [rec['course_id']])
-                
-                if course:
-                    recommended_courses.append({
-                        "course_id": course['course_id'],
-                        "course_name": course['course_name'],
-                        "description": course.get('description', ''),
-                        "minimum_gwa": float(course['minimum_gwa']) if course.get('minimum_gwa') else None,
-                        "required_strand": course.get('required_strand', ''),
-                        "trait_tag": course.get('trait_tag', ''),
-                        "reasoning": rec.get('reasoning', ''),
-                        "recommended_at": str(rec['recommended_at']) if rec.get('recommended_at') else None
-                    })
-            
+            recommended_courses = courses_by_attempt.get(attempt['attempt_id'], [])
             assessment_history.append({
                 "attempt_id": attempt['attempt_id'],
-                "assessment_type": test['test_type'] if test else "unknown",
-                "assessment_name": test['test_name'] if test else "Unknown Assessment",
+                "assessment_type": attempt['test_type'] or "unknown",
+                "assessment_name": attempt['test_name'] or "Unknown Assessment",
                 "taken_at": str(attempt['attempt_date']),
-                "score": attempt.get('score', 0),
-                "total_questions": attempt.get('total_questions', 0),
-                "time_taken": attempt.get('time_taken', 0),
+                "score": attempt['score'] or 0,
+                "total_questions": attempt['total_questions'] or 0,
+                "time_taken": attempt['time_taken'] or 0,
                 "total_recommendations": len(recommended_courses),
                 "recommended_courses": recommended_courses
             })
         
+        total = int(user['total_attempts'])
         return {
             "success": True,
             "user_id": user_id,
             "user_name": f"{user['first_name']} {user['last_name']}".strip(),
             "user_email": user['email'],
-            "total_assessments_taken": len(attempts),
-            "assessment_history": assessment_history
+            "total_assessments_taken": total,
+            "assessment_history": assessment_history,
+            "pagination": {
+                "page": page,
+                "limit": limit,
+                "total": total,
+                "pages": math.ceil(total / limit)
+            }
         }
     except HTTPException:
         raise
@@ -249,88 +598,172 @@ async def get_user_assessment_history_admin(user_id: int):
         raise HTTPException(status_code=500, detail=f"Failed to fetch user assessment history: {str(error)}")
 
 
+# Sortable columns of the all-users summary: API name -> (SQL sort expression, Postgres type)
+USER_SUMMARY_SORTS = {
+    "user_id": ("u.user_id", "integer"),
+    "fullname": ("CONCAT(u.first_name, ' ', u.last_name)", "text"),
+    "email": ("COALESCE(u.email, '')", "text"),
+    "assessments_taken": ("COALESCE(a.attempts, 0)", "bigint"),
+    "last_assessment_date": ("COALESCE(a.last_attempt_at, '-infinity'::timestamptz)", "timestamptz"),
+    "total_recommendations_received": ("COALESCE(a.recommendations, 0)", "bigint")
+}
+
 @router.get("/admin/all-users-summary")
-async def get_all_users_assessment_summary():
+async def get_all_users_assessment_summary(
+    sort: str = Query("assessments_taken"),
+    order: str = Query("desc"),
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    cursor: Optional[str] = Query(None),
+    format: str = Query("json")
+):
     """
     Get summary of ALL users with their assessment counts
     - How many assessments each user took
     - When they last took an assessment
     - Total recommendations received by each user
+    
+    One join against user_activity_rollup, streamed from a server-side cursor. Sort on any column;
+    with limit, pages are keyset-paginated: pass the returned next_cursor back as cursor.
+    format=ndjson streams one user per line (plus a final {"next_cursor": ...} line when more pages remain).
     """
     try:
-        users_data = execute_query("""
-            SELECT 
-                u.user_id,
-                u.first_name,
-                u.last_name,
-                u.email,
-                COUNT(uta.attempt_id) as assessment_count,
-                MAX(uta.attempt_date) as last_assessment
-            FROM users u
-            LEFT JOIN user_test_attempts uta ON u.user_id = uta.user_id
-            GROUP BY u.user_id, u.first_name, u.last_name, u.email
-            ORDER BY COUNT(uta.attempt_id) DESC
-        """)
+        if sort not in USER_SUMMARY_SORTS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid sort field. Use one of: {', '.join(USER_SUMMARY_SORTS)}"
+            )
+        if order not in ("asc", "desc"):
+            raise HTTPException(status_code=400, detail="Invalid order. Use asc or desc")
+        if format not in ("json", "ndjson"):
+            raise HTTPException(status_code=400, detail="Invalid format. Use json or ndjson")
         
-        users_summary = []
-        for user in users_data:
-            # Get total recommendations for this user
-            total_recs = execute_query_one("""
-                SELECT COUNT(*) as count FROM recommendations WHERE user_id = %s
-            """, [user['user_id']])
-            
-            users_summary.append({
+        sort_expression, sort_type = USER_SUMMARY_SORTS[sort]
+        query = f"""
+            SELECT summary.*, summary.sort_key::text as cursor_key
+            FROM (
+                SELECT 
+                    u.user_id,
+                    u.first_name,
+                    u.last_name,
+                    u.email,
+                    COALESCE(a.attempts, 0) as assessment_count,
+                    a.last_attempt_at as last_assessment,
+                    COALESCE(a.recommendations, 0) as recommendation_count,
+                    {sort_expression} as sort_key
+                FROM users u
+                LEFT JOIN user_activity_rollup a ON a.user_id = u.user_id
+            ) summary"""
+        params = []
+        
+        # Keyset: continue strictly after the previous page's last (sort key, user_id)
+        if cursor:
+            try:
+                cursor_key, cursor_user_id = decode_cursor(cursor)
+                cursor_user_id = int(cursor_user_id)
+            except (ValueError, TypeError):
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+            comparison = "<" if order == "desc" else ">"
+            query += f" WHERE (summary.sort_key, summary.user_id) {comparison} ($1::{sort_type}, $2)"
+            params.extend([cursor_key, cursor_user_id])
+        
+        query += f" ORDER BY summary.sort_key {order.upper()}, summary.user_id {order.upper()}"
+        if limit:
+            # One extra row tells whether another page exists
+            query += f" LIMIT ${len(params) + 1}"
+            params.append(limit + 1)
+        
+        page = {"next_cursor": None}
+        
+        async def page_rows(rows):
+            emitted = 0
+            last = None
+            try:
+                async for row in rows:
+                    if limit and emitted == limit:
+                        page["next_cursor"] = encode_cursor([last['cursor_key'], last['user_id']])
+                        break
+                    last = row
+                    emitted += 1
+                    yield row
+            finally:
+                await rows.aclose()
+        
+        users_data = page_rows(iter_query_async(query, params))
+        
+        def user_summary(user):
+            return {
                 "user_id": user['user_id'],
                 "fullname": f"{user['first_name']} {user['last_name']}".strip(),
                 "email": user['email'],
                 "assessments_taken": user['assessment_count'] or 0,
                 "last_assessment_date": str(user['last_assessment']) if user['last_assessment'] else None,
-                "total_recommendations_received": int(total_recs['count']) if total_recs else 0
-            })
+                "total_recommendations_received": int(user['recommendation_count'])
+            }
         
-        return {
-            "success": True,
-            "total_users": len(users_summary),
-            "users": users_summary
-        }
+        if format == "ndjson":
+            return StreamingResponse(
+                stream_ndjson(
+                    users_data, transform=user_summary,
+                    trailer=lambda: {"next_cursor": page["next_cursor"]} if page["next_cursor"] else None
+                ),
+                media_type="application/x-ndjson"
+            )
+        
+        return StreamingResponse(
+            stream_json_object(
+                users_data, "users",
+                fields={"success": True, "sort": sort, "order": order},
+                count_key="total_users",
+                transform=user_summary,
+                trailer=lambda: {"next_cursor": page["next_cursor"]}
+            ),
+            media_type="application/json"
+        )
+    except HTTPException:
+        raise
     except Exception as error:
         raise HTTPException(status_code=500, detail=f"Failed to fetch users summary: {str(error)}")
 
 
 @router.get("/admin/recommendations-summary")
+@cached_result("courses", "recommendations")
 async def get_recommendations_summary():
     """
     Get overall recommendations analytics
     - Most recommended courses
     - Least recommended courses
     - Total recommendations breakdown
+    
+    Read from course_recommendation_rollup (one row per course).
     """
     try:
-        most_recommended = execute_query("""
+        _, most_recommended = await execute_query_rows_async("""
             SELECT 
                 c.course_id,
                 c.course_name,
                 c.description,
-                COUNT(r.recommendation_id) as recommendation_count
+                COALESCE(r.recommendations, 0) as recommendation_count
             FROM courses c
-            LEFT JOIN recommendations r ON c.course_id = r.course_id
-            GROUP BY c.course_id, c.course_name, c.description
-            ORDER BY COUNT(r.recommendation_id) DESC
+            LEFT JOIN course_recommendation_rollup r ON c.course_id = r.course_id
+            ORDER BY recommendation_count DESC, c.course_id
             LIMIT 10
-        """)
+        """, prepared=True)
         
-        total_recs = execute_query_one('SELECT COUNT(*) as count FROM recommendations')
+        total_recs = await execute_query_one_async(
+            'SELECT COALESCE(SUM(recommendations), 0)::bigint as count FROM course_recommendation_rollup',
+            prepared=True
+        )
         
         return {
             "success": True,
             "most_recommended_courses": [
                 {
-                    "course_id": c['course_id'],
-                    "course_name": c['course_name'],
-                    "description": c.get('description', ''),
-                    "times_recommended": c['recommendation_count']
+                    "course_id": course_id,
+                    "course_name": course_name,
+                    "description": description,
+                    "times_recommended": recommendation_count
                 }
-                for c in most_recommended
+                for course_id, course_name, description, recommendation_count in most_recommended
             ],
             "total_recommendations_in_system": int(total_recs['count'])
         }
@@ -339,31 +772,17 @@ async def get_recommendations_summary():
 
 
 @router.get("/admin/export")
+@cached_result(*STATS_TABLES)
 async def export_analytics_data():
     """
     Export all analytics data for the admin dashboard
     Combines all analytics into one comprehensive endpoint
     """
     try:
-        # Overview stats
-        total_users = execute_query_one('SELECT COUNT(*) as count FROM users')
-        total_assessments = execute_query_one('SELECT COUNT(*) as count FROM user_test_attempts')
-        total_recommendations = execute_query_one('SELECT COUNT(*) as count FROM recommendations')
+        stats = await get_stats_snapshot()
         
-        # User with most assessments
-        user_with_most = execute_query_one("""
-            SELECT 
-                CONCAT(u.first_name, ' ', u.last_name) as fullname,
-                COUNT(uta.attempt_id) as count
-            FROM users u
-            LEFT JOIN user_test_attempts uta ON u.user_id = uta.user_id
-            GROUP BY u.user_id, u.first_name, u.last_name
-            ORDER BY COUNT(uta.attempt_id) DESC
-            LIMIT 1
-        """)
-        
-        total_users_count = int(total_users['count'])
-        total_assess_count = int(total_assessments['count'])
+        total_users_count = stats['total_users']
+        total_assess_count = stats['total_attempts']
         
         return {
             "success": True,
@@ -371,10 +790,10 @@ async def export_analytics_data():
             "summary": {
                 "total_users": total_users_count,
                 "total_assessments_taken": total_assess_count,
-                "total_recommendations_generated": int(total_recommendations['count']),
+                "total_recommendations_generated": stats['total_recommendations'],
                 "average_assessments_per_user": round(total_assess_count / total_users_count, 2) if total_users_count > 0 else 0,
-                "most_active_user": user_with_most['fullname'] if user_with_most else "N/A",
-                "most_active_user_assessments": user_with_most['count'] if user_with_most else 0
+                "most_active_user": stats['most_active_user'] or "N/A",
+                "most_active_user_assessments": stats['most_active_user_assessments']
             },
             "data_ready_for_export": True,
             "endpoints_available": [
@@ -382,8 +801,143 @@ async def export_analytics_data():
                 "/api/analytics/admin/assessments",
                 "/api/analytics/admin/users/{user_id}/assessments",
                 "/api/analytics/admin/all-users-summary",
-                "/api/analytics/admin/recommendations-summary"
-            ]
+                "/api/analytics/admin/recommendations-summary",
+                "/api/analytics/admin/timeseries",
+                "/api/analytics/admin/activity-stats",
+                "/api/analytics/admin/score-distribution",
+                "/api/analytics/admin/cohorts",
+                "/api/analytics/admin/recommendation-funnel"
+            ],
+            "raw_exports_available": [
+                f"/api/analytics/admin/export/{dataset}" for dataset in EXPORT_DATASETS
+            ],
+            "snapshots": "/api/analytics/admin/snapshots"
         }
     except Exception as error:
         raise HTTPException(status_code=500, detail=f"Failed to export analytics data: {str(error)}")
+
+
+# Stream one raw dataset as CSV or NDJSON
+@router.get("/admin/export/{dataset}")
+async def export_dataset(
+    dataset: str,
+    format: str = Query("csv"),
+    gzip: bool = Query(False)
+):
+    """
+    Download every row of attempts, recommendations, feedback or users
+    - format: csv (with a header row) or ndjson (one object per line)
+    - gzip=true compresses the stream (served as a .gz file)
+
+    Rows come from a server-side cursor inside one read-only REPEATABLE READ transaction,
+    so the export is a consistent snapshot and memory stays flat however many rows there are.
+    """
+    try:
+        if dataset not in EXPORT_DATASETS:
+            raise HTTPException(
+                status_code=404,
+                detail=f"Unknown dataset. Use one of: {', '.join(EXPORT_DATASETS)}"
+            )
+        if format not in EXPORT_FORMATS:
+            raise HTTPException(status_code=400, detail="Invalid format. Use csv or ndjson")
+        
+        query, columns = EXPORT_DATASETS[dataset]
+        media_type, extension = EXPORT_FORMATS[format]
+        filename = f"{dataset}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
+        
+        rows = iter_query_async(query, isolation='REPEATABLE READ', tuples=True)
+        if format == "csv":
+            body = stream_csv(rows, columns)
+        else:
+            body = stream_ndjson(rows, transform=lambda row: dict(zip(columns, row)))
+        if gzip:
+            body = gzip_stream(body)
+            media_type = "application/gzip"
+            filename += ".gz"
+        
+        return StreamingResponse(
+            body,
+            media_type=media_type,
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+        )
+    except HTTPException:
+        raise
+    except Exception as error:
+        raise HTTPException(status_code=500, detail=f"Failed to export {dataset}: {str(error)}")
+
+
+# ========== COLUMNAR SNAPSHOTS ==========
+
+SNAPSHOT_MEDIA_TYPES = {
+    "parquet": "application/vnd.apache.parquet",
+    "npz": "application/octet-stream"
+}
+
+# List the monthly snapshot files written so far
+@router.get("/admin/snapshots")
+async def get_snapshots():
+    try:
+        manifest = load_manifest()
+        return {
+            "success": True,
+            "format": manifest.get("format"),
+            "last_run_at": manifest.get("last_run_at"),
+            "datasets": {
+                dataset: [
+                    {
+                        "month": month,
+                        "rows": entry["rows"],
+                        "bytes": entry["bytes"],
+                        "version": entry["version"],
+                        "exported_at": entry["exported_at"],
+                        "download": f"/api/analytics/admin/snapshots/{dataset}/{month}"
+                    }
+                    for month, entry in sorted(months.items())
+                ]
+                for dataset, months in manifest["datasets"].items()
+            }
+        }
+    except Exception as error:
+        raise HTTPException(status_code=500, detail=f"Failed to list snapshots: {str(error)}")
+
+# Write the months that changed since the last snapshot run
+@router.post("/admin/snapshots")
+async def run_snapshot_export(full: bool = Query(False), datasets: Optional[str] = Query(None)):
+    """
+    Export attempts, recommendations and feedback as one columnar file per month
+    (Parquet with pyarrow installed, otherwise NumPy .npz). Only months whose rows changed
+    since the last run are rewritten; full=true rewrites every month.
+    datasets: optional comma-separated subset. export_snapshots.py does the same from cron.
+    """
+    try:
+        selected = [dataset.strip() for dataset in datasets.split(",")] if datasets else None
+        if selected and any(dataset not in SNAPSHOT_DATASETS for dataset in selected):
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid datasets. Use any of: {', '.join(SNAPSHOT_DATASETS)}"
+            )
+        summary = await run_in_db_executor(export_snapshots, full, selected)
+        return {"success": True, **summary}
+    except SnapshotInProgressError as error:
+        raise HTTPException(status_code=409, detail=str(error))
+    except HTTPException:
+        raise
+    except Exception as error:
+        raise HTTPException(status_code=500, detail=f"Failed to export snapshots: {str(error)}")
+
+# Download one month of one dataset
+@router.get("/admin/snapshots/{dataset}/{month}")
+async def download_snapshot(dataset: str, month: str):
+    try:
+        entry = load_manifest()["datasets"].get(dataset, {}).get(month)
+        if not entry:
+            raise HTTPException(status_code=404, detail="Snapshot not found")
+        return FileResponse(
+            os.path.join(SNAPSHOT_DIR, entry["file"]),
+            media_type=SNAPSHOT_MEDIA_TYPES[entry["format"]],
+            filename=f"{dataset}_{month}.{entry['format']}"
+        )
+    except HTTPException:
+        raise
+    except Exception as error:
+        raise HTTPException(status_code=500, detail=f"Failed to download snapshot: {str(error)}")
@@ -1,10 +1,10 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel, EmailStr
 from passlib.hash import bcrypt
 from datetime import datetime, timezone
-from models.database import execute_query, execute_query_one
+from models.database import execute_query_async, execute_query_one_async, use_workload
 
-router = APIRouter(prefix="/api/auth", tags=["auth"])
+router = APIRouter(prefix="/api/auth", tags=["auth"], dependencies=[Depends(use_workload("oltp"))])
 
 # Pydantic models
 class LoginRequest(BaseModel):
@@ -16,7 +16,7 @@ class LoginRequest(BaseModel):
 async def login(credentials: LoginRequest):
     try:
         # Find user by email
-        user = execute_query_one(
+        user = await execute_query_one_async(
             """SELECT 
                 user_id,
                 username,
@@ -29,7 +29,8 @@ async def login(credentials: LoginRequest):
                 CAST(academic_info->>'gwa' AS DECIMAL(5,2)) as gwa,
                 is_active
             FROM users WHERE email = $1""",
-            [credentials.email]
+            [credentials.email],
+            prepared=True
         )
         
         if not user:
@@ -46,10 +47,11 @@ async def login(credentials: LoginRequest):
         
         # Update last_login timestamp
         current_time = datetime.now(timezone.utc)
-        execute_query(
+        await execute_query_async(
             "UPDATE users SET last_login = $1 WHERE user_id = $2",
             [current_time, user['user_id']],
-            fetch=False
+            fetch=False,
+            prepared=True
         )
         
         # Return user info (without password)
@@ -1,10 +1,11 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Depends
 from pydantic import BaseModel, Field
 from typing import Optional
 import math
-from models.database import execute_query, execute_query_one
+from models.database import execute_query_async, execute_query_one_async, use_read_replica, use_workload
+from models.result_cache import bump_table_versions
 
-router = APIRouter(prefix="/api/courses", tags=["courses"])
+router = APIRouter(prefix="/api/courses", tags=["courses"], dependencies=[Depends(use_workload("oltp"))])
 
 # Pydantic models
 class CourseCreate(BaseModel):
@@ -20,7 +21,7 @@ class CourseUpdate(BaseModel):
     minimum_gwa: Optional[float] = Field(None, ge=75, le=100)
 
 # Get all courses with pagination and search
-@router.get("/")
+@router.get("/", dependencies=[Depends(use_read_replica)])
 async def get_courses(
     page: int = Query(1, ge=1),
     limit: int = Query(10, ge=1, le=100),
@@ -56,8 +57,8 @@ async def get_courses(
         query += f" ORDER BY course_id DESC LIMIT ${param_index} OFFSET ${param_index + 1}"
         params.extend([limit, offset])
         
-        courses = execute_query(query, params)
-        count_result = execute_query_one(count_query, count_params)
+        courses = await execute_query_async(query, params, prepared=True)
+        count_result = await execute_query_one_async(count_query, count_params, prepared=True)
         total = int(count_result['total'])
         
         return {
@@ -76,7 +77,7 @@ async def get_courses(
 @router.get("/{course_id}")
 async def get_course(course_id: int):
     try:
-        course = execute_query_one('SELECT * FROM courses WHERE course_id = $1', [course_id])
+        course = await execute_query_one_async('SELECT * FROM courses WHERE course_id = $1', [course_id])
         
         if not course:
             raise HTTPException(status_code=404, detail="Course not found")
@@ -91,11 +92,12 @@ async def get_course(course_id: int):
 @router.post("/", status_code=201)
 async def create_course(course: CourseCreate):
     try:
-        result = execute_query_one(
+        result = await execute_query_one_async(
             'INSERT INTO courses (course_name, description, required_strand, minimum_gwa) VALUES ($1, $2, $3, $4) RETURNING course_id',
             [course.course_name, course.description, course.required_strand, course.minimum_gwa]
         )
         
+        bump_table_versions("courses")
         return {
             "message": "Course created successfully",
             "course_id": result['course_id']
@@ -107,7 +109,7 @@ async def create_course(course: CourseCreate):
 @router.put("/{course_id}")
 async def update_course(course_id: int, course: CourseUpdate):
     try:
-        result = execute_query(
+        result = await execute_query_async(
             'UPDATE courses SET course_name = COALESCE($1, course_name), description = COALESCE($2, description), required_strand = COALESCE($3, required_strand), minimum_gwa = COALESCE($4, minimum_gwa) WHERE course_id = $5',
             [course.course_name, course.description, course.required_strand, course.minimum_gwa, course_id],
             fetch=False
@@ -116,6 +118,7 @@ async def update_course(course_id: int, course: CourseUpdate):
         if result == 0:
             raise HTTPException(status_code=404, detail="Course not found")
         
+        bump_table_versions("courses")
         return {"message": "Course updated successfully"}
     except HTTPException:
         raise
@@ -126,11 +129,12 @@ async def update_course(course_id: int, course: CourseUpdate):
 @router.delete("/{course_id}")
 async def delete_course(course_id: int):
     try:
-        result = execute_query('DELETE FROM courses WHERE course_id = $1', [course_id], fetch=False)
+        result = await execute_query_async('DELETE FROM courses WHERE course_id = $1', [course_id], fetch=False)
         
         if result == 0:
             raise HTTPException(status_code=404, detail="Course not found")
         
+        bump_table_versions("courses", deleted=True)
         return {"message": "Course deleted successfully"}
     except HTTPException:
         raise
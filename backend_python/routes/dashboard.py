@@ -0,0 +1,55 @@
+from fastapi import APIRouter, HTTPException, Query, Depends
+from models.database import use_read_replica, use_workload
+from models.result_cache import cached_result
+from models.dashboard import DASHBOARD_TABLES, DEFAULT_RECENT, MAX_RECENT, get_dashboard_summary
+
+# Read-only, so it may be served by the read replica
+router = APIRouter(
+    prefix="/api/dashboard", tags=["dashboard"],
+    dependencies=[Depends(use_read_replica), Depends(use_workload("oltp"))]
+)
+
+# Headline counts and recent activity for the admin dashboard in one round trip
+@router.get("/summary")
+@cached_result(*DASHBOARD_TABLES, max_age=30)
+async def get_dashboard_summary_view(recent: int = Query(DEFAULT_RECENT, ge=0, le=MAX_RECENT)):
+    """
+    Totals of users, courses, tests, attempts, recommendations and feedback, the last
+    30 days' signups and recommendations, and the `recent` newest signups, attempts,
+    recommendations and feedback, all from the same snapshot.
+    """
+    try:
+        stats, total_feedback, recent_lists = await get_dashboard_summary(recent)
+
+        return {
+            "success": True,
+            "snapshot_at": stats['snapshot_at'],
+            "totals": {
+                "users": stats['total_users'],
+                "courses": stats['total_courses'],
+                "tests": stats['total_tests'],
+                "attempts": stats['total_attempts'],
+                "recommendations": stats['total_recommendations'],
+                "feedback": total_feedback
+            },
+            "last_30_days": {
+                "new_users": stats['new_users_30d'],
+                "new_recommendations": stats['new_recommendations_30d']
+            },
+            "recommendations": {
+                "accepted": stats['accepted'],
+                "rejected": stats['rejected'],
+                "pending": stats['pending'],
+                "acceptance_rate": round(stats['accepted'] * 100 / stats['total_recommendations'], 2)
+                                   if stats['total_recommendations'] else None
+            },
+            "most_active_user": {
+                "name": stats['most_active_user'],
+                "assessments": stats['most_active_user_assessments']
+            } if stats['most_active_user'] else None,
+            "recent": {name: [dict(row) for row in rows] for name, rows in recent_lists.items()}
+        }
+    except HTTPException:
+        raise
+    except Exception as error:
+        raise HTTPException(status_code=500, detail=f"Failed to fetch dashboard summary: {str(error)}")
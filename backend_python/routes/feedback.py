@@ -1,10 +1,11 @@
-from fastapi import APIRouter, HTTPException, Query, Body
+from fastapi import APIRouter, HTTPException, Query, Body, Depends
 from pydantic import BaseModel
 from typing import Optional
 import math
-from models.database import execute_query, execute_query_one
+from models.database import execute_query_async, execute_query_one_async, use_read_replica, use_workload
+from models.result_cache import cached_result, bump_table_versions
 
-router = APIRouter(prefix="/api/feedback", tags=["feedback"])
+router = APIRouter(prefix="/api/feedback", tags=["feedback"], dependencies=[Depends(use_workload("oltp"))])
 
 # Pydantic model for feedback submission
 class FeedbackSubmission(BaseModel):
@@ -14,19 +15,21 @@ class FeedbackSubmission(BaseModel):
     feedback_text: Optional[str] = None
 
 # Get feedback statistics (MUST BE BEFORE /{feedback_id} route)
-@router.get("/stats/overview")
+@router.get("/stats/overview", dependencies=[Depends(use_read_replica), Depends(use_workload("analytics"))])
+@cached_result("recommendation_feedback")
 async def get_feedback_stats():
     try:
-        stats = execute_query_one("""
+        # Rating histogram maintained by triggers (models/rollups.py): at most five rows
+        stats = await execute_query_one_async("""
             SELECT 
-                COUNT(*) as total_feedback,
-                AVG(rating) as average_rating,
-                COUNT(CASE WHEN rating >= 4 THEN 1 END) as positive_count,
-                COUNT(CASE WHEN rating = 3 THEN 1 END) as neutral_count,
-                COUNT(CASE WHEN rating < 3 THEN 1 END) as negative_count,
-                COUNT(CASE WHEN feedback_text IS NOT NULL AND feedback_text != '' THEN 1 END) as feedback_with_comments
-            FROM recommendation_feedback
-        """)
+                SUM(feedback_count)::bigint as total_feedback,
+                SUM(rating * feedback_count)::numeric / NULLIF(SUM(feedback_count), 0) as average_rating,
+                SUM(feedback_count) FILTER (WHERE rating >= 4)::bigint as positive_count,
+                SUM(feedback_count) FILTER (WHERE rating = 3)::bigint as neutral_count,
+                SUM(feedback_count) FILTER (WHERE rating < 3)::bigint as negative_count,
+                SUM(with_comment_count)::bigint as feedback_with_comments
+            FROM feedback_rating_rollup
+        """, prepared=True)
         
         return {
             "total_feedback": stats['total_feedback'] or 0,
@@ -49,7 +52,7 @@ async def submit_feedback(feedback: FeedbackSubmission):
         
         # If recommendation_id is provided, check if it exists
         if feedback.recommendation_id:
-            rec_exists = execute_query_one(
+            rec_exists = await execute_query_one_async(
                 "SELECT recommendation_id FROM recommendations WHERE recommendation_id = $1",
                 [feedback.recommendation_id]
             )
@@ -57,12 +60,13 @@ async def submit_feedback(feedback: FeedbackSubmission):
                 raise HTTPException(status_code=404, detail="Recommendation not found")
         
         # Insert feedback (recommendation_id can be null for overall feedback)
-        result = execute_query_one("""
+        result = await execute_query_one_async("""
             INSERT INTO recommendation_feedback 
             (recommendation_id, user_id, rating, feedback_text, created_at)
             VALUES ($1, $2, $3, $4, NOW())
             RETURNING feedback_id, rating, feedback_text, created_at
         """, [feedback.recommendation_id, feedback.user_id, feedback.rating, feedback.feedback_text or ""])
+        bump_table_versions("recommendation_feedback")
         
         return {
             "success": True,
@@ -76,7 +80,7 @@ async def submit_feedback(feedback: FeedbackSubmission):
         raise HTTPException(status_code=500, detail=f"Failed to submit feedback: {str(error)}")
 
 # Get all feedback with pagination
-@router.get("/")
+@router.get("/", dependencies=[Depends(use_read_replica)])
 async def get_feedback(
     page: int = Query(1, ge=1),
     limit: int = Query(10, ge=1, le=100),
@@ -138,8 +142,8 @@ async def get_feedback(
         query += f" ORDER BY rf.created_at DESC LIMIT ${param_index} OFFSET ${param_index + 1}"
         params.extend([limit, offset])
         
-        feedback = execute_query(query, params)
-        count_result = execute_query_one(count_query, count_params)
+        feedback = await execute_query_async(query, params, prepared=True)
+        count_result = await execute_query_one_async(count_query, count_params, prepared=True)
         total = int(count_result['total']) if count_result else 0
         
         return {
@@ -158,7 +162,7 @@ async def get_feedback(
 @router.get("/{feedback_id}")
 async def get_feedback_detail(feedback_id: int):
     try:
-        feedback = execute_query_one("""
+        feedback = await execute_query_one_async("""
             SELECT 
                 rf.feedback_id,
                 rf.recommendation_id,
@@ -1,11 +1,11 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Depends
 import math
-from models.database import execute_query, execute_query_one
+from models.database import execute_query_async, execute_query_one_async, use_read_replica, use_workload
 
-router = APIRouter(prefix="/api/recommendations", tags=["recommendations"])
+router = APIRouter(prefix="/api/recommendations", tags=["recommendations"], dependencies=[Depends(use_workload("oltp"))])
 
 # Get all recommendations with pagination and filtering
-@router.get("/")
+@router.get("/", dependencies=[Depends(use_read_replica)])
 async def get_recommendations(
     page: int = Query(1, ge=1),
     limit: int = Query(10, ge=1, le=100),
@@ -55,8 +55,8 @@ async def get_recommendations(
         query += f" ORDER BY r.recommended_at DESC LIMIT ${param_index} OFFSET ${param_index + 1}"
         params.extend([limit, offset])
         
-        recommendations = execute_query(query, params)
-        count_result = execute_query_one(count_query, count_params)
+        recommendations = await execute_query_async(query, params, prepared=True)
+        count_result = await execute_query_one_async(count_query, count_params, prepared=True)
         total = int(count_result['total']) if count_result else 0
         
         return {
@@ -75,7 +75,7 @@ async def get_recommendations(
 @router.get("/{recommendation_id}")
 async def get_recommendation(recommendation_id: int):
     try:
-        recommendation = execute_query_one("""
+        recommendation = await execute_query_one_async("""
             SELECT 
                 r.*,
                 CONCAT(u.first_name, ' ', u.last_name) as user_name,
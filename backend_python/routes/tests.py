@@ -1,10 +1,13 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Depends
+from fastapi.responses import StreamingResponse
 from typing import List, Optional, Dict, Any
 import math
-from models.database import execute_query, execute_query_one
+from models.database import execute_query_async, execute_query_one_async, transaction_async, iter_query_async, use_read_replica, use_workload
+from models.result_cache import bump_table_versions
+from utils.streaming import stream_json_object
 from pydantic import BaseModel
 
-router = APIRouter(prefix="/api/tests", tags=["tests"])
+router = APIRouter(prefix="/api/tests", tags=["tests"], dependencies=[Depends(use_workload("oltp"))])
 
 # Pydantic models
 class TestAttempt(BaseModel):
@@ -27,7 +30,7 @@ class OptionCreate(BaseModel):
     option_order: int
 
 # Get all tests with pagination and search
-@router.get("/")
+@router.get("/", dependencies=[Depends(use_read_replica)])
 async def get_tests(
     page: int = Query(1, ge=1),
     limit: int = Query(10, ge=1, le=100),
@@ -54,8 +57,8 @@ async def get_tests(
         query += f" ORDER BY test_id DESC LIMIT ${param_index} OFFSET ${param_index + 1}"
         params.extend([limit, offset])
         
-        tests = execute_query(query, params)
-        count_result = execute_query_one(count_query, count_params)
+        tests = await execute_query_async(query, params, prepared=True)
+        count_result = await execute_query_one_async(count_query, count_params, prepared=True)
         total = int(count_result['total'])
         
         return {
@@ -74,12 +77,12 @@ async def get_tests(
 @router.get("/{test_id}")
 async def get_test(test_id: int):
     try:
-        test = execute_query_one('SELECT * FROM tests WHERE test_id = $1', [test_id])
+        test = await execute_query_one_async('SELECT * FROM tests WHERE test_id = $1', [test_id])
         
         if not test:
             raise HTTPException(status_code=404, detail="Test not found")
         
-        questions = execute_query(
+        questions = await execute_query_async(
             'SELECT * FROM questions WHERE test_id = $1 ORDER BY question_order',
             [test_id]
         )
@@ -87,7 +90,7 @@ async def get_test(test_id: int):
         # Get options for each question
         questions_with_options = []
         for question in questions:
-            options = execute_query(
+            options = await execute_query_async(
                 'SELECT * FROM options WHERE question_id = $1 ORDER BY option_order',
                 [question['question_id']]
             )
@@ -108,11 +111,12 @@ async def get_test(test_id: int):
 @router.delete("/{test_id}")
 async def delete_test(test_id: int):
     try:
-        result = execute_query('DELETE FROM tests WHERE test_id = $1', [test_id], fetch=False)
+        result = await execute_query_async('DELETE FROM tests WHERE test_id = $1', [test_id], fetch=False)
         
         if result == 0:
             raise HTTPException(status_code=404, detail="Test not found")
         
+        bump_table_versions("tests", deleted=True)
         return {"message": "Test deleted successfully"}
     except HTTPException:
         raise
@@ -120,15 +124,16 @@ async def delete_test(test_id: int):
         raise HTTPException(status_code=500, detail=f"Failed to delete test: {str(error)}")
 
 # Get test attempts for a specific test
-@router.get("/{test_id}/attempts")
+@router.get("/{test_id}/attempts", dependencies=[Depends(use_workload("analytics"))])
 async def get_test_attempts(test_id: int):
     try:
         # Verify test exists
-        test = execute_query_one('SELECT test_id FROM tests WHERE test_id = $1', [test_id])
+        test = await execute_query_one_async('SELECT test_id FROM tests WHERE test_id = $1', [test_id], prepared=True)
         if not test:
             raise HTTPException(status_code=404, detail="Test not found")
         
-        attempts = execute_query("""
+        # Streamed from a server-side cursor so memory stays flat however many attempts exist
+        attempts = iter_query_async("""
             SELECT 
                 uta.attempt_id,
                 uta.user_id,
@@ -145,10 +150,10 @@ async def get_test_attempts(test_id: int):
             ORDER BY uta.attempt_date DESC
         """, [test_id])
         
-        return {
-            "attempts": attempts,
-            "total_attempts": len(attempts)
-        }
+        return StreamingResponse(
+            stream_json_object(attempts, "attempts", count_key="total_attempts"),
+            media_type="application/json"
+        )
     except HTTPException:
         raise
     except Exception as error:
@@ -158,51 +163,26 @@ async def get_test_attempts(test_id: int):
 @router.post("/{test_id}/submit", status_code=201)
 async def submit_test_attempt(test_id: int, attempt: TestAttempt):
     try:
-        # Verify test exists
-        test = execute_query_one('SELECT test_id FROM tests WHERE test_id = $1', [test_id])
-        if not test:
-            raise HTTPException(status_code=404, detail="Test not found")
-        
-        # Verify user exists
-        user = execute_query_one('SELECT user_id FROM users WHERE user_id = $1', [attempt.user_id])
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
-        
-        # Insert test attempt
-        result = execute_query_one(
-            """INSERT INTO user_test_attempts (user_id, test_id, score, total_questions, time_taken) 
-               VALUES ($1, $2, $3, $4, $5) RETURNING attempt_id""",
-            [attempt.user_id, test_id, attempt.score, attempt.total_questions, attempt.time_taken]
-        )
-        
-        return {
-            "message": "Test attempt recorded successfully",
-            "attempt_id": result['attempt_id']
-        }
-    except HTTPException:
-        raise
-    except Exception as error:
-        raise HTTPException(status_code=500, detail=f"Failed to record test attempt: {str(error)}")
-@router.post("/{test_id}/submit", status_code=201)
-async def submit_test_attempt(test_id: int, attempt: TestAttempt):
-    try:
-        # Verify test exists
-        test = execute_query_one('SELECT test_id FROM tests WHERE test_id = $1', [test_id])
-        if not test:
-            raise HTTPException(status_code=404, detail="Test not found")
-        
-        # Verify user exists
-        user = execute_query_one('SELECT user_id FROM users WHERE user_id = $1', [attempt.user_id])
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
-        
-        # Insert test attempt
-        result = execute_query_one(
-            """INSERT INTO user_test_attempts (user_id, test_id, score, total_questions, time_taken) 
-               VALUES ($1, $2, $3, $4, $5) RETURNING attempt_id""",
-            [attempt.user_id, test_id, attempt.score, attempt.total_questions, attempt.time_taken]
-        )
+        async with transaction_async() as tx:
+            # Verify test exists
+            test = await tx.execute_query_one('SELECT test_id FROM tests WHERE test_id = $1', [test_id], prepared=True)
+            if not test:
+                raise HTTPException(status_code=404, detail="Test not found")
+            
+            # Verify user exists
+            user = await tx.execute_query_one('SELECT user_id FROM users WHERE user_id = $1', [attempt.user_id], prepared=True)
+            if not user:
+                raise HTTPException(status_code=404, detail="User not found")
+            
+            # Insert test attempt
+            result = await tx.execute_query_one(
+                """INSERT INTO user_test_attempts (user_id, test_id, score, total_questions, time_taken) 
+                   VALUES ($1, $2, $3, $4, $5) RETURNING attempt_id""",
+                [attempt.user_id, test_id, attempt.score, attempt.total_questions, attempt.time_taken],
+                prepared=True
+            )
         
+        bump_table_versions("user_test_attempts")
         return {
             "message": "Test attempt recorded successfully",
             "attempt_id": result['attempt_id']
@@ -215,7 +195,7 @@ async def submit_test_attempt(test_id: int, attempt: TestAttempt):
 # ==================== QUESTION MANAGEMENT ====================
 
 # Get all questions with pagination and search
-@router.get("/questions/list/all")
+@router.get("/questions/list/all", dependencies=[Depends(use_read_replica)])
 async def get_questions(
     page: int = Query(1, ge=1),
     limit: int = Query(10, ge=1, le=100),
@@ -263,8 +243,8 @@ async def get_questions(
         query += f" ORDER BY q.test_id, q.question_order LIMIT ${param_index} OFFSET ${param_index + 1}"
         params.extend([limit, offset])
         
-        questions = execute_query(query, params)
-        count_result = execute_query_one(count_query, count_params)
+        questions = await execute_query_async(query, params, prepared=True)
+        count_result = await execute_query_one_async(count_query, count_params, prepared=True)
         total = int(count_result['total'])
         
         return {
@@ -283,12 +263,12 @@ async def get_questions(
 @router.get("/questions/{question_id}")
 async def get_question(question_id: int):
     try:
-        question = execute_query_one('SELECT * FROM questions WHERE question_id = $1', [question_id])
+        question = await execute_query_one_async('SELECT * FROM questions WHERE question_id = $1', [question_id])
         
         if not question:
             raise HTTPException(status_code=404, detail="Question not found")
         
-        options = execute_query(
+        options = await execute_query_async(
             'SELECT * FROM options WHERE question_id = $1 ORDER BY option_order',
             [question_id]
         )
@@ -306,17 +286,19 @@ async def get_question(question_id: int):
 @router.post("/questions", status_code=201)
 async def create_question(question: QuestionCreate):
     try:
-        # Verify test exists
-        test = execute_query_one('SELECT test_id FROM tests WHERE test_id = $1', [question.test_id])
-        if not test:
-            raise HTTPException(status_code=404, detail="Test not found")
-        
-        result = execute_query_one(
-            """INSERT INTO questions (test_id, question_text, question_order, question_type)
-               VALUES ($1, $2, $3, $4) RETURNING question_id""",
-            [question.test_id, question.question_text, question.question_order, question.question_type]
-        )
+        async with transaction_async() as tx:
+            # Verify test exists
+            test = await tx.execute_query_one('SELECT test_id FROM tests WHERE test_id = $1', [question.test_id], prepared=True)
+            if not test:
+                raise HTTPException(status_code=404, detail="Test not found")
+            
+            result = await tx.execute_query_one(
+                """INSERT INTO questions (test_id, question_text, question_order, question_type)
+                   VALUES ($1, $2, $3, $4) RETURNING question_id""",
+                [question.test_id, question.question_text, question.question_order, question.question_type]
+            )
         
+        bump_table_versions("questions")
         return {
             "message": "Question created successfully",
             "question_id": result['question_id']
@@ -330,15 +312,17 @@ async def create_question(question: QuestionCreate):
 @router.delete("/questions/{question_id}")
 async def delete_question(question_id: int):
     try:
-        # First delete all options for this question
-        execute_query('DELETE FROM options WHERE question_id = $1', [question_id], fetch=False)
-        
-        # Then delete the question
-        result = execute_query('DELETE FROM questions WHERE question_id = $1', [question_id], fetch=False)
-        
-        if result == 0:
-            raise HTTPException(status_code=404, detail="Question not found")
-        
+        async with transaction_async() as tx:
+            # First delete all options for this question
+            await tx.execute_query('DELETE FROM options WHERE question_id = $1', [question_id], fetch=False)
+            
+            # Then delete the question
+            result = await tx.execute_query('DELETE FROM questions WHERE question_id = $1', [question_id], fetch=False)
+            
+            if result == 0:
+                raise HTTPException(status_code=404, detail="Question not found")
+        
+        bump_table_versions("questions", deleted=True)
         return {"message": "Question deleted successfully"}
     except HTTPException:
         raise
@@ -349,17 +333,19 @@ async def delete_question(question_id: int):
 @router.post("/questions/{question_id}/options", status_code=201)
 async def create_option(question_id: int, option: OptionCreate):
     try:
-        # Verify question exists
-        question = execute_query_one('SELECT question_id FROM questions WHERE question_id = $1', [question_id])
-        if not question:
-            raise HTTPException(status_code=404, detail="Question not found")
-        
-        result = execute_query_one(
-            """INSERT INTO options (question_id, option_text, is_correct, option_order)
-               VALUES ($1, $2, $3, $4) RETURNING option_id""",
-            [question_id, option.option_text, option.is_correct, option.option_order]
-        )
+        async with transaction_async() as tx:
+            # Verify question exists
+            question = await tx.execute_query_one('SELECT question_id FROM questions WHERE question_id = $1', [question_id], prepared=True)
+            if not question:
+                raise HTTPException(status_code=404, detail="Question not found")
+            
+            result = await tx.execute_query_one(
+                """INSERT INTO options (question_id, option_text, is_correct, option_order)
+                   VALUES ($1, $2, $3, $4) RETURNING option_id""",
+                [question_id, option.option_text, option.is_correct, option.option_order]
+            )
         
+        bump_table_versions("options")
         return {
             "message": "Option created successfully",
             "option_id": result['option_id']
@@ -373,11 +359,12 @@ async def create_option(question_id: int, option: OptionCreate):
 @router.delete("/options/{option_id}")
 async def delete_option(option_id: int):
     try:
-        result = execute_query('DELETE FROM options WHERE option_id = $1', [option_id], fetch=False)
+        result = await execute_query_async('DELETE FROM options WHERE option_id = $1', [option_id], fetch=False)
         
         if result == 0:
             raise HTTPException(status_code=404, detail="Option not found")
         
+        bump_table_versions("options")
         return {"message": "Option deleted successfully"}
     except HTTPException:
         raise
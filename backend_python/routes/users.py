@@ -1,11 +1,12 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Depends
 from pydantic import BaseModel, EmailStr, Field, validator
 from typing import Optional, Dict, Any
 from passlib.hash import bcrypt
 import math
-from models.database import execute_query, execute_query_one
+from models.database import execute_query_async, execute_query_one_async, transaction_async, use_read_replica, use_workload
+from models.result_cache import cached_result, bump_table_versions
 
-router = APIRouter(prefix="/api/users", tags=["users"])
+router = APIRouter(prefix="/api/users", tags=["users"], dependencies=[Depends(use_workload("oltp"))])
 
 # Pydantic models
 class UserCreate(BaseModel):
@@ -27,7 +28,7 @@ class UserUpdate(BaseModel):
     gwa: Optional[float] = Field(None, ge=75, le=100)
 
 # Get all users with pagination and search
-@router.get("/")
+@router.get("/", dependencies=[Depends(use_read_replica), Depends(use_workload("analytics"))])
 async def get_users(
     page: int = Query(1, ge=1),
     limit: int = Query(10, ge=1, le=100),
@@ -49,8 +50,8 @@ async def get_users(
             created_at,
             is_active,
             last_login,
-            (SELECT COUNT(*) FROM user_test_attempts uta JOIN tests t ON uta.test_id = t.test_id WHERE uta.user_id = users.user_id AND t.test_type = 'adaptive') as tests_taken,
-            (SELECT MAX(attempt_date) FROM user_test_attempts uta JOIN tests t ON uta.test_id = t.test_id WHERE uta.user_id = users.user_id AND t.test_type = 'adaptive') as last_test_date
+            COALESCE((SELECT adaptive_attempts FROM user_activity_rollup a WHERE a.user_id = users.user_id), 0) as tests_taken,
+            (SELECT last_adaptive_attempt_at FROM user_activity_rollup a WHERE a.user_id = users.user_id) as last_test_date
         FROM users WHERE 1=1"""
         
         count_query = "SELECT COUNT(*) as total FROM users WHERE 1=1"
@@ -78,8 +79,8 @@ async def get_users(
         query += f" ORDER BY created_at DESC LIMIT ${param_index} OFFSET ${param_index + 1}"
         params.extend([limit, offset])
         
-        users = execute_query(query, params)
-        count_result = execute_query_one(count_query, count_params)
+        users = await execute_query_async(query, params, prepared=True)
+        count_result = await execute_query_one_async(count_query, count_params, prepared=True)
         total = int(count_result['total'])
         
         return {
@@ -98,7 +99,7 @@ async def get_users(
 @router.get("/{user_id}")
 async def get_user(user_id: int):
     try:
-        user = execute_query_one(
+        user = await execute_query_one_async(
             """SELECT 
                 user_id,
                 username,
@@ -148,12 +149,13 @@ async def create_user(user: UserCreate):
         
         username = user.username if user.username else user.email.split('@')[0]
         
-        result = execute_query_one(
+        result = await execute_query_one_async(
             """INSERT INTO users (username, first_name, last_name, email, password_hash, academic_info) 
                VALUES ($1, $2, $3, $4, $5, $6) RETURNING user_id""",
             [username, first_name, last_name, user.email, hashed_password, str(academic_info).replace("'", '"')]
         )
         
+        bump_table_versions("users")
         return {
             "message": "User created successfully",
             "user_id": result['user_id']
@@ -195,33 +197,35 @@ async def update_user(user_id: int, user: UserUpdate):
             params.append(user.email)
             param_index += 1
         
-        # Handle academic_info JSON update
-        if user.strand or user.gwa:
-            current = execute_query_one('SELECT academic_info FROM users WHERE user_id = $1', [user_id])
-            if not current:
-                raise HTTPException(status_code=404, detail="User not found")
+        async with transaction_async() as tx:
+            # Handle academic_info JSON update (row locked so concurrent edits don't overwrite each other)
+            if user.strand or user.gwa:
+                current = await tx.execute_query_one('SELECT academic_info FROM users WHERE user_id = $1 FOR UPDATE', [user_id])
+                if not current:
+                    raise HTTPException(status_code=404, detail="User not found")
+                
+                academic_info = current.get('academic_info', {}) if current.get('academic_info') else {}
+                if user.strand:
+                    academic_info['strand'] = user.strand
+                if user.gwa:
+                    academic_info['gwa'] = float(user.gwa)
+                
+                updates.append(f"academic_info = ${param_index}")
+                params.append(str(academic_info).replace("'", '"'))
+                param_index += 1
             
-            academic_info = current.get('academic_info', {}) if current.get('academic_info') else {}
-            if user.strand:
-                academic_info['strand'] = user.strand
-            if user.gwa:
-                academic_info['gwa'] = float(user.gwa)
+            if not updates:
+                raise HTTPException(status_code=400, detail="No fields to update")
             
-            updates.append(f"academic_info = ${param_index}")
-            params.append(str(academic_info).replace("'", '"'))
-            param_index += 1
-        
-        if not updates:
-            raise HTTPException(status_code=400, detail="No fields to update")
-        
-        params.append(user_id)
-        query = f"UPDATE users SET {', '.join(updates)} WHERE user_id = ${param_index}"
-        
-        result = execute_query(query, params, fetch=False)
-        
-        if result == 0:
-            raise HTTPException(status_code=404, detail="User not found")
+            params.append(user_id)
+            query = f"UPDATE users SET {', '.join(updates)} WHERE user_id = ${param_index}"
+            
+            result = await tx.execute_query(query, params, fetch=False)
+            
+            if result == 0:
+                raise HTTPException(status_code=404, detail="User not found")
         
+        bump_table_versions("users")
         return {"message": "User updated successfully"}
     except HTTPException:
         raise
@@ -234,11 +238,12 @@ async def update_user(user_id: int, user: UserUpdate):
 @router.delete("/{user_id}")
 async def delete_user(user_id: int):
     try:
-        result = execute_query('DELETE FROM users WHERE user_id = $1', [user_id], fetch=False)
+        result = await execute_query_async('DELETE FROM users WHERE user_id = $1', [user_id], fetch=False)
         
         if result == 0:
             raise HTTPException(status_code=404, detail="User not found")
         
+        bump_table_versions("users", deleted=True)
         return {"message": "User deleted successfully"}
     except HTTPException:
         raise
@@ -246,19 +251,20 @@ async def delete_user(user_id: int):
         raise HTTPException(status_code=500, detail=f"Failed to delete user: {str(error)}")
 
 # Get user statistics
-@router.get("/stats/overview")
+@router.get("/stats/overview", dependencies=[Depends(use_read_replica), Depends(use_workload("analytics"))])
+@cached_result("users")
 async def get_user_stats():
     try:
-        total_users = execute_query_one('SELECT COUNT(*) as count FROM users')
+        total_users = await execute_query_one_async('SELECT COUNT(*) as count FROM users')
         
-        strand_distribution = execute_query("""
+        strand_distribution = await execute_query_async("""
             SELECT academic_info->>'strand' as strand, COUNT(*) as count
             FROM users
             WHERE academic_info->>'strand' IS NOT NULL
             GROUP BY academic_info->>'strand'
         """)
         
-        gwa_stats = execute_query_one("""
+        gwa_stats = await execute_query_one_async("""
             SELECT 
                 ROUND(AVG(CAST(academic_info->>'gwa' AS DECIMAL))::numeric, 2) as average,
                 MIN(CAST(academic_info->>'gwa' AS DECIMAL)) as minimum,
@@ -267,7 +273,7 @@ async def get_user_stats():
             WHERE academic_info->>'gwa' IS NOT NULL
         """)
         
-        recent_users = execute_query("""
+        recent_users = await execute_query_async("""
             SELECT 
                 user_id,
                 CONCAT(first_name, ' ', last_name) as full_name,
@@ -291,11 +297,11 @@ async def get_user_stats():
 async def get_user_test_history(user_id: int):
     try:
         # Check if user exists
-        user = execute_query_one('SELECT user_id FROM users WHERE user_id = $1', [user_id])
+        user = await execute_query_one_async('SELECT user_id FROM users WHERE user_id = $1', [user_id], prepared=True)
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
-        test_history = execute_query("""
+        test_history = await execute_query_async("""
             SELECT 
                 uta.attempt_id,
                 uta.test_id,
@@ -332,16 +338,17 @@ async def update_user_status(user_id: int, status: Dict[str, Any]):
         is_active = status.get('is_active', False)
         
         # Check if user exists
-        user = execute_query_one('SELECT user_id FROM users WHERE user_id = $1', [user_id])
+        user = await execute_query_one_async('SELECT user_id FROM users WHERE user_id = $1', [user_id], prepared=True)
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
-        execute_query(
+        await execute_query_async(
             'UPDATE users SET is_active = $1 WHERE user_id = $2',
             [is_active, user_id],
             fetch=False
         )
         
+        # No cached result reads is_active, so nothing to invalidate
         status_text = "activated" if is_active else "deactivated"
         return {"message": f"User {status_text} successfully"}
     except HTTPException:
@@ -2,12 +2,9 @@
 Database seeding script to populate courses table with all available programs
 """
 
-import psycopg2
-from psycopg2.extras import execute_batch
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
+from models.database import (
+    execute_query_one, transaction, close_all_connections, db_workload
+)
 
 # All courses to be seeded
 COURSES = [
@@ -112,78 +109,62 @@ COURSES = [
     "Bachelor of Technical-Vocational Teacher Education",
 ]
 
+def course_rows():
+    """Yield (course_name, description, required_strand, minimum_gwa) for every course"""
+    for course in COURSES:
+        yield (
+            course,
+            f"Description for {course}",  # Default description
+            "STEM" if any(term in course for term in ["Engineering", "Science", "Technology", "Computer", "Data", "Mathematics", "Statistics", "Physics", "Chemistry", "Biology", "Geology", "Forestry", "Fisheries", "Veterinary", "Geology"]) 
+            else "HUMSS" if any(term in course for term in ["Communication", "Journalism", "Philosophy", "Sociology", "Psychology", "Political", "Linguistics", "International", "Tourism", "Hospitality", "Business", "Accountancy", "Management", "Entrepreneurship", "Legal", "Public Administration", "Development", "Social Work"])
+            else "ABM" if any(term in course for term in ["Business", "Accountancy", "Entrepreneurship", "Management"])
+            else "STEM",
+            75.0  # Default minimum GWA
+        )
+
 def seed_courses():
     """Insert all courses into the database"""
-    conn = None
     try:
-        # Connect to PostgreSQL
-        conn = psycopg2.connect(
-            host=os.getenv('DB_HOST', 'localhost'),
-            port=os.getenv('DB_PORT', '5432'),
-            database=os.getenv('DB_NAME', 'coursepro_db'),
-            user=os.getenv('DB_USER', 'postgres'),
-            password=os.getenv('DB_PASSWORD', 'admin123')
-        )
-        
-        cursor = conn.cursor()
-        
-        # Prepare data for batch insert
-        # Format: (course_name, description, required_strand, minimum_gwa)
-        course_data = [
-            (
-                course,
-                f"Description for {course}",  # Default description
-                "STEM" if any(term in course for term in ["Engineering", "Science", "Technology", "Computer", "Data", "Mathematics", "Statistics", "Physics", "Chemistry", "Biology", "Geology", "Forestry", "Fisheries", "Veterinary", "Geology"]) 
-                else "HUMSS" if any(term in course for term in ["Communication", "Journalism", "Philosophy", "Sociology", "Psychology", "Political", "Linguistics", "International", "Tourism", "Hospitality", "Business", "Accountancy", "Management", "Entrepreneurship", "Legal", "Public Administration", "Development", "Social Work"])
-                else "ABM" if any(term in course for term in ["Business", "Accountancy", "Entrepreneurship", "Management"])
-                else "STEM",
-                75.0  # Default minimum GWA
-            )
-            for course in COURSES
-        ]
-        
         # Check if courses already exist to avoid duplicates
-        cursor.execute("SELECT COUNT(*) FROM courses WHERE course_name IN (%s)" % 
-                      ",".join(["%s"] * len(COURSES)), COURSES)
-        existing_count = cursor.fetchone()[0]
+        existing_count = execute_query_one(
+            "SELECT COUNT(*) as count FROM courses WHERE course_name = ANY($1)", [COURSES]
+        )['count']
         
+        clear_existing = False
         if existing_count > 0:
             print(f"⚠️  {existing_count} course(s) already exist in the database.")
             response = input("Do you want to clear existing courses and start fresh? (yes/no): ")
             if response.lower() == 'yes':
-                cursor.execute("DELETE FROM courses")
-                print("Cleared existing courses.")
+                clear_existing = True
             else:
                 print("Aborting to prevent duplicates.")
                 return
         
-        # Insert courses using batch insert for efficiency
-        insert_query = """
-            INSERT INTO courses (course_name, description, required_strand, minimum_gwa)
-            VALUES (%s, %s, %s, %s)
-        """
-        
-        execute_batch(cursor, insert_query, course_data, page_size=1000)
-        conn.commit()
+        # Clear and insert in one transaction, streaming the rows through COPY
+        with transaction() as tx:
+            if clear_existing:
+                tx.execute_query("DELETE FROM courses", fetch=False)
+                print("Cleared existing courses.")
+            tx.copy_rows(
+                'courses',
+                ['course_name', 'description', 'required_strand', 'minimum_gwa'],
+                course_rows()
+            )
         
         # Verify the insertion
-        cursor.execute("SELECT COUNT(*) FROM courses")
-        total_courses = cursor.fetchone()[0]
+        total_courses = execute_query_one("SELECT COUNT(*) as count FROM courses")['count']
         
         print(f"✅ Successfully seeded {total_courses} courses into the database!")
         print(f"   Total courses now available: {total_courses}")
         
-        cursor.close()
-        
     except Exception as error:
         print(f"❌ Error seeding database: {error}")
-        if conn:
-            conn.rollback()
-    finally:
-        if conn:
-            conn.close()
 
 if __name__ == "__main__":
     print("🌱 Starting course seeding process...")
     print(f"   Courses to insert: {len(COURSES)}")
-    seed_courses()
+    db_workload.set('maintenance')
+    try:
+        seed_courses()
+    finally:
+        close_all_connections()
@@ -0,0 +1,253 @@
+"""
+Check that the activity cube (models/cube.py) answers every slice the way the raw tables do.
+Runs against the database configured in .env (migration 10 applied). Every write
+happens inside a transaction that is rolled back, so the data is left untouched.
+
+    python test_cube.py
+"""
+
+import itertools
+import sys
+from datetime import datetime, timezone
+from models.database import transaction
+from models.cube import CUBE_DIMENSIONS, CUBE_MEASURES, cube_query, refresh_cube
+
+STRAND = "COALESCE(NULLIF(u.academic_info->>'strand', ''), 'Unknown')"
+
+# Each fact table queried on its own: FROM clause, dimension expressions, measure expressions
+RAW_SOURCES = [
+    (
+        """user_test_attempts a
+        LEFT JOIN users u ON u.user_id = a.user_id
+        LEFT JOIN tests t ON t.test_id = a.test_id""",
+        {
+            "strand": STRAND,
+            "course": "0",
+            "test_type": "COALESCE(t.test_type, 'none')",
+            "month": "date_trunc('month', COALESCE(a.attempt_date, 'epoch') AT TIME ZONE 'UTC')::date"
+        },
+        {"attempts": "COUNT(*)", "score_sum": "SUM(a.score)", "question_sum": "SUM(a.total_questions)"}
+    ),
+    (
+        """recommendations r
+        LEFT JOIN users u ON u.user_id = r.user_id
+        LEFT JOIN user_test_attempts a ON a.attempt_id = r.attempt_id
+        LEFT JOIN tests t ON t.test_id = a.test_id""",
+        {
+            "strand": STRAND,
+            "course": "COALESCE(r.course_id, 0)",
+            "test_type": "COALESCE(t.test_type, 'none')",
+            "month": "date_trunc('month', COALESCE(r.recommended_at, 'epoch') AT TIME ZONE 'UTC')::date"
+        },
+        {
+            "recommendations": "COUNT(*)",
+            "accepted": "COUNT(*) FILTER (WHERE r.status = 'accepted')",
+            "rejected": "COUNT(*) FILTER (WHERE r.status = 'rejected')",
+            "pending": "COUNT(*) FILTER (WHERE r.status = 'pending')"
+        }
+    ),
+    (
+        """recommendation_feedback f
+        LEFT JOIN users u ON u.user_id = f.user_id
+        LEFT JOIN recommendations r ON r.recommendation_id = f.recommendation_id
+        LEFT JOIN user_test_attempts a ON a.attempt_id = r.attempt_id
+        LEFT JOIN tests t ON t.test_id = a.test_id""",
+        {
+            "strand": STRAND,
+            "course": "COALESCE(r.course_id, 0)",
+            "test_type": "COALESCE(t.test_type, 'none')",
+            "month": "date_trunc('month', COALESCE(f.created_at::timestamptz, 'epoch') AT TIME ZONE 'UTC')::date"
+        },
+        {"ratings": "COUNT(*)", "rating_sum": "SUM(f.rating)"}
+    )
+]
+
+def raw_answer(tx, group_by, filters):
+    """{dimension values: {measure: sum}} computed straight from the fact tables"""
+    answer = {}
+    for source, dimensions, measures in RAW_SOURCES:
+        conditions, params = [], []
+        for dimension, value in filters.items():
+            params.append(value)
+            if dimension == "start_month":
+                conditions.append(f"{dimensions['month']} >= ${len(params)}")
+            elif dimension == "end_month":
+                conditions.append(f"{dimensions['month']} <= ${len(params)}")
+            else:
+                conditions.append(f"{dimensions[dimension]} = ${len(params)}")
+        keys = [f"{dimensions[dimension]} as {dimension}" for dimension in group_by]
+        rows = tx.execute_query(f"""
+            SELECT {''.join(key + ', ' for key in keys)}
+                {', '.join(f"{expression} as {measure}" for measure, expression in measures.items())}
+            FROM {source}
+            {'WHERE ' + ' AND '.join(conditions) if conditions else ''}
+            {'GROUP BY ' + ', '.join(str(position + 1) for position in range(len(keys))) if keys else ''}
+        """, params)
+        for row in rows:
+            key = tuple(normalize(dimension, row[dimension]) for dimension in group_by)
+            cell = answer.setdefault(key, dict.fromkeys(CUBE_MEASURES, 0))
+            for measure in measures:
+                cell[measure] += row[measure] or 0
+    return drop_empty(answer)
+
+def cube_answer(tx, group_by, filters):
+    query, params = cube_query(
+        group_by, filters.get("strand"), filters.get("course"), filters.get("test_type"),
+        filters.get("start_month"), filters.get("end_month")
+    )
+    answer = {}
+    for row in tx.execute_query(query, params):
+        key = tuple(normalize(dimension, row[CUBE_DIMENSIONS[dimension][1]]) for dimension in group_by)
+        assert key not in answer, f"duplicate cube cell {key}"
+        answer[key] = {measure: row[measure] for measure in CUBE_MEASURES}
+    return drop_empty(answer)
+
+def normalize(dimension, value):
+    if dimension == "month" and not isinstance(value, str):
+        return value.strftime("%Y-%m")
+    return value
+
+def drop_empty(answer):
+    return {key: cell for key, cell in answer.items() if any(cell.values())}
+
+def compare(tx, group_by, filters):
+    raw = raw_answer(tx, group_by, filters)
+    cube = cube_answer(tx, group_by, filters)
+    differences = [
+        (key, raw.get(key), cube.get(key))
+        for key in set(raw) | set(cube)
+        if raw.get(key) != cube.get(key)
+    ]
+    assert not differences, (
+        f"group_by={group_by} filters={filters}: {len(differences)} cells differ, e.g. {differences[:2]}"
+    )
+    return len(cube)
+
+def all_groupings():
+    dimensions = list(CUBE_DIMENSIONS)
+    return [list(subset) for size in range(len(dimensions) + 1) for subset in itertools.combinations(dimensions, size)]
+
+def sample_filters(tx):
+    """Filters built from members that exist in this database"""
+    strand = tx.execute_query_one(f"""
+        SELECT {STRAND} as strand FROM user_test_attempts a JOIN users u ON u.user_id = a.user_id
+        GROUP BY 1 ORDER BY COUNT(*) DESC LIMIT 1
+    """)
+    course = tx.execute_query_one("SELECT course_id FROM recommendations GROUP BY 1 ORDER BY COUNT(*) DESC LIMIT 1")
+    test_type = tx.execute_query_one("SELECT test_type FROM tests WHERE test_type IS NOT NULL LIMIT 1")
+    months = tx.execute_query_one(
+        "SELECT MIN(month) as first, MAX(month) as last FROM analytics_cube WHERE grouping_set = 0"
+    )
+    filters = []
+    if strand:
+        filters.append({"strand": strand['strand']})
+    if course:
+        filters.append({"course": course['course_id']})
+    if test_type:
+        filters.append({"test_type": test_type['test_type']})
+    if months['first']:
+        filters.append({"start_month": months['last'].replace(month=1)})
+        filters.append({"start_month": months['first'], "end_month": months['last'].replace(month=1)})
+    if strand and test_type and months['first']:
+        filters.append({"strand": strand['strand'], "test_type": test_type['test_type'], "end_month": months['last']})
+    if course and test_type:
+        filters.append({"course": course['course_id'], "test_type": test_type['test_type']})
+    return filters
+
+class Rollback(Exception):
+    """Raised to leave a check's transaction without committing"""
+
+def test_every_grouping_matches_raw():
+    """All 16 combinations of group_by dimensions, unfiltered"""
+    try:
+        with transaction() as tx:
+            refresh_cube(tx)
+            for group_by in all_groupings():
+                compare(tx, group_by, {})
+            raise Rollback()
+    except Rollback:
+        pass
+
+def test_filtered_slices_match_raw():
+    """Every grouping again under equality filters, month ranges and combinations of both"""
+    try:
+        with transaction() as tx:
+            refresh_cube(tx)
+            filters = sample_filters(tx)
+            assert filters, "no facts to slice"
+            checked = 0
+            for slice_filters in filters:
+                for group_by in all_groupings():
+                    compare(tx, group_by, slice_filters)
+                    checked += 1
+            print(f"   {checked} filtered slices checked")
+            raise Rollback()
+    except Rollback:
+        pass
+
+def test_incremental_refresh_after_writes():
+    """Writes mark only the months they touch; after a refresh the cube matches the raw tables again"""
+    try:
+        with transaction() as tx:
+            refresh_cube(tx)
+            assert refresh_cube(tx) == 0, "a second refresh found stale months"
+
+            user = tx.execute_query_one("""
+                SELECT user_id, academic_info->>'strand' as strand FROM users
+                WHERE EXISTS (SELECT 1 FROM user_test_attempts a WHERE a.user_id = users.user_id)
+                ORDER BY user_id LIMIT 1
+            """)
+            test = tx.execute_query_one("SELECT test_id FROM tests ORDER BY test_id LIMIT 1")
+            course = tx.execute_query_one("SELECT course_id FROM courses ORDER BY course_id LIMIT 1")
+            assert user and test and course, "needs a user with attempts, a test and a course"
+
+            now = datetime.now(timezone.utc)
+            attempt = tx.execute_query_one("""
+                INSERT INTO user_test_attempts (user_id, test_id, score, total_questions, attempt_date, time_taken)
+                VALUES ($1, $2, 7, 10, $3, 300) RETURNING attempt_id
+            """, [user['user_id'], test['test_id'], now])
+            recommendation = tx.execute_query_one("""
+                INSERT INTO recommendations (attempt_id, user_id, course_id, reasoning, status, recommended_at)
+                VALUES ($1, $2, $3, 'cube check', 'accepted', $4) RETURNING recommendation_id
+            """, [attempt['attempt_id'], user['user_id'], course['course_id'], now])
+            tx.execute_query("""
+                INSERT INTO recommendation_feedback (recommendation_id, user_id, rating, created_at)
+                VALUES ($1, $2, 4, $3)
+            """, [recommendation['recommendation_id'], user['user_id'], now.replace(tzinfo=None)], fetch=False)
+            # Moving the user to another strand re-files all of their facts
+            tx.execute_query("""
+                UPDATE users SET academic_info = jsonb_set(COALESCE(academic_info, '{}'::jsonb), '{strand}', '"CUBE-CHECK"')
+                WHERE user_id = $1
+            """, [user['user_id']], fetch=False)
+
+            stale = tx.execute_query_one(
+                "SELECT COUNT(*) as months FROM analytics_cube_months WHERE version <> refreshed_version"
+            )['months']
+            total = tx.execute_query_one("SELECT COUNT(*) as months FROM analytics_cube_months")['months']
+            rebuilt = refresh_cube(tx)
+            print(f"   {rebuilt} of {total} months rebuilt after the writes")
+            assert rebuilt == stale and rebuilt >= 1
+
+            for group_by in all_groupings():
+                compare(tx, group_by, {})
+            compare(tx, ["month", "course", "test_type"], {"strand": "CUBE-CHECK"})
+            raise Rollback()
+    except Rollback:
+        pass
+
+if __name__ == "__main__":
+    tests = [(name, test) for name, test in globals().items() if name.startswith("test_") and callable(test)]
+    failures = 0
+    print("=" * 60)
+    print("🔄 Checking activity cube answers against the raw tables")
+    print("=" * 60)
+    for name, test in tests:
+        try:
+            test()
+            print(f"✅ {name}")
+        except AssertionError as error:
+            failures += 1
+            print(f"❌ {name}: {error}")
+    print("=" * 60)
+    print(f"{len(tests) - failures}/{len(tests)} passed")
+    sys.exit(1 if failures else 0)
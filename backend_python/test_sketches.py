@@ -0,0 +1,129 @@
+"""
+Check the error bounds of the HyperLogLog and KLL sketches in utils/sketches.py.
+Needs no database. Seeds are fixed, so every run checks the same inputs.
+
+    python test_sketches.py
+"""
+
+import math
+import random
+import sys
+from utils.sketches import HyperLogLog, KLL, KLL_RANK_ERROR
+
+def hll_relative_errors(cardinalities, trials):
+    errors = []
+    for trial in range(trials):
+        for cardinality in cardinalities:
+            sketch = HyperLogLog()
+            offset = trial * 10_000_000
+            for value in range(offset, offset + cardinality):
+                sketch.add(value)
+            errors.append((sketch.count() - cardinality) / cardinality)
+    return errors
+
+def test_hll_error_within_bound():
+    """Every estimate within 3 standard errors, and the RMS error close to 1.04 / sqrt(m)"""
+    bound = HyperLogLog().standard_error
+    errors = hll_relative_errors([500, 5_000, 50_000], trials=8)
+    rms = math.sqrt(sum(error * error for error in errors) / len(errors))
+    worst = max(abs(error) for error in errors)
+    print(f"   HyperLogLog: RMS error {rms:.4f}, worst {worst:.4f} (standard error {bound:.4f})")
+    assert worst <= 3 * bound, f"worst error {worst:.4f} above 3 standard errors"
+    assert rms <= 1.5 * bound, f"RMS error {rms:.4f} well above the standard error"
+
+def test_hll_merge_is_union():
+    """Merging two days' sketches counts users active on both days once"""
+    first, second, union = HyperLogLog(), HyperLogLog(), HyperLogLog()
+    for value in range(0, 30_000):
+        first.add(value)
+        union.add(value)
+    for value in range(20_000, 50_000):
+        second.add(value)
+        union.add(value)
+    assert first.merge(second).registers == union.registers
+    assert abs(first.count() - 50_000) / 50_000 <= 3 * first.standard_error
+
+def test_hll_small_and_empty():
+    sketch = HyperLogLog()
+    assert sketch.count() == 0
+    for value in [7, 7, 8, 9, 9, 9]:
+        sketch.add(value)
+    assert sketch.count() == 3
+
+def rank_error(sketch, values, fractions):
+    """Largest distance between each requested rank and the true rank of the returned value"""
+    ordered = sorted(values)
+    worst = 0.0
+    for fraction, estimate in zip(fractions, sketch.quantiles(fractions)):
+        below = sum(1 for value in ordered if value < estimate) / len(ordered)
+        at_or_below = sum(1 for value in ordered if value <= estimate) / len(ordered)
+        if not below <= fraction <= at_or_below:
+            worst = max(worst, min(abs(fraction - below), abs(fraction - at_or_below)))
+    return worst
+
+FRACTIONS = [0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99]
+
+def test_kll_single_sketch_rank_error():
+    generator = random.Random(42)
+    for trial in range(5):
+        values = [generator.gauss(70, 15) for _ in range(100_000)]
+        sketch = KLL(seed=trial)
+        for value in values:
+            sketch.update(value)
+        error = rank_error(sketch, values, FRACTIONS)
+        print(f"   KLL single sketch, trial {trial}: worst rank error {error:.4f}")
+        assert error <= KLL_RANK_ERROR, f"rank error {error:.4f} above {KLL_RANK_ERROR}"
+
+def test_kll_merged_rank_error():
+    """A range query merges one sketch per day; the merged sketch keeps the bound"""
+    generator = random.Random(7)
+    merged = KLL(seed=0)
+    values = []
+    for day in range(100):
+        day_values = [generator.expovariate(1 / (20 + day)) for _ in range(generator.randint(200, 3_000))]
+        day_sketch = KLL(seed=day + 1)
+        for value in day_values:
+            day_sketch.update(value)
+        merged.merge(KLL.from_bytes(day_sketch.to_bytes()))
+        values.extend(day_values)
+    error = rank_error(merged, values, FRACTIONS)
+    print(f"   KLL merged from 100 daily sketches: worst rank error {error:.4f}")
+    assert merged.n == len(values)
+    assert error <= KLL_RANK_ERROR, f"rank error {error:.4f} above {KLL_RANK_ERROR}"
+
+def test_kll_small_input_is_exact():
+    sketch = KLL()
+    for value in [5, 1, 4, 2, 3]:
+        sketch.update(value)
+    assert sketch.quantiles([0.0, 0.5, 1.0]) == [1.0, 3.0, 5.0]
+    assert KLL().quantiles([0.5]) == [None]
+
+def test_serialization_round_trip():
+    users = HyperLogLog()
+    scores = KLL(seed=3)
+    for value in range(10_000):
+        users.add(value)
+        scores.update(value % 101)
+    users_copy = HyperLogLog.from_bytes(memoryview(users.to_bytes()))
+    scores_copy = KLL.from_bytes(memoryview(scores.to_bytes()))
+    assert users_copy.registers == users.registers and users_copy.count() == users.count()
+    assert scores_copy.n == scores.n
+    assert scores_copy.compactors == scores.compactors
+    assert scores_copy.quantiles(FRACTIONS) == scores.quantiles(FRACTIONS)
+
+if __name__ == "__main__":
+    tests = [(name, test) for name, test in globals().items() if name.startswith("test_") and callable(test)]
+    failures = 0
+    print("=" * 60)
+    print("🔄 Checking sketch error bounds")
+    print("=" * 60)
+    for name, test in tests:
+        try:
+            test()
+            print(f"✅ {name}")
+        except AssertionError as error:
+            failures += 1
+            print(f"❌ {name}: {error}")
+    print("=" * 60)
+    print(f"{len(tests) - failures}/{len(tests)} passed")
+    sys.exit(1 if failures else 0)
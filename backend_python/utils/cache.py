@@ -0,0 +1,248 @@
+import asyncio
+import json
+import time
+from collections import OrderedDict
+
+class CacheEntry:
+    """One cached value, when it expires, and the recompute currently in flight (if any)"""
+
+    __slots__ = ('value', 'has_value', 'expires_at', 'computed_at', 'pending')
+
+    def __init__(self):
+        self.value = None
+        self.has_value = False
+        self.expires_at = 0.0
+        self.computed_at = None
+        self.pending = None
+
+class AsyncTTLCache:
+    """
+    In-process TTL cache for expensive async computations, with stampede protection:
+    when an entry expires exactly one caller recomputes it while every other caller
+    keeps getting the previous value; on a cold key all callers share one computation.
+
+        overview = await stats_cache.get('snapshot', compute_snapshot)
+    """
+
+    def __init__(self, name, ttl):
+        self.name = name
+        self.ttl = ttl
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.shared_waits = 0
+
+    async def get(self, key, compute, ttl=None):
+        entry = self.entries.get(key)
+        if entry is not None and entry.has_value and time.monotonic() < entry.expires_at:
+            self.hits += 1
+            return entry.value
+
+        if entry is not None and entry.pending is not None:
+            if entry.has_value:
+                # Someone is already refreshing; serve the previous value meanwhile
+                self.stale_hits += 1
+                return entry.value
+            self.shared_waits += 1
+            return await asyncio.shield(entry.pending)
+
+        if entry is None:
+            entry = self.entries[key] = CacheEntry()
+        self.misses += 1
+        return await self._recompute(key, entry, compute, self.ttl if ttl is None else ttl)
+
+    async def _recompute(self, key, entry, compute, ttl):
+        pending = entry.pending = asyncio.get_running_loop().create_future()
+        try:
+            value = await compute()
+        except BaseException as error:
+            if isinstance(error, asyncio.CancelledError):
+                pending.cancel()
+            else:
+                pending.set_exception(error)
+                pending.exception()  # waiters re-raise it; don't warn when there are none
+            entry.pending = None
+            if not entry.has_value and self.entries.get(key) is entry:
+                del self.entries[key]
+            raise
+        entry.value = value
+        entry.has_value = True
+        entry.computed_at = time.time()
+        entry.expires_at = time.monotonic() + ttl
+        entry.pending = None
+        pending.set_result(value)
+        return value
+
+    def peek(self, key):
+        """key's cached value (fresh or expired) without computing anything; None if there is none"""
+        entry = self.entries.get(key)
+        return entry.value if entry is not None and entry.has_value else None
+
+    def age(self, key):
+        """Seconds since key's value was computed (None if it is not cached)"""
+        entry = self.entries.get(key)
+        return time.time() - entry.computed_at if entry is not None and entry.has_value else None
+
+    def invalidate(self, key=None):
+        """Expire one key (or all), so the next caller recomputes while others still get the old value"""
+        for entry_key, entry in self.entries.items():
+            if key is None or entry_key == key:
+                entry.expires_at = 0.0
+
+    def stats(self):
+        lookups = self.hits + self.misses + self.stale_hits + self.shared_waits
+        return {
+            "name": self.name,
+            "ttl_seconds": self.ttl,
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale_hits": self.stale_hits,
+            "shared_waits": self.shared_waits,
+            "hit_ratio": round((self.hits + self.stale_hits + self.shared_waits) / lookups, 4) if lookups else 0
+        }
+
+
+class TableVersions:
+    """
+    In-process version counter per table. Write paths bump the tables they changed
+    (after commit); caches compare the versions they computed against with the current ones.
+
+        table_versions.bump('user_test_attempts')
+        table_versions.on_change(['users'], stats_cache.invalidate)
+    """
+
+    def __init__(self):
+        self.versions = {}
+        self.listeners = []
+
+    def current(self, tables):
+        return tuple(self.versions.get(table, 0) for table in tables)
+
+    def bump(self, *tables):
+        for table in tables:
+            self.versions[table] = self.versions.get(table, 0) + 1
+        changed = set(tables)
+        for watched, callback in self.listeners:
+            if watched & changed:
+                callback()
+
+    def on_change(self, tables, callback):
+        """Call callback() after every bump of any of tables"""
+        self.listeners.append((frozenset(tables), callback))
+
+class ResultEntry:
+    """One cached result, the table versions it was computed against, and its JSON size"""
+
+    __slots__ = ('value', 'versions', 'size', 'expires_at')
+
+    def __init__(self, value, versions, size, expires_at):
+        self.value = value
+        self.versions = versions
+        self.size = size
+        self.expires_at = expires_at
+
+class ResultCache:
+    """
+    LRU cache of query results, invalidated by table versions rather than a TTL:
+    an entry is served only while every table it read is still at the version it
+    was computed against. Held bytes (JSON size of the values) stay under max_bytes
+    by evicting the least recently used entries. Concurrent misses on one key share
+    a single computation.
+
+        result = await result_cache.get(key, ['users', 'courses'], compute)
+    """
+
+    def __init__(self, name, versions, max_bytes):
+        self.name = name
+        self.versions = versions
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.pending = {}
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.shared_waits = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    async def get(self, key, tables, compute, max_age=None):
+        """
+        key's result, recomputed when one of tables changed since it was cached.
+        max_age (seconds) additionally expires results that depend on the clock ("last 30 days").
+        """
+        versions = self.versions.current(tables)
+        entry = self.entries.get(key)
+        if entry is not None:
+            if entry.versions == versions and (entry.expires_at is None or time.monotonic() < entry.expires_at):
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry.value
+            self.invalidations += 1
+            self._drop(key)
+
+        in_flight = self.pending.get(key)
+        if in_flight is not None and in_flight[0] == versions:
+            self.shared_waits += 1
+            return await asyncio.shield(in_flight[1])
+
+        self.misses += 1
+        pending = asyncio.get_running_loop().create_future()
+        self.pending[key] = (versions, pending)
+        try:
+            value = await compute()
+        except BaseException as error:
+            if isinstance(error, asyncio.CancelledError):
+                pending.cancel()
+            else:
+                pending.set_exception(error)
+                pending.exception()  # waiters re-raise it; don't warn when there are none
+            raise
+        finally:
+            if self.pending.get(key, (None, None))[1] is pending:
+                del self.pending[key]
+        pending.set_result(value)
+
+        # A write that landed during the computation makes the result stale already
+        if self.versions.current(tables) == versions:
+            self._store(key, ResultEntry(
+                value, versions, len(json.dumps(value, default=str)),
+                time.monotonic() + max_age if max_age else None
+            ))
+        return value
+
+    def _store(self, key, entry):
+        if entry.size > self.max_bytes:
+            return
+        self.entries[key] = entry
+        self.bytes += entry.size
+        while self.bytes > self.max_bytes:
+            oldest = next(iter(self.entries))
+            self._drop(oldest)
+            self.evictions += 1
+
+    def _drop(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry.size
+
+    def clear(self):
+        """Drop every entry (e.g. after writes made outside the application)"""
+        self.entries.clear()
+        self.bytes = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses + self.shared_waits
+        return {
+            "name": self.name,
+            "entries": len(self.entries),
+            "bytes_held": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "shared_waits": self.shared_waits,
+            "invalidations": self.invalidations,
+            "evictions": self.evictions,
+            "hit_ratio": round((self.hits + self.shared_waits) / lookups, 4) if lookups else 0
+        }
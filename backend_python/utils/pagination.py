@@ -0,0 +1,16 @@
+import base64
+import json
+
+def encode_cursor(values):
+    """Opaque keyset cursor for the last row of a page (its sort key and tie-breaker)"""
+    return base64.urlsafe_b64encode(json.dumps(values, default=str).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor, length=2):
+    """Decode a cursor from encode_cursor; raises ValueError when it is malformed"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list) or len(values) != length:
+        raise ValueError("Invalid cursor")
+    return values
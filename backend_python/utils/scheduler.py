@@ -0,0 +1,211 @@
+import asyncio
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+class ScheduledReport:
+    """A registered report: its last good result, when it was computed, and its recent demand"""
+
+    def __init__(self, name, compute, interval, hot_interval):
+        self.name = name
+        self.compute = compute
+        self.interval = interval
+        self.hot_interval = hot_interval
+        self.value = None
+        self.has_value = False
+        self.refreshed_at = None      # time.monotonic() of the last good result
+        self.computed_at = None       # time.time() of the same, for display
+        self.retry_at = 0.0
+        self.expired = False
+        self.stale = False            # a table it reads changed since the last refresh
+        self.last_requested_at = None
+        self.pending = None
+        self.requests = deque()
+        self.refreshes = 0
+        self.failures = 0
+        self.last_error = None
+        self.last_duration = None
+
+    def age(self, now=None):
+        if self.refreshed_at is None:
+            return None
+        return (now or time.monotonic()) - self.refreshed_at
+
+class ReportScheduler:
+    """
+    Recomputes registered reports in the background and serves their last good result
+    (stale-while-revalidate). A report is first computed on its first request. After that
+    it is refreshed every `interval` seconds, or every `hot_interval` seconds while it is
+    hot (at least hot_requests requests in the last hot_window seconds), and no more than
+    min_interval seconds after mark_stale(). A report nobody requested for idle_after
+    seconds is left alone until its next request. A failed refresh keeps the previous
+    result and is retried after retry_delay seconds.
+
+        report_scheduler.register('cohorts', compute_cohorts, interval=600)
+        value, age = await report_scheduler.get('cohorts')
+    """
+
+    def __init__(self, tick=1.0, hot_requests=10, hot_window=60.0, retry_delay=30.0,
+                 min_interval=30.0, idle_after=900.0):
+        self.tick = tick
+        self.hot_requests = hot_requests
+        self.hot_window = hot_window
+        self.retry_delay = retry_delay
+        self.min_interval = min_interval
+        self.idle_after = idle_after
+        self.reports = {}
+        self.task = None
+
+    def register(self, name, compute, interval, hot_interval=None):
+        if name in self.reports:
+            raise ValueError(f"Report already registered: {name}")
+        self.reports[name] = ScheduledReport(
+            name, compute, interval, interval / 4 if hot_interval is None else hot_interval
+        )
+
+    def start(self):
+        """Start the refresh loop on the running event loop; reports wait for their first request"""
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        for report in self.reports.values():
+            if report.pending is not None:
+                report.pending.cancel()
+
+    async def run(self):
+        while True:
+            now = time.monotonic()
+            for report in self.reports.values():
+                if not self.is_idle(report, now) and self.due(report, now):
+                    self.refresh(report)
+            await asyncio.sleep(self.tick)
+
+    def is_hot(self, report, now):
+        while report.requests and report.requests[0] < now - self.hot_window:
+            report.requests.popleft()
+        return len(report.requests) >= self.hot_requests
+
+    def is_idle(self, report, now):
+        return report.last_requested_at is None or now - report.last_requested_at >= self.idle_after
+
+    def due(self, report, now):
+        if report.pending is not None or now < report.retry_at:
+            return False
+        if not report.has_value or report.expired:
+            return True
+        interval = report.hot_interval if self.is_hot(report, now) else report.interval
+        if report.stale:
+            interval = min(interval, self.min_interval)
+        return now - report.refreshed_at >= interval
+
+    def refresh(self, report):
+        """Start recomputing report in its own task (one at a time); returns the task"""
+        if report.pending is None:
+            report.pending = asyncio.get_running_loop().create_task(self._recompute(report))
+            # Failures are kept in last_error; nobody may be waiting on a background refresh
+            report.pending.add_done_callback(lambda task: task.cancelled() or task.exception())
+        return report.pending
+
+    async def _recompute(self, report):
+        started = time.monotonic()
+        # Writes landing during the computation mark it stale again
+        report.stale = False
+        try:
+            value = await report.compute()
+        except asyncio.CancelledError:
+            report.stale = True
+            report.pending = None
+            raise
+        except Exception as error:
+            report.stale = True
+            report.failures += 1
+            report.last_error = str(error) or type(error).__name__
+            report.retry_at = time.monotonic() + self.retry_delay
+            report.pending = None
+            if report.has_value:
+                print(f"⚠️  Report {report.name} refresh failed, serving the previous result: {report.last_error}")
+            raise
+        report.value = value
+        report.has_value = True
+        report.refreshed_at = time.monotonic()
+        report.computed_at = time.time()
+        report.last_duration = report.refreshed_at - started
+        report.last_error = None
+        report.expired = False
+        report.refreshes += 1
+        report.pending = None
+        return value
+
+    async def get(self, name):
+        """
+        (last good result, its age in seconds). Counts the request towards the report's
+        hotness and starts a refresh if one is due; only waits when there is no result yet.
+        """
+        report = self.touch(name)
+        if report.has_value:
+            return report.value, report.age()
+
+        pending = report.pending
+        if pending is None:
+            # Waiting out retry_delay after a failed first computation
+            raise RuntimeError(f"Report {name} is not available yet: {report.last_error}")
+        value = await asyncio.shield(pending)
+        return value, report.age()
+
+    def touch(self, name):
+        """Count a request towards a report's demand and start a refresh if one is due, without waiting for it"""
+        report = self.reports[name]
+        now = time.monotonic()
+        report.requests.append(now)
+        report.last_requested_at = now
+        if self.due(report, now):
+            self.refresh(report)
+        return report
+
+    def expire(self, name=None):
+        """Refresh one report (or all) on the next tick, still serving the current result meanwhile"""
+        for report in self.reports.values():
+            if name is None or report.name == name:
+                report.expired = True
+                report.retry_at = 0.0
+
+    def mark_stale(self, name):
+        """Refresh a report within min_interval seconds (if it is requested), instead of at its next interval"""
+        self.reports[name].stale = True
+
+    def stats(self):
+        now = time.monotonic()
+        return {
+            "running": self.task is not None and not self.task.done(),
+            "hot_requests": self.hot_requests,
+            "hot_window_seconds": self.hot_window,
+            "min_interval_seconds": self.min_interval,
+            "idle_after_seconds": self.idle_after,
+            "reports": [
+                {
+                    "name": report.name,
+                    "interval_seconds": report.interval,
+                    "hot_interval_seconds": report.hot_interval,
+                    "age_seconds": round(report.age(now), 1) if report.has_value else None,
+                    "computed_at": datetime.fromtimestamp(report.computed_at, timezone.utc).isoformat() if report.has_value else None,
+                    "hot": self.is_hot(report, now),
+                    "idle": self.is_idle(report, now),
+                    "stale": report.stale,
+                    "requests_in_window": len(report.requests),
+                    "refreshing": report.pending is not None,
+                    "refreshes": report.refreshes,
+                    "failures": report.failures,
+                    "last_duration_seconds": round(report.last_duration, 3) if report.last_duration is not None else None,
+                    "last_error": report.last_error
+                }
+                for report in self.reports.values()
+            ]
+        }
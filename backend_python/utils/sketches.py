@@ -0,0 +1,191 @@
+"""
+Mergeable sketches for approximate analytics.
+
+HyperLogLog counts distinct values, and KLL estimates quantiles. Both fit in a
+few KB, and merging the sketches of two sets gives exactly the sketch of their
+union. Daily sketches can therefore be combined into any date range.
+
+    users = HyperLogLog()
+    for user_id in user_ids:
+        users.add(user_id)
+    users.merge(other_day_users)
+    users.count()                   # within ~1.6% (one standard error) of the true count
+
+    scores = KLL()
+    scores.update(72.5)
+    scores.quantiles([0.5, 0.9])    # ranks within ~1.65% of the requested ones
+
+Error bounds are checked by test_sketches.py.
+"""
+
+import hashlib
+import math
+import random
+import struct
+from array import array
+
+MASK_64 = (1 << 64) - 1
+
+# Normalized rank error of KLL quantiles at the default k=200 (99% confidence)
+KLL_RANK_ERROR = 0.0165
+
+def hash64(value):
+    """Well-mixed 64-bit hash of an int (splitmix64 finalizer) or of any other value's repr"""
+    if not isinstance(value, int):
+        return int.from_bytes(hashlib.blake2b(repr(value).encode(), digest_size=8).digest(), "little")
+    value = (value + 0x9E3779B97F4A7C15) & MASK_64
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & MASK_64
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & MASK_64
+    return value ^ (value >> 31)
+
+class HyperLogLog:
+    """
+    Distinct counter with 2**precision one-byte registers (4 KB at the default 12).
+    Relative standard error is 1.04 / sqrt(2**precision): 1.6% at precision 12.
+    """
+
+    def __init__(self, precision=12, registers=None):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = bytearray(registers) if registers is not None else bytearray(self.size)
+
+    @property
+    def standard_error(self):
+        return 1.04 / math.sqrt(self.size)
+
+    def add(self, value):
+        hashed = hash64(value)
+        index = hashed >> (64 - self.precision)
+        remainder = hashed & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - remainder.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge HyperLogLog sketches of different precision")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def count(self):
+        alpha = 0.7213 / (1 + 1.079 / self.size)
+        estimate = alpha * self.size * self.size / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * self.size and zeros:
+            # Small-range correction: linear counting is more accurate here
+            estimate = self.size * math.log(self.size / zeros)
+        return int(round(estimate))
+
+    def to_bytes(self):
+        return bytes([self.precision]) + bytes(self.registers)
+
+    @classmethod
+    def from_bytes(cls, data):
+        data = bytes(data)
+        return cls(data[0], data[1:])
+
+class KLL:
+    """
+    Quantile sketch (Karnin, Lang, Liberty 2016) over floats. A stack of compactors
+    holds at most about 3 * k items; each level's items stand for 2**level inputs.
+    With the default k=200 a returned quantile's rank is within about 1.65% of the
+    requested rank (99% confidence).
+    """
+
+    def __init__(self, k=200, seed=None):
+        self.k = k
+        self.n = 0
+        self.compactors = [[]]
+        self.random = random.Random(seed)
+        self.max_size = self.capacity(0)
+
+    def capacity(self, level):
+        depth = len(self.compactors) - level - 1
+        return int(math.ceil(self.k * (2 / 3) ** depth)) + 1
+
+    def grow(self):
+        self.compactors.append([])
+        self.max_size = sum(self.capacity(level) for level in range(len(self.compactors)))
+
+    def size(self):
+        return sum(len(compactor) for compactor in self.compactors)
+
+    def update(self, value):
+        self.compactors[0].append(float(value))
+        self.n += 1
+        if self.size() >= self.max_size:
+            self.compress()
+
+    def compress(self):
+        while self.size() >= self.max_size:
+            for level, compactor in enumerate(self.compactors):
+                if len(compactor) >= self.capacity(level):
+                    if level + 1 == len(self.compactors):
+                        self.grow()
+                    # Keep every other item (random offset) one level up, at twice the weight
+                    compactor.sort()
+                    odd = compactor.pop() if len(compactor) % 2 else None
+                    offset = self.random.random() < 0.5
+                    self.compactors[level + 1].extend(compactor[offset::2])
+                    compactor[:] = [] if odd is None else [odd]
+                    break
+
+    def merge(self, other):
+        while len(self.compactors) < len(other.compactors):
+            self.grow()
+        for level, compactor in enumerate(other.compactors):
+            self.compactors[level].extend(compactor)
+        self.n += other.n
+        self.compress()
+        return self
+
+    def weighted_items(self):
+        items = [
+            (value, 1 << level)
+            for level, compactor in enumerate(self.compactors)
+            for value in compactor
+        ]
+        items.sort()
+        return items
+
+    def quantiles(self, fractions):
+        """Estimated values at each fraction in [0, 1]; None for an empty sketch"""
+        if self.n == 0:
+            return [None for _ in fractions]
+        items = self.weighted_items()
+        total = sum(weight for _, weight in items)
+        results = []
+        for fraction in fractions:
+            target = fraction * total
+            cumulative = 0
+            result = items[-1][0]
+            for value, weight in items:
+                cumulative += weight
+                if cumulative >= target:
+                    result = value
+                    break
+            results.append(result)
+        return results
+
+    def to_bytes(self):
+        header = struct.pack("<IQI", self.k, self.n, len(self.compactors))
+        sizes = struct.pack(f"<{len(self.compactors)}I", *(len(compactor) for compactor in self.compactors))
+        values = array("d", [value for compactor in self.compactors for value in compactor])
+        return header + sizes + values.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data, seed=None):
+        data = bytes(data)
+        k, n, levels = struct.unpack_from("<IQI", data)
+        sizes = struct.unpack_from(f"<{levels}I", data, 16)
+        values = array("d")
+        values.frombytes(data[16 + 4 * levels:])
+        sketch = cls(k, seed)
+        while len(sketch.compactors) < levels:
+            sketch.grow()
+        position = 0
+        for level, size in enumerate(sizes):
+            sketch.compactors[level] = list(values[position:position + size])
+            position += size
+        sketch.n = n
+        return sketch
@@ -0,0 +1,122 @@
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime, time
+from decimal import Decimal
+
+# Flush the response buffer once it holds roughly this many characters
+STREAM_CHUNK_SIZE = 64 * 1024
+
+def json_default(value):
+    """Encode the non-JSON types psycopg2 returns the same way FastAPI's encoder does"""
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def encode_json(value):
+    return json.dumps(value, default=json_default)
+
+def csv_value(value):
+    """One CSV cell: ISO timestamps, empty for NULL, JSON for JSONB values"""
+    if value is None:
+        return ""
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        return encode_json(value)
+    return value
+
+async def stream_json_object(rows, list_key, fields=None, count_key=None, transform=None, trailer=None):
+    """
+    Stream a JSON object whose list_key holds every row of an async row iterator,
+    without materializing the list. fields are emitted before the list; the row
+    count (if count_key is given) and trailer() (if given) after it, once known.
+    transform, if given, maps each row to the dict that is emitted.
+    Always closes rows, so the underlying cursor and connection are released
+    even when the client disconnects mid-stream.
+    """
+    count = 0
+    try:
+        head = encode_json(fields or {})[:-1]
+        buffer = [head + (", " if fields else "") + json.dumps(list_key) + ": ["]
+        size = 0
+        async for row in rows:
+            item = encode_json(transform(row) if transform else row)
+            buffer.append(item if count == 0 else "," + item)
+            count += 1
+            size += len(item)
+            if size >= STREAM_CHUNK_SIZE:
+                yield "".join(buffer)
+                buffer = []
+                size = 0
+        tail = "]"
+        if count_key:
+            tail += f", {json.dumps(count_key)}: {count}"
+        for key, value in (trailer() if trailer else {}).items():
+            tail += f", {json.dumps(key)}: {encode_json(value)}"
+        buffer.append(tail + "}")
+        yield "".join(buffer)
+    finally:
+        await rows.aclose()
+
+async def stream_ndjson(rows, transform=None, trailer=None):
+    """
+    Stream an async row iterator as newline-delimited JSON, one object per line.
+    trailer(), if given, is called after the last row and emitted as a final line
+    when it returns a non-empty dict. Always closes rows, like stream_json_object.
+    """
+    try:
+        buffer = []
+        size = 0
+        async for row in rows:
+            line = encode_json(transform(row) if transform else row) + "\n"
+            buffer.append(line)
+            size += len(line)
+            if size >= STREAM_CHUNK_SIZE:
+                yield "".join(buffer)
+                buffer = []
+                size = 0
+        final = trailer() if trailer else None
+        if final:
+            buffer.append(encode_json(final) + "\n")
+        if buffer:
+            yield "".join(buffer)
+    finally:
+        await rows.aclose()
+
+async def stream_csv(rows, columns, transform=None):
+    """
+    Stream an async row iterator as CSV with a header row. Tuple rows are written
+    as they are (columns is just the header); dict rows are read in columns order.
+    Always closes rows, like stream_json_object.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    try:
+        writer.writerow(columns)
+        async for row in rows:
+            record = transform(row) if transform else row
+            values = record if isinstance(record, tuple) else [record[column] for column in columns]
+            writer.writerow([csv_value(value) for value in values])
+            if buffer.tell() >= STREAM_CHUNK_SIZE:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+    finally:
+        await rows.aclose()
+
+async def gzip_stream(chunks, level=6):
+    """Gzip-compress an async stream of str/bytes chunks on the fly (one gzip member)"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    try:
+        async for chunk in chunks:
+            data = compressor.compress(chunk.encode() if isinstance(chunk, str) else chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+    finally:
+        await chunks.aclose()
@@ -19,18 +19,16 @@ function AnalyticsPage() {
   const fetchAnalytics = async () => {
     try {
       setLoading(true);
-      const [users, courses, tests, recs] = await Promise.all([
-        axios.get(`${API_BASE_URL}/users?limit=1`).catch(() => ({ data: { pagination: { total: 0 } } })),
-        axios.get(`${API_BASE_URL}/courses?limit=1`).catch(() => ({ data: { pagination: { total: 0 } } })),
-        axios.get(`${API_BASE_URL}/tests?limit=1`).catch(() => ({ data: { pagination: { total: 0 } } })),
-        axios.get(`${API_BASE_URL}/recommendations?limit=1`).catch(() => ({ data: { pagination: { total: 0 } } })),
-      ]);
+      // One request: headline counts from the cached dashboard snapshot
+      const response = await axios.get(`${API_BASE_URL}/dashboard/summary`)
+        .catch(() => ({ data: { totals: {} } }));
+      const totals = response.data?.totals || {};
 
       setAnalytics({
-        users: users.data?.pagination?.total || 0,
-        courses: courses.data?.pagination?.total || 0,
-        tests: tests.data?.pagination?.total || 0,
-        recommendations: recs.data?.pagination?.total || 0,
+        users: totals.users || 0,
+        courses: totals.courses || 0,
+        tests: totals.tests || 0,
+        recommendations: totals.recommendations || 0,
       });
     } finally {
       setLoading(false);
@@ -11,6 +11,7 @@ function Dashboard() {
     totalTests: 0,
     totalRecommendations: 0,
   });
+  const [recent, setRecent] = useState({ attempts: [], recommendations: [] });
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState('');
 
@@ -21,18 +22,19 @@ function Dashboard() {
   const fetchStats = async () => {
     try {
       setLoading(true);
-      const [users, courses, analytics, recs] = await Promise.all([
-        axios.get(`${API_BASE_URL}/users?limit=1`).catch(() => ({ data: { pagination: { total: 0 } } })),
-        axios.get(`${API_BASE_URL}/courses?limit=1`).catch(() => ({ data: { pagination: { total: 0 } } })),
-        axios.get(`${API_BASE_URL}/analytics/admin/overview`).catch(() => ({ data: { overview: { total_assessments_taken: 0 } } })),
-        axios.get(`${API_BASE_URL}/recommendations?limit=1`).catch(() => ({ data: { pagination: { total: 0 } } })),
-      ]);
+      // One request: headline counts and recent activity from a single cached snapshot
+      const response = await axios.get(`${API_BASE_URL}/dashboard/summary`);
+      const { totals = {}, recent: recentActivity = {} } = response.data || {};
 
       setStats({
-        totalUsers: users.data?.pagination?.total || 0,
-        totalCourses: courses.data?.pagination?.total || 0,
-        totalTests: analytics.data?.overview?.total_assessments_taken || 0,
-        totalRecommendations: analytics.data?.overview?.total_recommendations_generated || 0,
+        totalUsers: totals.users || 0,
+        totalCourses: totals.courses || 0,
+        totalTests: totals.tests || 0,
+        totalRecommendations: totals.recommendations || 0,
+      });
+      setRecent({
+        attempts: recentActivity.attempts || [],
+        recommendations: recentActivity.recommendations || [],
       });
     } catch (err) {
       setError('Failed to load statistics');
@@ -135,6 +137,35 @@ function Dashboard() {
               </div>
             </div>
 
+            <div className="card">
+              <div className="card-header">
+                <h2>Recent Activity</h2>
+              </div>
+              <div className="features-list">
+                {recent.attempts.length === 0 && recent.recommendations.length === 0 && (
+                  <p>No recent activity</p>
+                )}
+                {recent.attempts.map((attempt) => (
+                  <div className="feature-item" key={`attempt-${attempt.attempt_id}`}>
+                    <i className="fas fa-clipboard-check"></i>
+                    <div>
+                      <strong>{attempt.user_name} took {attempt.test_name}</strong>
+                      <p>Score {attempt.score}/{attempt.total_questions} · {new Date(attempt.attempt_date).toLocaleString()}</p>
+                    </div>
+                  </div>
+                ))}
+                {recent.recommendations.map((recommendation) => (
+                  <div className="feature-item" key={`recommendation-${recommendation.recommendation_id}`}>
+                    <i className="fas fa-lightbulb"></i>
+                    <div>
+                      <strong>{recommendation.course_name} recommended to {recommendation.user_name}</strong>
+                      <p>{recommendation.status} · {new Date(recommendation.recommended_at).toLocaleString()}</p>
+                    </div>
+                  </div>
+                ))}
+              </div>
+            </div>
+
             <div className="card">
               <div className="card-header">
                 <h2>Quick Features</h2>